@@ -1,10 +1,27 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import pickle
 import os
+import shutil
+import tempfile
+import weakref
 from datetime import datetime
 
+import scoring
+import scoring.batch
+import scoring.cache
+import scoring.decisions
+import scoring.drift
+import scoring.explain
+import scoring.metrics
+import scoring.portfolio
+import scoring.registry
+import scoring.risk
+import scoring.whatif
+import scoring.formats
+from scoring.bundle import BundleError
+from scoring import predict_batch, predict_credit
+
 # Configuração da página
 st.set_page_config(
     page_title="Sistema de Análise de Crédito",
@@ -12,8 +29,9 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# CSS customizado
-st.markdown("""
+# CSS customizado. O Streamlit remove da página os elementos que um rerun não
+# emite de novo, então o estilo é enviado a cada execução do script (~1 KB)
+PAGE_STYLE = """
 <style>
     .main-header {
         font-size: 2.5rem;
@@ -51,68 +69,85 @@ st.markdown("""
         margin: 1rem 0;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+st.markdown(PAGE_STYLE, unsafe_allow_html=True)
+
+# Linhas de resultado por página na tela (o arquivo completo vai para o download)
+RESULTS_PREVIEW_ROWS = 1000
 
 # Funções auxiliares
 @st.cache_resource
-def load_model():
-    """Carrega o modelo treinado"""
+def load_model_server():
+    """
+    Carrega o modelo treinado e o scaler (registro de modelos). Uma nova versão
+    ativada no registro é carregada e aquecida em segundo plano e passa a valer
+    nos próximos reruns, sem reiniciar o app.
+    """
+    server = scoring.registry.ModelServer()
     try:
-        with open('lgbm_model_optimized.pkl', 'rb') as f:
-            model = pickle.load(f)
-        return model
+        server.refresh()
     except FileNotFoundError:
-        st.error("Modelo não encontrado! Execute o notebook da Etapa 5 primeiro.")
+        st.error("Modelo ou scaler não encontrado! Execute o notebook da Etapa 5 primeiro.")
+        return None
+    except (BundleError, scoring.registry.RegistryError) as e:
+        st.error(f"Modelo inválido: {e}")
         return None
+    server.watch()
+    return server
+
+@st.cache_resource
+def load_prediction_cache():
+    """Cache de predições compartilhado entre as sessões (None se desativado)"""
+    cache = scoring.cache.create_cache()
+    scoring.metrics.register_cache(cache)
+    return cache
+
+@st.cache_resource
+def load_decision_log():
+    """Registro de decisões compartilhado entre as sessões (None se desativado)"""
+    return scoring.decisions.open_log()
 
 @st.cache_resource
-def load_scaler():
-    """Carrega o scaler para normalização"""
+def load_drift_reference():
+    """Referência de drift do treinamento (None se drift_reference.json não existir)"""
+    return scoring.drift.load_reference()
+
+@st.cache_data
+def load_model_comparison(path='model_comparison.csv'):
+    """Tabela de comparação de modelos (None se o arquivo não existir)"""
     try:
-        with open('scaler.pkl', 'rb') as f:
-            scaler = pickle.load(f)
-        return scaler
-    except FileNotFoundError:
-        st.error("Scaler não encontrado! Certifique-se de ter o arquivo scaler.pkl")
+        return pd.read_csv(path)
+    except (OSError, pd.errors.ParserError):
         return None
 
-def preprocess_input(input_data, scaler):
+@st.cache_resource
+def start_metrics_server():
+    """Servidor local de métricas do Prometheus (só com CREDIT_METRICS_PORT)"""
+    return scoring.metrics.serve()
+
+class SessionFiles:
     """
-    Pré-processa os dados de entrada aplicando normalização com o scaler
-    IMPORTANTE: O scaler normaliza apenas as 13 features numéricas contínuas.
-    As features binárias (high_debt, low_cibil, education_encoded, self_employed_encoded)
-    NÃO são normalizadas.
+    Diretório temporário da sessão para os arquivos do lote (resultados e
+    relatório de erros), que ficam em disco em vez de na memória do servidor;
+    é apagado quando a sessão é descartada.
     """
-    processed_data = input_data.copy()
 
-    # Features que devem ser normalizadas (mesmas usadas no treinamento)
-    features_to_scale = [
-        'no_of_dependents',
-        'income_annum',
-        'loan_amount',
-        'loan_term',
-        'cibil_score',
-        'residential_assets_value',
-        'commercial_assets_value',
-        'luxury_assets_value',
-        'bank_asset_value',
-        'credit_income_ratio',
-        'total_assets',
-        'assets_income_ratio',
-        'loan_assets_ratio'
-    ]
+    def __init__(self):
+        self.directory = tempfile.mkdtemp(prefix='analise_lote_')
+        weakref.finalize(self, shutil.rmtree, self.directory, True)
 
-    return processed_data
+    def new(self, suffix):
+        """Caminho de um novo arquivo vazio no diretório da sessão"""
+        fd, path = tempfile.mkstemp(suffix=suffix, dir=self.directory)
+        os.close(fd)
+        return path
 
-def predict_credit(model, scaler, input_data):
-    # Pré-processar dados
-    processed_data = preprocess_input(input_data, scaler)
-    
-    # Fazer predição
-    prediction = model.predict(processed_data)[0]
-    probability = model.predict_proba(processed_data)[0]
-    
-    return prediction, probability
+    @staticmethod
+    def remove(*paths):
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
 
 # Header
 st.markdown('<div class="main-header">Sistema de Análise de Crédito</div>', unsafe_allow_html=True)
@@ -132,27 +167,41 @@ with st.sidebar:
     2. Clique em "Analisar Crédito"
     3. Visualize o resultado da análise
     """)
+    
+    st.markdown("---")
+    st.markdown("### Configurações")
+    threshold = st.slider(
+        "Limiar de aprovação",
+        min_value=0.05, max_value=0.95, value=scoring.DECISION_THRESHOLD, step=0.05,
+        help="Probabilidade de aprovação mínima para aprovar o crédito"
+    )
 
-# Carregar modelo e scaler
-model = load_model()
-scaler = load_scaler()
+# Carregar modelo e scaler (a mesma versão durante todo o rerun, mesmo com uma troca no meio)
+model_server = load_model_server()
+active_model = model_server.active if model_server is not None else None
+model = active_model.model if active_model is not None else None
+scaler = active_model.scaler if active_model is not None else None
+prediction_cache = load_prediction_cache()
+decision_log = load_decision_log()
+start_metrics_server()
 
 if model is None or scaler is None:
     st.markdown('<div class="info-box">', unsafe_allow_html=True)
     st.warning("""
     **Arquivos necessários não encontrados!**
-    Baixar os arquivos gerados:
+    Gere o bundle do modelo (`python -m scoring.bundle build`) ou baixe os arquivos gerados:
        - `lgbm_model_optimized.pkl`
        - `scaler.pkl`
     """)
     st.markdown('</div>', unsafe_allow_html=True)
     st.stop()
 
-# Tabs principais
-tab1, tab2, tab3 = st.tabs(["Análise Individual", "Análise em Lote", "Sobre o Modelo"])
+# Seções principais: só a seção escolhida é montada a cada rerun (st.tabs monta todas)
+PAGES = ["Análise Individual", "Análise em Lote", "Histórico", "Sobre o Modelo"]
+page = st.radio("Seção", PAGES, horizontal=True, label_visibility="collapsed", key="pagina")
 
 # TAB 1: Análise Individual
-with tab1:
+if page == PAGES[0]:
     st.markdown('<div class="sub-header">Dados do Cliente</div>', unsafe_allow_html=True)
     
     col1, col2, col3 = st.columns(3)
@@ -182,12 +231,25 @@ with tab1:
     st.markdown("---")
     
     # Calcular features engineered (mesmas do treinamento)
-    credit_income_ratio = loan_amount / income_annum if income_annum > 0 else 0
-    total_assets = residential_assets_value + commercial_assets_value + luxury_assets_value + bank_asset_value
-    assets_income_ratio = total_assets / income_annum if income_annum > 0 else 0
-    loan_assets_ratio = loan_amount / total_assets if total_assets > 0 else 0
-    high_debt = 1 if credit_income_ratio > 4 else 0
-    low_cibil = 1 if cibil_score < 650 else 0
+    applicant = {
+        'no_of_dependents': no_of_dependents,
+        'income_annum': income_annum,
+        'loan_amount': loan_amount,
+        'loan_term': loan_term,
+        'cibil_score': cibil_score,
+        'residential_assets_value': residential_assets_value,
+        'commercial_assets_value': commercial_assets_value,
+        'luxury_assets_value': luxury_assets_value,
+        'bank_asset_value': bank_asset_value,
+        'education_encoded': education_encoded,
+        'self_employed_encoded': self_employed_encoded
+    }
+    input_data = scoring.build_features(applicant)
+    features = dict(zip(scoring.MODEL_COLUMNS, input_data[0]))
+    credit_income_ratio = features['credit_income_ratio']
+    total_assets = features['total_assets']
+    assets_income_ratio = features['assets_income_ratio']
+    loan_assets_ratio = features['loan_assets_ratio']
     
     # Exibir métricas calculadas
     st.markdown("**Métricas Calculadas**")
@@ -203,108 +265,132 @@ with tab1:
     
     st.markdown("---")
     
-    # Botão de análise
+    # Botão de análise: o resultado fica na sessão e só é recalculado em um novo clique
+    analysis_key = (tuple(applicant.values()), threshold, active_model.version)
     if st.button("Analisar Crédito", type="primary", use_container_width=True):
-        # Criar DataFrame com os dados (ordem correta das colunas)
-        input_data = pd.DataFrame({
-            'no_of_dependents': [no_of_dependents],
-            'income_annum': [income_annum],
-            'loan_amount': [loan_amount],
-            'loan_term': [loan_term],
-            'cibil_score': [cibil_score],
-            'residential_assets_value': [residential_assets_value],
-            'commercial_assets_value': [commercial_assets_value],
-            'luxury_assets_value': [luxury_assets_value],
-            'bank_asset_value': [bank_asset_value],
-            'credit_income_ratio': [credit_income_ratio],
-            'total_assets': [total_assets],
-            'assets_income_ratio': [assets_income_ratio],
-            'loan_assets_ratio': [loan_assets_ratio],
-            'high_debt': [high_debt],
-            'low_cibil': [low_cibil],
-            'education_encoded': [education_encoded],
-            'self_employed_encoded': [self_employed_encoded]
-        })
-        
         # Fazer predição
         with st.spinner("Analisando dados..."):
             try:
-                prediction, probability = predict_credit(model, scaler, input_data)
-                
-                # Exibir resultado
-                st.markdown("---")
-                st.markdown('<div class="sub-header">Resultado da Análise</div>', unsafe_allow_html=True)
-                
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    if prediction == 1:
-                        st.markdown('<div class="result-approved">', unsafe_allow_html=True)
-                        st.markdown("### CRÉDITO APROVADO")
-                        st.markdown(f"**Probabilidade de Aprovação:** {probability[1]*100:.2f}%")
-                        st.markdown("</div>", unsafe_allow_html=True)
-                    else:
-                        st.markdown('<div class="result-rejected">', unsafe_allow_html=True)
-                        st.markdown("### CRÉDITO REJEITADO")
-                        st.markdown(f"**Probabilidade de Rejeição:** {probability[0]*100:.2f}%")
-                        st.markdown("</div>", unsafe_allow_html=True)
-                
-                with col2:
-                    st.markdown("**Detalhes da Análise**")
-                    st.metric("Valor Solicitado", f"R$ {loan_amount:,.2f}")
-                    st.metric("Renda Anual", f"R$ {income_annum:,.2f}")
-                    st.metric("Score CIBIL", cibil_score)
-                    st.metric("Razão Crédito/Renda", f"{credit_income_ratio:.2f}x")
-                
-                # Gráfico de probabilidade
-                st.markdown("---")
-                st.markdown("** Distribuição de Probabilidade**")
-                prob_df = pd.DataFrame({
-                    'Classe': ['Aprovado', 'Rejeitado'],
-                    'Probabilidade': [probability[1]*100, probability[0]*100]
-                })
-                st.bar_chart(prob_df.set_index('Classe'))
-                
-                # Análise de risco
-                st.markdown("---")
-                st.markdown("**Análise de Risco**")
-                
-                risk_factors = []
-                if credit_income_ratio > 4:
-                    risk_factors.append(" Razão Crédito/Renda muito alta (> 4x)")
-                elif credit_income_ratio > 3:
-                    risk_factors.append(" Razão Crédito/Renda moderada (> 3x)")
-                
-                if cibil_score < 650:
-                    risk_factors.append(" Score de crédito baixo (< 650)")
-                elif cibil_score < 700:
-                    risk_factors.append(" Score de crédito moderado (< 700)")
-                
-                if loan_assets_ratio > 0.8:
-                    risk_factors.append(" Empréstimo muito alto em relação aos ativos (> 80%)")
-                
-                if total_assets < loan_amount * 0.5:
-                    risk_factors.append(" Ativos totais baixos em relação ao empréstimo")
-                
-                if risk_factors:
-                    for factor in risk_factors:
-                        st.markdown(f"- {factor}")
-                else:
-                    st.success(" Nenhum fator de risco significativo identificado")
-                
+                prediction, probability = predict_credit(
+                    model, scaler, input_data, threshold, prediction_cache
+                )
+                # Registro da decisão (gravado em segundo plano, ver scoring/decisions.py)
+                if decision_log is not None:
+                    decision_log.record(
+                        'individual', input_data, probability[1:], [prediction],
+                        getattr(model, 'model_version', None), threshold
+                    )
+                # Modelo em modo sombra (se houver) pontua o mesmo cliente em segundo plano
+                model_server.shadow_score(input_data, probability.reshape(1, -1), threshold)
+                # Motivos da decisão (contribuições TreeSHAP do modelo)
+                reasons = scoring.explain.explain(
+                    model, scoring.preprocess_input(input_data, scaler), [prediction], k=5
+                )[0]
+                # Simulação de cenários: valor x prazo do empréstimo em uma única chamada do modelo
+                grid = None
+                if loan_amount > 0:
+                    grid = scoring.whatif.sensitivity_grid(model, scaler, applicant, threshold=threshold)
+                st.session_state['analise_individual'] = {
+                    'key': analysis_key,
+                    'prediction': prediction,
+                    'probability': probability,
+                    'risk_factors': scoring.risk.RULES.describe(scoring.risk.evaluate_risk(input_data)[0]),
+                    'reasons': reasons,
+                    'grid': grid
+                }
             except Exception as e:
+                st.session_state.pop('analise_individual', None)
                 st.error(f"Erro ao processar dados: {str(e)}")
                 st.exception(e)
+    
+    # Exibir o último resultado enquanto os dados do cliente não mudarem
+    result = st.session_state.get('analise_individual')
+    if result is not None and result['key'] == analysis_key:
+        prediction = result['prediction']
+        probability = result['probability']
+        
+        # Exibir resultado
+        st.markdown("---")
+        st.markdown('<div class="sub-header">Resultado da Análise</div>', unsafe_allow_html=True)
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            if prediction == 1:
+                st.markdown('<div class="result-approved">', unsafe_allow_html=True)
+                st.markdown("### CRÉDITO APROVADO")
+                st.markdown(f"**Probabilidade de Aprovação:** {probability[1]*100:.2f}%")
+                st.markdown("</div>", unsafe_allow_html=True)
+            else:
+                st.markdown('<div class="result-rejected">', unsafe_allow_html=True)
+                st.markdown("### CRÉDITO REJEITADO")
+                st.markdown(f"**Probabilidade de Rejeição:** {probability[0]*100:.2f}%")
+                st.markdown("</div>", unsafe_allow_html=True)
+        
+        with col2:
+            st.markdown("**Detalhes da Análise**")
+            st.metric("Valor Solicitado", f"R$ {loan_amount:,.2f}")
+            st.metric("Renda Anual", f"R$ {income_annum:,.2f}")
+            st.metric("Score CIBIL", cibil_score)
+            st.metric("Razão Crédito/Renda", f"{credit_income_ratio:.2f}x")
+        
+        # Gráfico de probabilidade
+        st.markdown("---")
+        st.markdown("** Distribuição de Probabilidade**")
+        prob_df = pd.DataFrame({
+            'Classe': ['Aprovado', 'Rejeitado'],
+            'Probabilidade': [probability[1]*100, probability[0]*100]
+        })
+        st.bar_chart(prob_df.set_index('Classe'))
+        
+        # Análise de risco
+        st.markdown("---")
+        st.markdown("**Análise de Risco**")
+        
+        if result['risk_factors']:
+            for factor in result['risk_factors']:
+                st.markdown(f"- {factor}")
+        else:
+            st.success(" Nenhum fator de risco significativo identificado")
+        
+        st.markdown("**Principais Fatores da Decisão**")
+        st.dataframe(pd.DataFrame({
+            'Fator': [r['description'] for r in result['reasons']],
+            'Contribuição (log-odds)': [r['contribution'] for r in result['reasons']]
+        }), hide_index=True)
+        st.caption("Contribuições positivas aumentam a chance de aprovação; negativas, de rejeição.")
+        
+        grid = result['grid']
+        if grid is not None:
+            st.markdown("---")
+            st.markdown("**Simulação de Cenários (Valor x Prazo)**")
+            target = "aprovação" if not grid.base_approved else "rejeição"
+            flip = grid.minimal_flip()
+            if flip is None:
+                st.info(f"Nenhum cenário da grade leva à {target}.")
+            else:
+                new_amount = flip['values']['loan_amount']
+                new_term = int(flip['values']['loan_term'])
+                st.markdown(
+                    f"Menor mudança que leva à **{target}**: empréstimo de R$ {new_amount:,.2f} "
+                    f"({new_amount / loan_amount - 1:+.0%}) em {new_term} anos "
+                    f"(probabilidade de aprovação {flip['probability']*100:.1f}%)"
+                )
+            surface = grid.to_frame().pivot(index='loan_amount', columns='loan_term', values='probability')
+            surface.columns = [f"{int(term)} anos" for term in surface.columns]
+            st.line_chart(surface * 100)
+            st.caption(f"Probabilidade de aprovação (%) por valor do empréstimo, uma linha por prazo. "
+                       f"Limiar de decisão: {threshold*100:.0f}%.")
 
 # TAB 2: Análise em Lote
-with tab2:
+if page == PAGES[1]:
     st.markdown('<div class="sub-header">Análise em Lote</div>', unsafe_allow_html=True)
-    st.info(" Faça upload de um arquivo CSV com múltiplos clientes para análise em lote")
+    st.info(" Faça upload de um arquivo CSV, Parquet, Feather ou Arrow com múltiplos clientes para análise em lote")
     
     # Mostrar formato esperado
-    with st.expander(" Ver formato esperado do CSV"):
+    with st.expander(" Ver formato esperado do arquivo"):
         st.markdown("""
-        O arquivo CSV deve conter as seguintes colunas (nesta ordem):
+        O arquivo (CSV, Parquet, Feather ou Arrow) deve conter os seguintes campos (em qualquer ordem):
         
         1. `no_of_dependents` - Número de dependentes (0-10)
         2. `income_annum` - Renda anual (R$)
@@ -315,82 +401,309 @@ with tab2:
         7. `commercial_assets_value` - Valor ativos comerciais (R$)
         8. `luxury_assets_value` - Valor ativos de luxo (R$)
         9. `bank_asset_value` - Valor ativos bancários (R$)
-        10. `credit_income_ratio` - Razão crédito/renda
-        11. `total_assets` - Total de ativos (R$)
-        12. `assets_income_ratio` - Razão ativos/renda
-        13. `loan_assets_ratio` - Razão empréstimo/ativos
-        14. `high_debt` - Dívida alta (0 ou 1)
-        15. `low_cibil` - CIBIL baixo (0 ou 1)
-        16. `education_encoded` - Escolaridade (1=Graduate, 0=Not Graduate)
-        17. `self_employed_encoded` - Autônomo (1=Yes, 0=No)
+        10. `education_encoded` - Escolaridade (1=Graduate, 0=Not Graduate)
+        11. `self_employed_encoded` - Autônomo (1=Yes, 0=No)
+        
+        As features engineered (`credit_income_ratio`, `total_assets`, `assets_income_ratio`,
+        `loan_assets_ratio`, `high_debt`, `low_cibil`) são calculadas automaticamente;
+        se estiverem presentes no arquivo, são recalculadas a partir dos campos acima.
+        
+        Linhas com valores ausentes, não numéricos ou fora da faixa são retiradas da
+        análise e listadas no relatório de erros.
         
         **Veja o arquivo `exemplo_lote.csv` como referência.**
         """)
     
-    uploaded_file = st.file_uploader("Escolha um arquivo CSV", type=['csv'])
+    uploaded_file = st.file_uploader("Escolha um arquivo", type=scoring.formats.UPLOAD_TYPES)
     
     if uploaded_file is not None:
         try:
-            # Ler arquivo
-            batch_data = pd.read_csv(uploaded_file)
+            # Ler apenas o início do arquivo para a prévia; o processamento é feito em blocos
+            input_format = scoring.formats.detect_format(uploaded_file)
+            preview = scoring.formats.read_table(uploaded_file, fmt=input_format, nrows=10)
+            uploaded_file.seek(0)
+            scoring.batch.check_columns(preview.columns)
             
-            st.success(f" Arquivo carregado com sucesso! {len(batch_data)} registros encontrados.")
+            st.success(f" Arquivo carregado com sucesso! ({uploaded_file.size / 1024 / 1024:.1f} MB)")
             
             # Mostrar preview
             with st.expander("Visualizar dados carregados"):
-                st.dataframe(batch_data.head(10))
+                st.dataframe(preview)
             
+            col1, col2 = st.columns(2)
+            with col1:
+                workers = st.number_input(
+                    "Processos paralelos", min_value=1, max_value=os.cpu_count() or 1, value=1,
+                    help="Divide o arquivo em blocos pontuados por vários processos"
+                )
+            with col2:
+                output_format = st.selectbox("Formato dos resultados", ['csv', 'parquet', 'feather'])
+            explicar = st.checkbox(
+                "Incluir motivos da decisão (3 por cliente)",
+                help="Contribuições TreeSHAP de cada decisão; bem mais lento que o scoring"
+            )
+            reasons = 3 if explicar else 0
+            
+            # Resultado guardado na sessão: os reruns (inclusive o download) não repontuam o arquivo
+            batch_key = (uploaded_file.file_id, threshold, output_format, reasons, active_model.version)
             if st.button("Analisar Todos", type="primary"):
                 with st.spinner("Processando análises..."):
-                    # Pré-processar e fazer predições
-                    processed_data = preprocess_input(batch_data, scaler)
-                    predictions = model.predict(processed_data)
-                    probabilities = model.predict_proba(processed_data)
-                    
-                    # Adicionar resultados ao DataFrame original
-                    results_df = batch_data.copy()
-                    results_df['Predição'] = ['Aprovado' if p == 1 else 'Rejeitado' for p in predictions]
-                    results_df['Prob_Aprovado'] = probabilities[:, 1]
-                    results_df['Prob_Rejeitado'] = probabilities[:, 0]
-                    
-                    # Estatísticas
-                    st.markdown("---")
-                    st.markdown("**Estatísticas Gerais**")
+                    progresso = st.empty()
                     
-                    col1, col2, col3, col4 = st.columns(4)
+                    def mostrar_progresso(totais):
+                        progresso.text(f"{totais.total:,} registros processados...")
                     
+                    # A análise anterior da sessão é substituída: seus arquivos saem do disco
+                    session_files = st.session_state.setdefault('arquivos_lote', SessionFiles())
+                    previous = st.session_state.pop('analise_lote', None)
+                    if previous is not None:
+                        previous['pages'].close()
+                        session_files.remove(previous['path'], previous['errors_path'])
+
+                    # Pontuar em blocos, gravando os resultados e o relatório de erros em arquivos
+                    # da sessão (mantidos para a paginação e o download, removidos se o scoring
+                    # falhar); a cópia da entrada para os processos é sempre removida
+                    results_path = session_files.new(f'.{output_format}')
+                    errors_path = session_files.new('.csv')
+                    temp_paths = []
+                    scored = False
+                    try:
+                        # Drift em relação aos dados de treinamento (só se houver a referência)
+                        drift_reference = load_drift_reference()
+                        monitor = None
+                        if drift_reference is not None:
+                            monitor = scoring.drift.DriftMonitor(drift_reference, getattr(model, 'model_version', None))
+                        # Cada linha pontuada vai para o registro de decisões, com o nome do arquivo
+                        decisions = None
+                        if decision_log is not None:
+                            decisions = decision_log.recorder('lote', uploaded_file.name)
+                        # Agregados da carteira por segmento, acumulados bloco a bloco
+                        portfolio = scoring.portfolio.PortfolioSummary()
+                        if workers > 1:
+                            # Os processos leem o arquivo do disco
+                            input_path = session_files.new(f'.{input_format}')
+                            temp_paths.append(input_path)
+                            with open(input_path, 'wb') as f:
+                                f.write(uploaded_file.getbuffer())
+                            totals = scoring.batch.score_file_parallel(
+                                input_path, results_path, workers=workers,
+                                model_path=active_model.model_path, scaler_path=active_model.scaler_path,
+                                backend=model_server.backend,
+                                threshold=threshold, on_chunk=mostrar_progresso, reasons=reasons,
+                                errors=errors_path, monitor=monitor, decisions=decisions, portfolio=portfolio
+                            )
+                        else:
+                            totals = scoring.batch.score_file(
+                                model, scaler, uploaded_file, results_path,
+                                threshold=threshold, on_chunk=mostrar_progresso, input_format=input_format,
+                                reasons=reasons, errors=errors_path, monitor=monitor, decisions=decisions,
+                                portfolio=portfolio
+                            )
+                        progresso.empty()
+                        
+                        errors_preview = scoring.formats.read_table(errors_path, nrows=RESULTS_PREVIEW_ROWS)
+                        # Páginas lidas do arquivo de resultados em disco, sem carregá-lo na memória
+                        pages = scoring.formats.TablePages(results_path, output_format)
+                        scored = True
+                    finally:
+                        if not scored:
+                            temp_paths += [results_path, errors_path]
+                        session_files.remove(*temp_paths)
+                    # Só os caminhos vão para a sessão; o download lê o arquivo
+                    st.session_state['analise_lote'] = {
+                        'key': batch_key,
+                        'totals': totals,
+                        'portfolio': portfolio,
+                        'pages': pages,
+                        'path': results_path,
+                        'errors_preview': errors_preview,
+                        'errors_path': errors_path,
+                        'drift': monitor.report() if monitor is not None else None,
+                        'drifted': monitor.drifted() if monitor is not None else [],
+                        'file_name': f'analise_credito_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{output_format}'
+                    }
+            
+            result = st.session_state.get('analise_lote')
+            if result is not None and result['key'] == batch_key:
+                totals = result['totals']
+                
+                # Estatísticas
+                st.markdown("---")
+                st.markdown("**Estatísticas Gerais**")
+                
+                col1, col2, col3, col4 = st.columns(4)
+                
+                with col1:
+                    st.metric("Total de Análises", totals.total)
+                with col2:
+                    aprovados = totals.approved
+                    st.metric("Aprovados", aprovados, delta=f"{(aprovados/max(totals.total, 1)*100):.1f}%")
+                with col3:
+                    rejeitados = totals.rejected
+                    st.metric("Rejeitados", rejeitados, delta=f"{(rejeitados/max(totals.total, 1)*100):.1f}%")
+                with col4:
+                    prob_media = totals.mean_probability
+                    st.metric("Prob. Média Aprovação", f"{prob_media*100:.1f}%")
+                st.caption(
+                    f"Processado em {totals.elapsed:.2f}s ({totals.rows_per_second:,.0f} linhas/s, "
+                    f"{totals.workers} processo(s))"
+                )
+                
+                # Linhas rejeitadas pela validação do esquema (não pontuadas)
+                if totals.invalid:
+                    st.warning(f"{totals.invalid:,} linha(s) inválida(s) não foram pontuadas.")
+                    with st.expander("Ver relatório de erros"):
+                        st.dataframe(pd.DataFrame({
+                            'Coluna': list(totals.errors_by_column),
+                            'Erros': list(totals.errors_by_column.values())
+                        }), hide_index=True)
+                        st.dataframe(result['errors_preview'], hide_index=True)
+                        with open(result['errors_path'], 'rb') as f:
+                            st.download_button(
+                                label="Baixar Relatório de Erros (CSV)",
+                                data=f,
+                                file_name=result['file_name'].rsplit('.', 1)[0] + '_erros.csv',
+                                mime=scoring.formats.MIME_TYPES['csv'],
+                            )
+                
+                # Fatores de risco na carteira
+                st.markdown("**Fatores de Risco**")
+                rules = scoring.risk.RULES
+                st.dataframe(pd.DataFrame({
+                    'Fator': rules.messages,
+                    'Código': rules.codes,
+                    'Clientes': totals.risk_counts,
+                    '% da Carteira': totals.risk_counts / max(totals.total, 1) * 100
+                }), hide_index=True)
+                
+                # Drift dos dados em relação ao treinamento
+                if result['drift'] is not None:
+                    st.markdown("**Monitoramento de Drift**")
+                    if result['drifted']:
+                        st.warning(f"Distribuição diferente do treinamento em: {', '.join(result['drifted'])}")
+                    else:
+                        st.success("Sem drift em relação aos dados de treinamento.")
+                    with st.expander("Ver PSI e KS por feature"):
+                        st.dataframe(result['drift'].rename(columns={
+                            'feature': 'Feature', 'linhas': 'Linhas', 'psi': 'PSI', 'status_psi': 'Status PSI',
+                            'ks': 'KS', 'ks_critico': 'KS Crítico', 'drift_ks': 'Drift KS',
+                            'ausentes': '% Ausentes', 'fora_da_faixa': '% Fora da Faixa'
+                        }), hide_index=True)
+                
+                # Agregados da carteira por segmento (calculados durante o scoring, ver scoring/portfolio.py)
+                portfolio = result['portfolio']
+                if portfolio.total:
+                    st.markdown("**Análise da Carteira**")
+                    segmentos = {title: name for name, (title, _, _) in scoring.portfolio.SEGMENTS.items()}
+                    col1, col2 = st.columns(2)
                     with col1:
-                        st.metric("Total de Análises", len(batch_data))
+                        titulo = st.selectbox("Segmento", list(segmentos))
+                        segmento = segmentos[titulo]
+                        tabela = portfolio.segment(segmento)
+                        st.dataframe(pd.DataFrame({
+                            titulo: tabela[titulo],
+                            'Clientes': tabela['clientes'],
+                            'Aprovados': tabela['aprovados'],
+                            '% Aprovação': tabela['taxa_aprovacao'] * 100,
+                            'Prob. Média (%)': tabela['prob_media'] * 100,
+                            '% da Carteira': tabela['participacao'] * 100
+                        }).round(1), hide_index=True)
                     with col2:
-                        aprovados = (predictions == 1).sum()
-                        st.metric("Aprovados", aprovados, delta=f"{(aprovados/len(batch_data)*100):.1f}%")
-                    with col3:
-                        rejeitados = (predictions == 0).sum()
-                        st.metric("Rejeitados", rejeitados, delta=f"{(rejeitados/len(batch_data)*100):.1f}%")
-                    with col4:
-                        prob_media = probabilities[:, 1].mean()
-                        st.metric("Prob. Média Aprovação", f"{prob_media*100:.1f}%")
-                    
-                    # Mostrar resultados
-                    st.markdown("---")
-                    st.markdown("**Resultados Detalhados**")
-                    st.dataframe(results_df)
+                        st.caption(f"Taxa de aprovação - {titulo}")
+                        st.bar_chart(tabela.set_index(titulo)['taxa_aprovacao'])
                     
-                    # Download dos resultados
-                    csv = results_df.to_csv(index=False).encode('utf-8')
+                    filtro = st.selectbox(
+                        "Distribuição da probabilidade de aprovação",
+                        ["Carteira inteira"] + [f"{titulo}: {label}" for label in portfolio.segment_labels(segmento)]
+                    )
+                    if filtro == "Carteira inteira":
+                        histograma = portfolio.histogram()
+                    else:
+                        histograma = portfolio.histogram(segmento, filtro.split(': ', 1)[1])
+                    st.bar_chart(histograma.set_index('faixa_prob'))
+                
+                # Mostrar resultados: uma página por vez, lida do arquivo de resultados
+                st.markdown("---")
+                st.markdown("**Resultados Detalhados**")
+                pages = result['pages']
+                n_pages = max(1, -(-pages.rows // RESULTS_PREVIEW_ROWS))
+                pagina = 1
+                if n_pages > 1:
+                    pagina = st.number_input("Página", min_value=1, max_value=n_pages, value=1, step=1)
+                inicio = (pagina - 1) * RESULTS_PREVIEW_ROWS
+                resultados = pages.page(inicio, RESULTS_PREVIEW_ROWS)
+                resultados['Descrição_Risco'] = scoring.risk.RULES.reasons(resultados['Fatores_Risco'].to_numpy())
+                resultados.index = pd.RangeIndex(inicio + 1, inicio + 1 + len(resultados))
+                st.dataframe(resultados)
+                if n_pages > 1:
+                    st.caption(
+                        f"Linhas {inicio + 1:,} a {inicio + len(resultados):,} de {pages.rows:,} "
+                        f"(página {pagina} de {n_pages}); o arquivo completo está disponível para download."
+                    )
+                
+                # Download dos resultados, servido a partir do arquivo da sessão
+                with open(result['path'], 'rb') as f:
                     st.download_button(
-                        label="Baixar Resultados (CSV)",
-                        data=csv,
-                        file_name=f'analise_credito_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv',
-                        mime='text/csv',
+                        label=f"Baixar Resultados ({output_format.upper()})",
+                        data=f,
+                        file_name=result['file_name'],
+                        mime=scoring.formats.MIME_TYPES[output_format],
                     )
                     
         except Exception as e:
             st.error(f"Erro ao processar arquivo: {str(e)}")
             st.exception(e)
 
-# TAB 3: Sobre o Modelo
-with tab3:
+# TAB 3: Histórico de decisões (resumos pré-agregados e últimas decisões, ver scoring/decisions.py)
+if page == PAGES[2]:
+    st.markdown('<div class="sub-header">Histórico de Decisões</div>', unsafe_allow_html=True)
+    
+    if decision_log is None:
+        st.info("Registro de decisões desativado (CREDIT_DECISIONS_PATH vazio).")
+    else:
+        col1, col2 = st.columns(2)
+        with col1:
+            periodos = {f"Últimos {d} dias": d for d in (7, 30, 90, 365)}
+            days = periodos[st.selectbox("Período", list(periodos), index=1)]
+        with col2:
+            origens = {"Todas": None, "Individual": 'individual', "Lote": 'lote', "API": 'api'}
+            source = origens[st.selectbox("Origem", list(origens))]
+        
+        daily = scoring.decisions.daily_summary(decision_log.path, days, source)
+        total = int(daily['decisoes'].sum())
+        approved = int(daily['aprovados'].sum())
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Decisões", f"{total:,}")
+        with col2:
+            st.metric("Taxa de Aprovação", f"{approved / total * 100:.1f}%" if total else "-")
+        with col3:
+            pendentes = decision_log.pending
+            st.metric("Pendentes de Gravação", f"{pendentes:,}",
+                      help=f"Gravadas por este processo: {decision_log.written:,}; perdidas: {decision_log.dropped:,}")
+        
+        if total == 0:
+            st.info("Nenhuma decisão registrada no período.")
+        else:
+            col1, col2 = st.columns(2)
+            with col1:
+                st.markdown("#### Taxa de Aprovação por Dia")
+                st.line_chart(daily.set_index('dia')['taxa_aprovacao'])
+            with col2:
+                st.markdown("#### Decisões por Faixa de Probabilidade")
+                bands = scoring.decisions.band_summary(decision_log.path, days, source)
+                st.bar_chart(bands.set_index('faixa')[['aprovados', 'rejeitados']])
+            
+            st.markdown("#### Últimas Decisões")
+            filtros = {"Todas": None, "Aprovadas": 1, "Rejeitadas": 0}
+            decision = filtros[st.radio("Decisão", list(filtros), horizontal=True)]
+            st.dataframe(
+                scoring.decisions.recent(decision_log.path, scoring.decisions.RECENT_LIMIT, decision, source),
+                use_container_width=True, hide_index=True
+            )
+
+# TAB 4: Sobre o Modelo
+if page == PAGES[3]:
     st.markdown('<div class="sub-header">Sobre o Modelo</div>', unsafe_allow_html=True)
     
     col1, col2 = st.columns(2)
@@ -419,10 +732,13 @@ with tab3:
     
     with col2:
         st.markdown("### Métricas de Avaliação")
-        st.markdown("""
+        # O scaler só é aplicado se o modelo ativo foi treinado com as features normalizadas
+        normalizacao = ("Normalização com StandardScaler" if scaler.apply
+                        else "Features sem normalização (o modelo atual foi treinado sem StandardScaler)")
+        st.markdown(f"""
         **Métricas no Conjunto de Teste:**
         - **AUC Score:** 0.9509 (95.09%)
-        - **Recall (Rejeitado):** 0.8822 (88.22%)
+        - **Recall (Aprovado):** 0.8822 (88.22%)
         - **F1-Score:** 0.9011 (90.11%)
         
         **Features Mais Importantes:**
@@ -435,19 +751,39 @@ with tab3:
         
         **Pré-processamento:**
         - Engenharia de features
-        - Normalização com StandardScaler
+        - {normalizacao}
         - Codificação de variáveis categóricas
         """)
     
     st.markdown("---")
     
-    # Carregar e exibir comparação de modelos
-    try:
-        comparison_df = pd.read_csv('model_comparison.csv')
+    # Versão em produção e, se houver, comparação com o modelo em modo sombra
+    st.markdown("### Versão do Modelo")
+    st.caption(
+        f"Versão ativa: `{active_model.version}` (carregada e aquecida em {active_model.load_seconds:.2f}s)"
+    )
+    if model_server.shadow is not None:
+        shadow = model_server.shadow_stats()
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Modelo Sombra", shadow['version'])
+        with col2:
+            agreement = shadow['agreement']
+            st.metric("Concordância", f"{agreement*100:.1f}%" if agreement is not None else "-",
+                      help=f"{shadow['rows']:,} cliente(s) pontuados pelos dois modelos")
+        with col3:
+            latency = shadow['mean_latency_ms']
+            st.metric("Latência Sombra", f"{latency:.2f} ms" if latency is not None else "-")
+    if model_server.last_error:
+        st.warning(f"Última troca de modelo falhou: {model_server.last_error}")
+    
+    st.markdown("---")
+    
+    # Exibir comparação de modelos (lida do disco uma vez, ver load_model_comparison)
+    comparison_df = load_model_comparison()
+    if comparison_df is not None:
         st.markdown("### Comparação de Modelos")
         st.dataframe(comparison_df, use_container_width=True)
-    except:
-        pass
     
     st.markdown("---")
     st.markdown("### Etapas do Projeto")
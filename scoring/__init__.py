@@ -0,0 +1,9 @@
+"""Núcleo de scoring de crédito compartilhado pelo app Streamlit e pela API."""
+from scoring.engine import CompiledEnsemble
+from scoring.features import (
+    MODEL_COLUMNS, RAW_COLUMNS, SCALED_COLUMNS, build_features, build_features_frame, derive_features,
+    has_raw_columns, scale_features
+)
+from scoring.model import (
+    DECISION_THRESHOLD, load_model, load_scaler, predict_batch, predict_credit, preprocess_input, score
+)
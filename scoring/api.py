@@ -0,0 +1,194 @@
+"""
+API HTTP de scoring de crédito (sem interface).
+
+Serviço ASGI independente do Streamlit para sistemas de originação que
+precisam de uma decisão síncrona. Cada worker carrega o modelo uma única vez
+na inicialização.
+
+Requisições simultâneas em POST /score são agrupadas em micro-lotes
+(scoring/microbatch.py) e pontuadas como uma única matriz.
+
+O modelo vem do registro de modelos (scoring/registry.py): uma nova versão
+ativa é carregada e aquecida em segundo plano e trocada sem reiniciar os
+workers; uma versão em modo sombra pontua as mesmas requisições sem afetar as
+respostas.
+
+Cada decisão vai para o registro de decisões (scoring/decisions.py), gravado
+em segundo plano por um gravador por worker no mesmo banco.
+
+Execução:
+    uvicorn scoring.api:app --host 0.0.0.0 --port 8000 --workers 4
+"""
+from contextlib import asynccontextmanager
+from typing import List
+
+import numpy as np
+
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response
+from pydantic import BaseModel, Field, create_model
+
+from scoring.cache import create_cache
+from scoring.decisions import open_log
+from scoring.explain import explain
+from scoring.features import RAW_COLUMNS, MODEL_COLUMNS, build_features
+from scoring.metrics import CONTENT_TYPE, REGISTRY, register_cache, timed
+from scoring.microbatch import MAX_BATCH_SIZE, MicroBatcher
+from scoring.risk import RULES
+from scoring.model import DECISION_THRESHOLD, predict_batch, preprocess_input
+from scoring.registry import ModelServer
+from scoring.schema import FIELD_RANGES, INTEGER_FIELDS
+
+
+def _field(col):
+    """Tipo e limites de um campo, os mesmos da validação do lote (scoring/schema.py)"""
+    low, high = FIELD_RANGES[col]
+    return (int if col in INTEGER_FIELDS else float), Field(ge=low, le=high, allow_inf_nan=False)
+
+
+# Campos brutos de um cliente: o lote e a API aceitam as mesmas entradas
+Applicant = create_model('Applicant', **{col: _field(col) for col in RAW_COLUMNS})
+
+
+class BatchRequest(BaseModel):
+    applicants: List[Applicant]
+
+
+# Carregar modelo e scaler uma vez por worker; as trocas de versão chegam pelo registro
+server = ModelServer()
+server.refresh()
+server.watch()
+
+# Cache de predições por worker (CREDIT_CACHE_SIZE=0 desativa)
+cache = create_cache()
+register_cache(cache)
+
+# Registro de decisões por worker (CREDIT_DECISIONS_PATH vazio desativa)
+decision_log = open_log()
+
+
+# Limiar de decisão aceito como parâmetro opcional (?threshold=0.6)
+Threshold = Query(DECISION_THRESHOLD, gt=0, lt=1)
+
+# Motivos TreeSHAP por decisão (?reasons=3); 0 = sem explicações
+Reasons = Query(0, ge=0, le=len(MODEL_COLUMNS))
+
+
+def _score(applicants, threshold, reasons=0):
+    """
+    Calcula as features e pontua uma lista de clientes (threshold único ou um
+    por cliente). Com `reasons` > 0 inclui os motivos TreeSHAP de cada decisão.
+    """
+    # Modelo e scaler da mesma versão durante toda a requisição, mesmo com uma troca no meio
+    active = server.active
+    model, scaler = active.model, active.scaler
+    with timed('request', len(applicants)):
+        with timed('features', len(applicants)):
+            input_data = build_features({col: [getattr(a, col) for a in applicants] for col in RAW_COLUMNS})
+        risk_flags = RULES.evaluate(input_data)
+        predictions, probabilities = predict_batch(model, scaler, input_data, threshold, cache)
+        server.shadow_score(input_data, probabilities, threshold)
+        if decision_log is not None:
+            decision_log.record('api', input_data, probabilities[:, 1], predictions,
+                                getattr(model, 'model_version', None), threshold)
+        if reasons:
+            with timed('explain', len(applicants)):
+                explanations = explain(model, preprocess_input(input_data, scaler), predictions, reasons)
+
+    results = [
+        {
+            'prediction': 'Aprovado' if p == 1 else 'Rejeitado',
+            'label': int(p),
+            'prob_aprovado': float(prob[1]),
+            'prob_rejeitado': float(prob[0]),
+            'risk_flags': int(flags),
+            'risk_factors': RULES.codes_for(flags)
+        }
+        for p, prob, flags in zip(predictions, probabilities, risk_flags)
+    ]
+    if reasons:
+        for result, explanation in zip(results, explanations):
+            result['reasons'] = explanation
+    return results
+
+
+def _score_queued(items):
+    """Pontua um micro-lote de pedidos (cliente, threshold, motivos) em uma única passada"""
+    applicants = [applicant for applicant, _, _ in items]
+    thresholds = np.array([threshold for _, threshold, _ in items])
+    results = _score(applicants, thresholds, max(reasons for _, _, reasons in items))
+    # Cada pedido recebe só a quantidade de motivos que pediu
+    for result, (_, _, reasons) in zip(results, items):
+        if 'reasons' in result:
+            if reasons:
+                result['reasons'] = result['reasons'][:reasons]
+            else:
+                del result['reasons']
+    return results
+
+
+# Agrupamento dos pedidos individuais (CREDIT_BATCH_MAX_SIZE=1 desativa)
+batcher = MicroBatcher(_score_queued) if MAX_BATCH_SIZE > 1 else None
+
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    if batcher is not None:
+        await batcher.close()
+    if decision_log is not None:
+        decision_log.close()
+    server.close()
+
+
+app = FastAPI(title="Sistema de Análise de Crédito - API de Scoring", lifespan=lifespan)
+
+
+@app.get("/health")
+async def health():
+    return {'status': 'ok'}
+
+
+@app.get("/cache")
+def cache_stats():
+    """Acertos, falhas e ocupação do cache de predições deste worker"""
+    if cache is None:
+        return {'enabled': False}
+    return {'enabled': True, **cache.stats()}
+
+
+@app.get("/model")
+def model_info():
+    """Versão ativa deste worker e comparação com o modelo sombra"""
+    active = server.active
+    return {
+        'version': active.version,
+        'path': active.model_path,
+        'load_seconds': active.load_seconds,
+        'shadow': server.shadow_stats() if server.shadow is not None else None,
+        'last_error': server.last_error
+    }
+
+
+@app.get("/metrics")
+def metrics():
+    """Métricas deste worker no formato do Prometheus"""
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
+@app.post("/score")
+async def score(applicant: Applicant, threshold: float = Threshold, reasons: int = Reasons):
+    if batcher is not None:
+        return await batcher.submit((applicant, threshold, reasons))
+    # Sem micro-batching a pontuação (e o TreeSHAP, com reasons > 0) roda no
+    # pool de threads, sem bloquear o event loop
+    results = await run_in_threadpool(_score, [applicant], threshold, reasons)
+    return results[0]
+
+
+@app.post("/score/batch")
+def score_batch(request: BatchRequest, threshold: float = Threshold, reasons: int = Reasons):
+    if not request.applicants:
+        raise HTTPException(status_code=422, detail="Lista de clientes vazia")
+    return {'results': _score(request.applicants, threshold, reasons), 'threshold': threshold}
@@ -0,0 +1,541 @@
+"""
+Scoring em lote por streaming.
+
+Lê o arquivo de entrada em blocos, deriva as features, pontua e grava os
+resultados bloco a bloco, mantendo em memória apenas um bloco por vez e os
+totais acumulados. Usado pela aba "Análise em Lote" e pela linha de comando:
+
+    python -m scoring.batch X_test.csv -o resultados.csv --chunksize 100000
+    python -m scoring.batch carteira.parquet -o resultados.parquet
+
+Com --workers N os blocos são pontuados em paralelo por N processos, cada um
+carregando o modelo uma única vez; os resultados são gravados na ordem
+original das linhas.
+
+Cada bloco passa antes pela camada de esquema (scoring/schema.py): leitura
+tipada, colunas reordenadas e linhas inválidas retiradas para o relatório de
+erros (--errors), sem chegar ao modelo.
+
+Com --decision-log as decisões de cada linha vão para o registro de decisões
+(scoring/decisions.py), com o nome do arquivo e o número da linha.
+
+Com --portfolio a taxa de aprovação e a probabilidade média por faixa de
+CIBIL, prazo, escolaridade e autônomo (scoring/portfolio.py) são acumuladas
+bloco a bloco e impressas no final.
+"""
+import argparse
+import contextlib
+import io
+import itertools
+import multiprocessing.util
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from scoring.decisions import DECISIONS_PATH, DecisionLog
+from scoring.drift import DriftMonitor, load_reference, print_report
+from scoring.explain import REASONS_FOR, reason_columns
+from scoring.features import COLUMN_INDEX, ENGINEERED_COLUMNS, MODEL_COLUMNS, build_features
+from scoring.formats import TableWriter, detect_format, iter_batches, read_table
+from scoring.metrics import count_rows, timed
+from scoring.portfolio import PortfolioSummary
+from scoring.portfolio import print_report as print_portfolio
+from scoring.model import (
+    BACKENDS, DECISION_THRESHOLD, MODEL_BACKEND, MODEL_PATH, SCALER_PATH, load_model, load_scaler, predict_batch,
+    preprocess_input
+)
+from scoring.risk import RULES
+from scoring.schema import ERROR_COLUMNS, check_columns, parse_csv, validate
+
+DEFAULT_CHUNKSIZE = 50000
+
+# Colunas adicionadas ao arquivo de resultados
+RESULT_COLUMNS = ['Predição', 'Prob_Aprovado', 'Prob_Rejeitado', 'Fatores_Risco']
+
+LABELS = np.array(['Rejeitado', 'Aprovado'])
+
+
+class BatchTotals:
+    """
+    Totais acumulados durante o processamento (aprovados, rejeitados, prob.
+    média, fatores de risco e linhas inválidas)
+    """
+
+    def __init__(self):
+        self.total = 0
+        self.invalid = 0
+        self.errors_by_column = {}
+        self.approved = 0
+        self.prob_sum = 0.0
+        self.risk_counts = np.zeros(len(RULES), dtype=np.int64)
+        self.chunks = 0
+        self.elapsed = 0.0
+        self.workers = 1
+
+    @property
+    def rejected(self):
+        return self.total - self.approved
+
+    @property
+    def mean_probability(self):
+        return self.prob_sum / self.total if self.total else 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.total / self.elapsed if self.elapsed else 0.0
+
+    def add(self, rows, approved, prob_sum, risk_counts=None):
+        self.total += rows
+        self.approved += approved
+        self.prob_sum += prob_sum
+        if risk_counts is not None:
+            self.risk_counts += risk_counts
+        self.chunks += 1
+
+    def update(self, predictions, probabilities, risk_flags=None):
+        self.add(len(predictions), int(np.count_nonzero(predictions == 1)), float(probabilities[:, 1].sum()),
+                 RULES.counts(risk_flags) if risk_flags is not None else None)
+
+    def add_errors(self, errors):
+        """Acumula um bloco do relatório de erros da validação (scoring/schema.py)"""
+        if len(errors):
+            self.invalid += errors['linha'].nunique()
+            for col, count in errors['coluna'].value_counts().items():
+                self.errors_by_column[col] = self.errors_by_column.get(col, 0) + int(count)
+
+    def risk_summary(self):
+        """Linhas com cada fator de risco: {código: quantidade}"""
+        return dict(zip(RULES.codes, self.risk_counts.tolist()))
+
+    def as_dict(self):
+        return {
+            'total': self.total,
+            'aprovados': self.approved,
+            'rejeitados': self.rejected,
+            'prob_media_aprovacao': self.mean_probability,
+            'blocos': self.chunks,
+            'segundos': self.elapsed,
+            'linhas_por_segundo': self.rows_per_second,
+            'processos': self.workers,
+            'linhas_por_segundo_por_processo': self.rows_per_second / self.workers,
+            'fatores_risco': self.risk_summary(),
+            'linhas_invalidas': self.invalid,
+            'erros_por_coluna': dict(self.errors_by_column)
+        }
+
+
+def score_frame(model, scaler, data, threshold=DECISION_THRESHOLD, reasons=0, reasons_for='all', monitor=None,
+                decisions=None, rows=None, portfolio=None):
+    """
+    Pontua um DataFrame, retornando (resultados, classes, probabilidades).
+
+    Os resultados incluem Fatores_Risco, a máscara de bits das regras de
+    scoring/risk.py (bit i = regra i de RULES.codes). Com `reasons` > 0 são
+    acrescentados os motivos TreeSHAP de cada decisão (scoring/explain.py).
+    Com `monitor` (scoring.drift.DriftMonitor) as features e os scores do
+    bloco entram nas estatísticas de drift. Com `decisions`
+    (scoring.decisions.DecisionRecorder) as decisões são registradas, com o
+    número no arquivo de cada linha (`rows`, opcional). Com `portfolio`
+    (scoring.portfolio.PortfolioSummary) o bloco entra nos agregados da carteira.
+    """
+    with timed('features', len(data)):
+        input_data = build_features(data)
+        # Features derivadas vindas no arquivo são recalculadas; o resultado
+        # mostra os valores que o modelo usou, não os do arquivo
+        recomputed = {col: input_data[:, COLUMN_INDEX[col]].copy() for col in ENGINEERED_COLUMNS if col in data}
+    # As regras e o drift usam as features sem normalização; em seguida a
+    # normalização (se o modelo exigir) é feita no próprio array, sem cópia
+    with timed('risk', len(data)):
+        risk_flags = RULES.evaluate(input_data)
+    if monitor is not None:
+        with timed('drift', len(data)):
+            monitor.update_features(input_data)
+    # O registro e a carteira usam as features sem normalização; só há cópia se o scaler for aplicado
+    keep_features = decisions is not None or portfolio is not None
+    features = input_data.copy() if keep_features and scaler is not None and scaler.apply else input_data
+    with timed('preprocess', len(data)):
+        input_data = preprocess_input(input_data, scaler, out=input_data)
+    predictions, probabilities = predict_batch(model, None, input_data, threshold)
+    if monitor is not None:
+        monitor.update_scores(probabilities[:, 1])
+    if decisions is not None:
+        decisions.record(features, probabilities[:, 1], predictions, getattr(model, 'model_version', None),
+                         threshold, rows)
+    if portfolio is not None:
+        with timed('portfolio', len(data)):
+            portfolio.update(features, probabilities[:, 1], predictions)
+
+    results = data.copy()
+    for col, values in recomputed.items():
+        results[col] = values
+    results['Predição'] = LABELS[(predictions == 1).astype(int)]
+    results['Prob_Aprovado'] = probabilities[:, 1]
+    results['Prob_Rejeitado'] = probabilities[:, 0]
+    results['Fatores_Risco'] = risk_flags
+    if reasons:
+        with timed('explain', len(data)):
+            for name, values in reason_columns(model, input_data, predictions, reasons, reasons_for).items():
+                results[name] = values
+    return results, predictions, probabilities
+
+
+def validate_and_score(model, scaler, data, first_row=1, threshold=DECISION_THRESHOLD, reasons=0, reasons_for='all',
+                       monitor=None, decisions=None, portfolio=None):
+    """
+    Valida um bloco (scoring/schema.py) e pontua só as linhas válidas.
+    Retorna (resultados, classes, probabilidades, erros).
+    """
+    with timed('validation', len(data)):
+        valid, errors = validate(data, first_row)
+    rows = None
+    if decisions is not None and data.index.is_unique:
+        # Número no arquivo de cada linha válida
+        rows = first_row + data.index.get_indexer(valid.index)
+    return score_frame(model, scaler, valid, threshold, reasons, reasons_for, monitor, decisions, rows,
+                       portfolio) + (errors,)
+
+
+def score_chunks(model, scaler, chunks, threshold=DECISION_THRESHOLD, reasons=0, reasons_for='all', monitor=None,
+                 decisions=None, portfolio=None):
+    """Valida e pontua uma sequência de DataFrames, gerando (resultados, classes, probabilidades, erros)"""
+    first_row = 1
+    for chunk in chunks:
+        yield validate_and_score(model, scaler, chunk, first_row, threshold, reasons, reasons_for, monitor, decisions,
+                                 portfolio)
+        first_row += len(chunk)
+
+
+def _open_text(source):
+    """Abre um caminho ou arquivo binário (ex.: upload do Streamlit) como texto"""
+    if isinstance(source, (str, os.PathLike)):
+        return open(source, newline='')
+    return io.TextIOWrapper(source, encoding='utf-8', newline='')
+
+
+def read_chunks(source, chunksize=DEFAULT_CHUNKSIZE, input_format=None):
+    """
+    Blocos do arquivo de entrada. O CSV é separado em blocos de linhas e cada
+    bloco é interpretado com os tipos do esquema (schema.parse_csv); as colunas
+    são conferidas pelo cabeçalho, antes de qualquer leitura dos dados.
+    """
+    input_format = input_format or detect_format(source)
+    if input_format != 'csv':
+        check_columns(read_table(source, fmt=input_format, nrows=1).columns)
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        yield from iter_batches(source, chunksize, input_format)
+        return
+
+    src = _open_text(source)
+    try:
+        header = src.readline()
+        check_columns(pd.read_csv(io.StringIO(header)).columns)
+        for text, _ in _read_shards(src, chunksize):
+            yield parse_csv(header, text)
+    finally:
+        if isinstance(src, io.TextIOWrapper) and not isinstance(source, (str, os.PathLike)):
+            # Não fecha o arquivo de quem chamou
+            src.detach()
+        else:
+            src.close()
+
+
+def score_file(model, scaler, source, destination, threshold=DECISION_THRESHOLD,
+               chunksize=DEFAULT_CHUNKSIZE, on_chunk=None, input_format=None, output_format=None,
+               reasons=0, reasons_for='all', errors=None, monitor=None, decisions=None, portfolio=None):
+    """
+    Pontua um arquivo em blocos e grava os resultados incrementalmente.
+
+    Entrada e saída podem ser CSV, Parquet, Feather ou Arrow (pela extensão ou
+    pelos parâmetros *_format). `source` pode ser um caminho ou um arquivo
+    aberto; `destination` é um caminho.
+    `on_chunk(totais)` é chamado após cada bloco (ex.: barra de progresso).
+    `reasons` e `reasons_for` controlam os motivos TreeSHAP (ver score_frame).
+    `errors` é o caminho do relatório de linhas inválidas (opcional; sem ele
+    as linhas inválidas só são contadas).
+    `monitor` (scoring.drift.DriftMonitor) acumula as estatísticas de drift.
+    `decisions` (scoring.decisions.DecisionRecorder) registra as decisões.
+    `portfolio` (scoring.portfolio.PortfolioSummary) acumula os agregados da carteira.
+    Retorna os totais acumulados (BatchTotals).
+    """
+    totals = BatchTotals()
+    start = time.perf_counter()
+    chunks = read_chunks(source, chunksize, input_format)
+
+    with contextlib.ExitStack() as stack:
+        writer = stack.enter_context(TableWriter(destination, output_format))
+        error_writer = stack.enter_context(TableWriter(errors, columns=ERROR_COLUMNS)) if errors else None
+        for results, predictions, probabilities, chunk_errors in score_chunks(
+                model, scaler, chunks, threshold, reasons, reasons_for, monitor, decisions, portfolio):
+            with timed('serialization', len(results)):
+                writer.write(results)
+            _write_errors(error_writer, chunk_errors)
+            totals.add_errors(chunk_errors)
+            totals.update(predictions, probabilities, results['Fatores_Risco'].to_numpy())
+            totals.elapsed = time.perf_counter() - start
+            if on_chunk is not None:
+                on_chunk(totals)
+
+    totals.elapsed = time.perf_counter() - start
+    return totals
+
+
+def _write_errors(error_writer, errors):
+    if error_writer is not None and len(errors):
+        error_writer.write(errors)
+
+
+# Estado de cada processo do pool (modelo carregado uma vez por processo)
+_worker = {}
+
+
+def _init_worker(model_path, scaler_path, backend, threshold, header, output_format, reasons, reasons_for,
+                 drift_reference, decision_log=None, portfolio=False):
+    _worker['model'] = load_model(model_path, backend=backend)
+    _worker['scaler'] = load_scaler(scaler_path)
+    _worker['threshold'] = threshold
+    _worker['reasons'] = (reasons, reasons_for)
+    _worker['header'] = header
+    _worker['output_format'] = output_format
+    _worker['drift_reference'] = drift_reference
+    _worker['portfolio'] = portfolio
+    _worker['decisions'] = None
+    if decision_log is not None:
+        # Cada processo grava no mesmo banco (WAL) com o próprio gravador; o
+        # Finalize grava as pendentes quando o pool encerra o processo
+        path, source, reference = decision_log
+        log = DecisionLog(path)
+        multiprocessing.util.Finalize(log, log.close, exitpriority=10)
+        _worker['decisions'] = log.recorder(source, reference)
+
+
+def _score_shard(index, shard, first_row):
+    """
+    Valida e pontua um bloco dentro do processo. O bloco é texto CSV
+    (interpretado aqui) ou um DataFrame já lido de um formato colunar. A saída
+    CSV é serializada no próprio processo; para formatos colunares o DataFrame
+    volta para o gravador. O relatório de erros do bloco volta como DataFrame,
+    as estatísticas de drift do bloco, como um DriftMonitor (ou None) e os
+    agregados da carteira, como um PortfolioSummary (ou None).
+    """
+    if isinstance(shard, str):
+        shard = parse_csv(_worker['header'], shard)
+    monitor = None
+    if _worker['drift_reference'] is not None:
+        monitor = DriftMonitor(_worker['drift_reference'], getattr(_worker['model'], 'model_version', None))
+    portfolio = PortfolioSummary() if _worker['portfolio'] else None
+    results, predictions, probabilities, errors = validate_and_score(
+        _worker['model'], _worker['scaler'], shard, first_row, _worker['threshold'], *_worker['reasons'], monitor,
+        _worker['decisions'], portfolio
+    )
+    risk_counts = RULES.counts(results['Fatores_Risco'].to_numpy())
+    if _worker['output_format'] == 'csv':
+        results = results.to_csv(index=False, header=(index == 0))
+    return (results, len(predictions), int(np.count_nonzero(predictions == 1)), float(probabilities[:, 1].sum()),
+            risk_counts, errors, monitor, portfolio)
+
+
+def _read_shards(lines, chunksize):
+    """
+    Agrupa as linhas de texto em blocos de `chunksize` linhas, sem interpretá-las: (texto, linhas).
+    Um arquivo só com o cabeçalho gera um bloco vazio, que define as colunas do resultado.
+    """
+    empty = True
+    while True:
+        shard = list(itertools.islice(lines, chunksize))
+        if not shard:
+            break
+        empty = False
+        yield ''.join(shard), len(shard)
+    if empty:
+        yield '', 0
+
+
+def score_file_parallel(source, destination, workers=None, threshold=DECISION_THRESHOLD,
+                        chunksize=DEFAULT_CHUNKSIZE, model_path=MODEL_PATH, scaler_path=SCALER_PATH,
+                        backend=MODEL_BACKEND, on_chunk=None, input_format=None, output_format=None,
+                        reasons=0, reasons_for='all', errors=None, monitor=None, decisions=None,
+                        portfolio=None):
+    """
+    Pontua um arquivo em paralelo com um pool de processos.
+
+    Para CSV o processo principal só lê o texto bruto e grava os resultados; a
+    interpretação do CSV, as features, o modelo e a serialização rodam nos
+    processos. No máximo 2 blocos por processo ficam em andamento, mantendo a
+    memória limitada, e os blocos são gravados na ordem em que foram lidos.
+    Os blocos de CSV são separados por linha, então campos com quebra de linha
+    entre aspas não são suportados (os arquivos de scoring são numéricos).
+    As estatísticas de drift de cada bloco são somadas em `monitor` e os
+    agregados da carteira, em `portfolio`.
+    Com `decisions` (scoring.decisions.DecisionRecorder) cada processo grava
+    as decisões dos seus blocos no mesmo banco, com a origem e a referência
+    do gravador.
+    """
+    workers = workers or os.cpu_count() or 1
+    input_format = input_format or detect_format(source)
+    output_format = output_format or detect_format(destination)
+    totals = BatchTotals()
+    totals.workers = workers
+    start = time.perf_counter()
+
+    with contextlib.ExitStack() as stack:
+        writer = stack.enter_context(TableWriter(destination, output_format))
+        error_writer = stack.enter_context(TableWriter(errors, columns=ERROR_COLUMNS)) if errors else None
+        if input_format == 'csv':
+            src = stack.enter_context(open(source, newline=''))
+            header = src.readline()
+            check_columns(pd.read_csv(io.StringIO(header)).columns)
+            shards = _read_shards(src, chunksize)
+        else:
+            header = ''
+            check_columns(read_table(source, fmt=input_format, nrows=1).columns)
+            shards = ((chunk, len(chunk)) for chunk in iter_batches(source, chunksize, input_format))
+
+        pool = stack.enter_context(ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker,
+            initargs=(model_path, scaler_path, backend, threshold, header, output_format, reasons, reasons_for,
+                      monitor.reference if monitor is not None else None,
+                      (decisions.log.path, decisions.source, decisions.reference) if decisions is not None else None,
+                      portfolio is not None)
+        ))
+        pending = deque()
+
+        def write_next():
+            (results, rows, approved, prob_sum, risk_counts, chunk_errors, chunk_monitor,
+             chunk_portfolio) = pending.popleft().result()
+            with timed('serialization', rows):
+                if output_format == 'csv':
+                    writer.write_text(results, rows)
+                else:
+                    writer.write(results)
+            _write_errors(error_writer, chunk_errors)
+            totals.add_errors(chunk_errors)
+            if monitor is not None:
+                monitor.merge(chunk_monitor)
+            if portfolio is not None:
+                portfolio.merge(chunk_portfolio)
+            # As métricas dos processos do pool não chegam aqui; conta no principal
+            count_rows(rows)
+            totals.add(rows, approved, prob_sum, risk_counts)
+            totals.elapsed = time.perf_counter() - start
+            if on_chunk is not None:
+                on_chunk(totals)
+
+        first_row = 1
+        for index, (shard, shard_rows) in enumerate(shards):
+            pending.append(pool.submit(_score_shard, index, shard, first_row))
+            first_row += shard_rows
+            if len(pending) >= 2 * workers:
+                write_next()
+        while pending:
+            write_next()
+
+    totals.elapsed = time.perf_counter() - start
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scoring de crédito em lote (streaming por blocos)")
+    parser.add_argument('input', help="arquivo de entrada: CSV, Parquet, Feather ou Arrow "
+                                      "(mesmas colunas de X_test.csv ou só campos brutos)")
+    parser.add_argument('-o', '--output', required=True,
+                        help="arquivo de saída com as predições (formato pela extensão)")
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE, help="linhas por bloco")
+    parser.add_argument('--threshold', type=float, default=DECISION_THRESHOLD, help="limiar de aprovação")
+    parser.add_argument('--model', default=MODEL_PATH, help="arquivo do modelo")
+    parser.add_argument('--scaler', default=SCALER_PATH, help="arquivo do scaler")
+    parser.add_argument('--backend', default=MODEL_BACKEND, choices=BACKENDS, help="backend de inferência")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="processos em paralelo (0 = um por núcleo)")
+    parser.add_argument('--reasons', type=int, default=0, choices=range(len(MODEL_COLUMNS) + 1), metavar='N',
+                        help=f"motivos TreeSHAP por decisão, 0 a {len(MODEL_COLUMNS)} (0 = sem explicações)")
+    parser.add_argument('--reasons-for', default='all', choices=REASONS_FOR,
+                        help="explicar todas as decisões ou só as rejeições")
+    parser.add_argument('--errors', help="arquivo do relatório de linhas inválidas (ex.: erros.csv)")
+    parser.add_argument('--drift', action='store_true',
+                        help="compara os dados com a referência de treinamento (scoring/drift.py)")
+    parser.add_argument('--decision-log', nargs='?', const=DECISIONS_PATH or 'decisions.db', default=None,
+                        help="grava as decisões no registro (scoring/decisions.py; padrão: CREDIT_DECISIONS_PATH)")
+    parser.add_argument('--portfolio', action='store_true',
+                        help="taxa de aprovação por faixa de CIBIL, prazo, escolaridade e autônomo")
+    args = parser.parse_args(argv)
+
+    def report(totals):
+        print(f"\r   {totals.total:,} linhas processadas ({totals.rows_per_second:,.0f} linhas/s)",
+              end='', file=sys.stderr)
+
+    monitor = None
+    if args.drift:
+        reference = load_reference()
+        if reference is None:
+            print("Referência de drift não encontrada (gere com `python -m scoring.drift build`)", file=sys.stderr)
+            return 1
+        monitor = DriftMonitor(reference)
+
+    portfolio = PortfolioSummary() if args.portfolio else None
+    decision_log = None
+    decisions = None
+    if args.decision_log:
+        decision_log = DecisionLog(args.decision_log)
+        decisions = decision_log.recorder('lote', os.path.basename(args.input))
+
+    try:
+        if args.workers == 1:
+            model = load_model(args.model, backend=args.backend)
+            scaler = load_scaler(args.scaler)
+            if monitor is not None:
+                monitor = DriftMonitor(monitor.reference, getattr(model, 'model_version', None))
+            totals = score_file(model, scaler, args.input, args.output, args.threshold, args.chunksize, report,
+                                reasons=args.reasons, reasons_for=args.reasons_for, errors=args.errors,
+                                monitor=monitor, decisions=decisions, portfolio=portfolio)
+        else:
+            totals = score_file_parallel(
+                args.input, args.output, args.workers or None, args.threshold, args.chunksize,
+                args.model, args.scaler, args.backend, report,
+                reasons=args.reasons, reasons_for=args.reasons_for, errors=args.errors, monitor=monitor,
+                decisions=decisions, portfolio=portfolio
+            )
+    except ValueError as e:
+        print(f"\nErro: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if decision_log is not None:
+            decision_log.close(timeout=None)
+
+    print(file=sys.stderr)
+    print(f"Total de análises: {totals.total}")
+    print(f"Aprovados: {totals.approved} ({totals.approved / max(totals.total, 1) * 100:.1f}%)")
+    print(f"Rejeitados: {totals.rejected} ({totals.rejected / max(totals.total, 1) * 100:.1f}%)")
+    print(f"Prob. Média Aprovação: {totals.mean_probability * 100:.1f}%")
+    print(f"Tempo: {totals.elapsed:.2f}s ({totals.rows_per_second:,.0f} linhas/s)")
+    print(f"Processos: {totals.workers} ({totals.rows_per_second / totals.workers:,.0f} linhas/s por processo)")
+    if totals.invalid:
+        print(f"Linhas inválidas (não pontuadas): {totals.invalid}"
+              + (f" - relatório em {args.errors}" if args.errors else ""))
+        for col, count in totals.errors_by_column.items():
+            print(f"   {col}: {count}")
+    print("Fatores de risco:")
+    for code, count in totals.risk_summary().items():
+        print(f"   {code}: {count} ({count / max(totals.total, 1) * 100:.1f}%)")
+    if monitor is not None:
+        print("Drift em relação aos dados de treinamento:")
+        print_report(monitor)
+    if portfolio is not None:
+        print("Carteira por segmento:")
+        print_portfolio(portfolio)
+    if decision_log is not None and args.workers == 1:
+        print(f"Decisões registradas em {decision_log.path}: {decision_log.written:,}"
+              + (f" ({decision_log.dropped:,} perdidas: {decision_log.last_error})" if decision_log.dropped else ""))
+    elif decision_log is not None:
+        # Gravadas pelos processos do pool; as contagens ficam em cada processo
+        print(f"Decisões registradas em {decision_log.path} pelos processos do pool")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
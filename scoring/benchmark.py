@@ -0,0 +1,363 @@
+"""
+Benchmark reproduzível do scoring (latência, throughput, custo por etapa,
+memória e partida a frio).
+
+Os dados vêm de X_test e de uma amostra sintética com reposição de X_test
+(semente fixa), gerada bloco a bloco para chegar a milhões de linhas sem
+ocupar memória. O resultado é um JSON, para comparar commits na mesma máquina:
+
+    python -m scoring.benchmark -o benchmark.json
+    python -m scoring.benchmark --backend lightgbm compiled --rows 5000000 -o benchmark.json
+    python -m scoring.benchmark --quick
+
+Medições:
+    latency      latência por cliente (build_features + predict_credit), percentis em ms
+    throughput   linhas/s pontuando em lotes de vários tamanhos
+    stages       tempo por etapa sobre --rows linhas sintéticas: features,
+                 preprocess_input, inferência do modelo e serialização (CSV)
+    cold_start   novo processo: import, carregamento do modelo e 1ª predição
+    explain      custo das contribuições TreeSHAP comparado ao scoring simples,
+                 verificado contra o orçamento em scoring/explain.py
+    whatif       latência da simulação de cenários (grade valor x prazo) por
+                 cliente, verificada contra o orçamento em scoring/whatif.py
+    memory       pico de memória residente (RSS) do processo, acumulado após
+                 cada backend e ao final
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from scoring.batch import DEFAULT_CHUNKSIZE, LABELS
+from scoring.explain import COST_BUDGET, contributions
+from scoring.features import RAW_COLUMNS, build_features
+from scoring.formats import load_dataset
+from scoring.whatif import LATENCY_BUDGET_MS, sensitivity_grid
+from scoring.model import (
+    BACKENDS, MODEL_BACKEND, MODEL_PATH, SCALER_PATH, load_model, load_scaler, predict_credit,
+    preprocess_input, score
+)
+
+DEFAULT_ROWS = 1_000_000
+DEFAULT_ITERATIONS = 1000
+DEFAULT_BATCH_SIZES = [1, 10, 100, 1000, 10000, 100000]
+DEFAULT_SEED = 42
+PERCENTILES = [50, 90, 95, 99]
+
+# Tempo mínimo medido por tamanho de lote, para estabilizar lotes pequenos
+MIN_SECONDS = 0.5
+
+
+def peak_rss_mb():
+    """Pico de memória residente do processo (ru_maxrss é em KB no Linux)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def synthetic_chunks(base, rows, chunksize=DEFAULT_CHUNKSIZE, seed=DEFAULT_SEED):
+    """Gera `rows` linhas sorteadas com reposição de `base`, em blocos"""
+    rng = np.random.default_rng(seed)
+    values = base[RAW_COLUMNS].to_numpy()
+    for start in range(0, rows, chunksize):
+        index = rng.integers(0, len(values), size=min(chunksize, rows - start))
+        yield pd.DataFrame(values[index], columns=RAW_COLUMNS)
+
+
+def _summary_ms(samples_ns):
+    samples = np.asarray(samples_ns, dtype=np.float64) / 1e6
+    summary = {f'p{p}': float(np.percentile(samples, p)) for p in PERCENTILES}
+    summary.update(mean=float(samples.mean()), min=float(samples.min()), max=float(samples.max()))
+    return summary
+
+
+def bench_latency(model, scaler, X_test, iterations=DEFAULT_ITERATIONS):
+    """Latência de um cliente pelo mesmo caminho do app (dict -> features -> predição)"""
+    applicants = X_test[RAW_COLUMNS].head(iterations).to_dict('records')
+    applicants = (applicants * (iterations // len(applicants) + 1))[:iterations]
+    for applicant in applicants[:10]:
+        predict_credit(model, scaler, build_features(applicant))
+
+    samples = []
+    for applicant in applicants:
+        start = time.perf_counter_ns()
+        predict_credit(model, scaler, build_features(applicant))
+        samples.append(time.perf_counter_ns() - start)
+    return {'iterations': iterations, 'ms': _summary_ms(samples)}
+
+
+def bench_throughput(model, scaler, features, batch_sizes=DEFAULT_BATCH_SIZES):
+    """Linhas/s pontuando lotes de cada tamanho (features já calculadas)"""
+    results = {}
+    for batch_size in batch_sizes:
+        batch_size = min(batch_size, len(features))
+        batches = [features[i:i + batch_size] for i in range(0, len(features) - batch_size + 1, batch_size)]
+        score(model, preprocess_input(batches[0], scaler))
+
+        rows = 0
+        start = time.perf_counter()
+        elapsed = 0.0
+        while elapsed < MIN_SECONDS:
+            for batch in batches:
+                score(model, preprocess_input(batch, scaler))
+                rows += len(batch)
+                elapsed = time.perf_counter() - start
+                if elapsed >= MIN_SECONDS:
+                    break
+        results[str(batch_size)] = {
+            'rows': rows,
+            'seconds': elapsed,
+            'rows_per_second': rows / elapsed,
+            'ms_per_batch': elapsed / (rows / batch_size) * 1000
+        }
+    return results
+
+
+def bench_stages(model, scaler, base, rows=DEFAULT_ROWS, chunksize=DEFAULT_CHUNKSIZE, seed=DEFAULT_SEED):
+    """Tempo de cada etapa do scoring em lote sobre `rows` linhas sintéticas"""
+    stages = {'features': 0, 'preprocess': 0, 'inference': 0, 'serialization': 0}
+    total = 0
+    output_bytes = 0
+    for chunk in synthetic_chunks(base, rows, chunksize, seed):
+        t0 = time.perf_counter_ns()
+        input_data = build_features(chunk)
+        t1 = time.perf_counter_ns()
+        processed = preprocess_input(input_data, scaler)
+        t2 = time.perf_counter_ns()
+        predictions, probabilities = score(model, processed)
+        t3 = time.perf_counter_ns()
+        results = chunk.assign(**{
+            'Predição': LABELS[(predictions == 1).astype(int)],
+            'Prob_Aprovado': probabilities[:, 1],
+            'Prob_Rejeitado': probabilities[:, 0]
+        })
+        buffer = io.StringIO()
+        results.to_csv(buffer, index=False)
+        t4 = time.perf_counter_ns()
+
+        stages['features'] += t1 - t0
+        stages['preprocess'] += t2 - t1
+        stages['inference'] += t3 - t2
+        stages['serialization'] += t4 - t3
+        total += len(chunk)
+        output_bytes += buffer.tell()
+
+    seconds = sum(stages.values()) / 1e9
+    return {
+        'rows': total,
+        'chunksize': chunksize,
+        'seconds': seconds,
+        'rows_per_second': total / seconds,
+        'output_mb': output_bytes / 2**20,
+        'stages': {
+            name: {
+                'seconds': ns / 1e9,
+                'ns_per_row': ns / total,
+                'share': ns / (seconds * 1e9)
+            }
+            for name, ns in stages.items()
+        }
+    }
+
+
+def bench_explain(model, scaler, features, iterations=DEFAULT_ITERATIONS, batch_size=1000):
+    """Custo das contribuições TreeSHAP por cliente e em lote, contra o scoring simples"""
+    processed = preprocess_input(features, scaler)
+    rows = [processed[i:i + 1] for i in range(min(iterations, len(processed)))]
+    contributions(model, rows[0])
+
+    single = {}
+    for name, fn in (('score', lambda x: score(model, x)), ('explain', lambda x: contributions(model, x))):
+        samples = []
+        for row in rows:
+            start = time.perf_counter_ns()
+            fn(row)
+            samples.append(time.perf_counter_ns() - start)
+        single[name] = _summary_ms(samples)
+
+    batch = processed[:batch_size]
+    batch_ms = {}
+    for name, fn in (('score', lambda x: score(model, x)), ('explain', lambda x: contributions(model, x))):
+        start = time.perf_counter()
+        fn(batch)
+        batch_ms[name] = (time.perf_counter() - start) * 1000 / len(batch)
+
+    return {
+        'single_ms': single,
+        'batch_ms_per_row': batch_ms,
+        'overhead_ratio': {
+            'single_p50': single['explain']['p50'] / single['score']['p50'],
+            'batch': batch_ms['explain'] / batch_ms['score']
+        },
+        'budget': COST_BUDGET,
+        'within_budget': (single['explain']['p99'] <= COST_BUDGET['single_p99_ms'] and
+                          batch_ms['explain'] <= COST_BUDGET['batch_ms_per_row'])
+    }
+
+
+def bench_whatif(model, scaler, X_test, iterations=100):
+    """Latência da grade de cenários padrão por cliente (linhas com empréstimo > 0)"""
+    applicants = X_test[X_test['loan_amount'] > 0].head(iterations).to_dict('records')
+    sensitivity_grid(model, scaler, applicants[0])
+    samples = []
+    for applicant in applicants:
+        start = time.perf_counter_ns()
+        grid = sensitivity_grid(model, scaler, applicant)
+        grid.minimal_flip()
+        samples.append(time.perf_counter_ns() - start)
+    latency = _summary_ms(samples)
+    return {
+        'grid_points': int(grid.probabilities.size),
+        'latency_ms': latency,
+        'budget_ms': LATENCY_BUDGET_MS,
+        'within_budget': latency['p99'] <= LATENCY_BUDGET_MS
+    }
+
+
+_COLD_START = """
+import json, time
+start = time.perf_counter()
+from scoring.features import build_features
+from scoring.formats import load_dataset
+from scoring.whatif import LATENCY_BUDGET_MS, sensitivity_grid
+from scoring.model import load_model, load_scaler, predict_credit
+imported = time.perf_counter()
+model = load_model({model_path!r}, backend={backend!r})
+scaler = load_scaler({scaler_path!r})
+loaded = time.perf_counter()
+row = load_dataset('X_test').iloc[0].to_dict()
+data = time.perf_counter()
+predict_credit(model, scaler, build_features(row))
+predicted = time.perf_counter()
+print(json.dumps({{
+    'import_seconds': imported - start,
+    'load_seconds': loaded - imported,
+    'first_prediction_seconds': predicted - data
+}}))
+"""
+
+
+def bench_cold_start(backend, model_path=MODEL_PATH, scaler_path=SCALER_PATH):
+    """Partida a frio em um novo interpretador, do início do processo até a 1ª predição"""
+    code = _COLD_START.format(model_path=model_path, scaler_path=scaler_path, backend=backend)
+    start = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, '-W', 'ignore', '-c', code], capture_output=True, text=True, check=True
+    ).stdout
+    total = time.perf_counter() - start
+    return {'process_seconds': total, **json.loads(output.strip().splitlines()[-1])}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    """Versões e máquina, para só comparar resultados equivalentes"""
+    import lightgbm
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'lightgbm': lightgbm.__version__,
+        'platform': platform.platform(),
+        'processor': platform.machine(),
+        'cpu_count': os.cpu_count()
+    }
+
+
+def run(backends=(MODEL_BACKEND,), rows=DEFAULT_ROWS, iterations=DEFAULT_ITERATIONS,
+        batch_sizes=DEFAULT_BATCH_SIZES, chunksize=DEFAULT_CHUNKSIZE, seed=DEFAULT_SEED,
+        model_path=MODEL_PATH, scaler_path=SCALER_PATH, log=None):
+    """Executa o benchmark completo e retorna o relatório (dict serializável em JSON)"""
+    log = log or (lambda message: None)
+    X_test = load_dataset('X_test')
+    scaler = load_scaler(scaler_path)
+    features = build_features(X_test)
+
+    report = {
+        'environment': environment(),
+        'config': {
+            'rows': rows, 'iterations': iterations, 'batch_sizes': list(batch_sizes),
+            'chunksize': chunksize, 'seed': seed, 'model_path': model_path,
+            'test_rows': len(X_test)
+        },
+        'backends': {}
+    }
+    for backend in backends:
+        log(f"[{backend}] partida a frio")
+        cold_start = bench_cold_start(backend, model_path, scaler_path)
+        model = load_model(model_path, backend=backend)
+        report['config']['model_version'] = getattr(model, 'model_version', None)
+        log(f"[{backend}] latência ({iterations} clientes)")
+        latency = bench_latency(model, scaler, X_test, iterations)
+        log(f"[{backend}] throughput por tamanho de lote")
+        throughput = bench_throughput(model, scaler, features, batch_sizes)
+        log(f"[{backend}] etapas ({rows:,} linhas sintéticas)")
+        stages = bench_stages(model, scaler, X_test, rows, chunksize, seed)
+        log(f"[{backend}] explicações TreeSHAP")
+        explain = bench_explain(model, scaler, features, iterations)
+        log(f"[{backend}] simulação de cenários")
+        whatif = bench_whatif(model, scaler, X_test, min(iterations, 100))
+        report['backends'][backend] = {
+            'cold_start': cold_start,
+            'latency': latency,
+            'throughput': throughput,
+            'batch': stages,
+            'explain': explain,
+            'whatif': whatif,
+            'peak_rss_mb': peak_rss_mb()
+        }
+    report['memory'] = {'peak_rss_mb': peak_rss_mb()}
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de latência e throughput do scoring")
+    parser.add_argument('-o', '--output', help="arquivo JSON de saída (padrão: stdout)")
+    parser.add_argument('--backend', nargs='+', default=[MODEL_BACKEND], choices=BACKENDS,
+                        help="backends a medir")
+    parser.add_argument('--rows', type=int, default=DEFAULT_ROWS, help="linhas sintéticas do teste por etapa")
+    parser.add_argument('--iterations', type=int, default=DEFAULT_ITERATIONS, help="clientes no teste de latência")
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=DEFAULT_BATCH_SIZES)
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--scaler', default=SCALER_PATH)
+    parser.add_argument('--quick', action='store_true', help="execução curta (100 mil linhas, 200 clientes)")
+    args = parser.parse_args(argv)
+
+    if args.quick:
+        args.rows = min(args.rows, 100_000)
+        args.iterations = min(args.iterations, 200)
+
+    report = run(
+        args.backend, args.rows, args.iterations, args.batch_sizes, args.chunksize, args.seed,
+        args.model, args.scaler, log=lambda message: print(message, file=sys.stderr)
+    )
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+        print(f"Resultados gravados em {args.output}", file=sys.stderr)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,345 @@
+"""
+Bundle versionado do modelo (substitui os arquivos .pkl).
+
+Um bundle é um diretório com:
+
+    manifest.json   versão do formato, versão do modelo, ordem das features,
+                    parâmetros do scaler, metadados e checksum SHA-256 de cada arquivo
+    model.txt       modelo LightGBM em formato texto
+    engine/*.npy    árvores já compiladas em arrays (scoring/engine.py)
+
+Um modelo comprimido (scoring/compress.py) lista em `feature_names` só as
+features que usa e em `input_features` as 17 colunas de entrada; ele aceita as
+duas formas da matriz de features.
+
+Nenhum arquivo é desserializado com pickle. Os arrays do motor compilado são
+abertos com memory-map somente leitura, então vários workers no mesmo host
+compartilham as mesmas páginas e o carregamento leva milissegundos. Os
+checksums são verificados a cada carregamento (poucos milissegundos) e também
+ao registrar e promover uma versão (scoring/registry.py).
+
+Geração a partir dos artefatos atuais:
+    python -m scoring.bundle build --model lgbm_model_optimized.pkl --scaler scaler.pkl -o model_bundle
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from scoring.engine import CompiledEnsemble
+
+FORMAT_VERSION = 1
+MANIFEST = 'manifest.json'
+MODEL_FILE = 'model.txt'
+ENGINE_DIR = 'engine'
+
+
+class BundleError(Exception):
+    """Bundle inválido, incompatível ou corrompido"""
+
+
+class ScalerParams:
+    """
+    Parâmetros do StandardScaler (média e desvio por feature), sem sklearn/pickle.
+
+    `apply` indica se o modelo foi treinado com as features normalizadas; só
+    então preprocess_input aplica a transformação.
+    """
+
+    def __init__(self, feature_names, mean, scale, apply=False):
+        self.feature_names_in_ = np.asarray(feature_names, dtype=object)
+        self.mean_ = np.asarray(mean, dtype=np.float64)
+        self.scale_ = np.asarray(scale, dtype=np.float64)
+        self.apply = bool(apply)
+        self._affine = {}
+
+    @classmethod
+    def from_scaler(cls, scaler, apply=False):
+        return cls(scaler.feature_names_in_, scaler.mean_, scaler.scale_, apply)
+
+    def affine(self, columns):
+        """Média e desvio alinhados a `columns` (0 e 1 nas colunas não normalizadas)"""
+        key = tuple(columns)
+        if key not in self._affine:
+            mean = np.zeros(len(key))
+            scale = np.ones(len(key))
+            index = {col: i for i, col in enumerate(key)}
+            for name, m, sd in zip(self.feature_names_in_, self.mean_, self.scale_):
+                mean[index[name]] = m
+                scale[index[name]] = sd
+            self._affine[key] = (mean, scale)
+        return self._affine[key]
+
+    def to_dict(self):
+        return {
+            'features': [str(name) for name in self.feature_names_in_],
+            'mean': self.mean_.tolist(),
+            'scale': self.scale_.tolist()
+        }
+
+    def transform(self, X):
+        return (np.asarray(X, dtype=np.float64) - self.mean_) / self.scale_
+
+
+class BoosterModel:
+    """
+    lightgbm.Booster com a interface de predição do LGBMClassifier.
+
+    `input_columns` (modelo comprimido): posição de cada feature do modelo na
+    matriz de entrada completa, de `n_inputs` colunas.
+    """
+
+    def __init__(self, booster, classes=(0, 1), input_columns=None, n_inputs=None):
+        self.booster_ = booster
+        self.classes_ = np.asarray(classes)
+        self.n_features_in_ = booster.num_feature()
+        self.feature_name_ = booster.feature_name()
+        self.input_columns = None if input_columns is None else np.asarray(input_columns, dtype=np.intp)
+        self.n_inputs = self.n_features_in_ if n_inputs is None else int(n_inputs)
+
+    def predict_proba(self, X):
+        if hasattr(X, 'to_numpy'):
+            X = X.to_numpy(dtype=np.float64)
+        if self.input_columns is not None and np.ndim(X) == 2 and X.shape[1] == self.n_inputs:
+            X = X[:, self.input_columns]
+        positive = self.booster_.predict(X)
+        return np.vstack((1.0 - positive, positive)).T
+
+    def predict(self, X):
+        return self.classes_[(self.predict_proba(X)[:, 1] > 0.5).astype(int)]
+
+
+def _sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def build_bundle(model, scaler, destination, metadata=None, input_scaled=False, input_features=None):
+    """
+    Gera um bundle a partir de um LGBMClassifier treinado (ou BoosterModel) e do scaler.
+
+    `input_scaled` registra se o modelo foi treinado com as features
+    normalizadas pelo scaler (o modelo atual não foi). `input_features` são as
+    colunas de entrada de um modelo que usa só parte delas (scoring/compress.py).
+    Thresholds que cabem exatamente em float32 são gravados em float32.
+
+    O bundle é montado em um diretório temporário e movido para o destino só
+    no final, para que leitores nunca vejam um bundle incompleto.
+    """
+    compiled = CompiledEnsemble.from_model(model)
+    if np.array_equal(compiled.threshold.astype(np.float32), compiled.threshold):
+        compiled.threshold = compiled.threshold.astype(np.float32)
+    model_text = model.booster_.model_to_string()
+    feature_names = list(model.feature_name_)
+    params = model.get_params() if hasattr(model, 'get_params') else {}
+
+    parent = os.path.dirname(os.path.abspath(destination))
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix='.bundle-', dir=parent)
+    try:
+        with open(os.path.join(staging, MODEL_FILE), 'w') as f:
+            f.write(model_text)
+        os.makedirs(os.path.join(staging, ENGINE_DIR))
+        for name, values in compiled.arrays().items():
+            np.save(os.path.join(staging, ENGINE_DIR, name + '.npy'), np.ascontiguousarray(values))
+
+        files = {}
+        for root, _, names in os.walk(staging):
+            for name in names:
+                path = os.path.join(root, name)
+                files[os.path.relpath(path, staging).replace(os.sep, '/')] = _sha256(path)
+
+        manifest = {
+            'format_version': FORMAT_VERSION,
+            'model_version': files[MODEL_FILE][:12],
+            'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'feature_names': feature_names,
+            'classes': [int(c) for c in model.classes_],
+            'scaler': ScalerParams.from_scaler(scaler).to_dict() if scaler is not None else None,
+            'input_scaled': bool(input_scaled),
+            'engine': {
+                'n_trees': compiled.n_trees,
+                'max_depth': compiled.max_depth,
+                'n_features': compiled.n_features_in_
+            },
+            'metadata': {
+                'algorithm': 'LightGBM',
+                'lightgbm_params': {k: v for k, v in params.items() if _is_json_value(v)},
+                **(metadata or {})
+            },
+            'files': files
+        }
+        if input_features is not None and list(input_features) != feature_names:
+            manifest['input_features'] = list(input_features)
+        with open(os.path.join(staging, MANIFEST), 'w') as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
+
+        # mkdtemp cria o diretório só para o dono; o bundle é lido por outros usuários
+        os.chmod(staging, 0o755)
+        if os.path.exists(destination):
+            shutil.rmtree(destination)
+        os.replace(staging, destination)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return manifest
+
+
+def _is_json_value(value):
+    return value is None or isinstance(value, (bool, int, float, str))
+
+
+def is_bundle(path):
+    return os.path.isfile(os.path.join(path, MANIFEST))
+
+
+def read_manifest(path):
+    """Lê o manifest de um bundle, validando a versão do formato"""
+    try:
+        with open(os.path.join(path, MANIFEST)) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        raise BundleError(f"Bundle não encontrado: {path}")
+    if manifest.get('format_version') != FORMAT_VERSION:
+        raise BundleError(f"Versão de bundle não suportada: {manifest.get('format_version')}")
+    return manifest
+
+
+def verify_bundle(path, manifest=None, skip=()):
+    """
+    Confere o checksum de todos os arquivos listados no manifest, exceto os de
+    `skip` (conferidos por quem já lê os bytes do arquivo, como load_bundle)
+    """
+    manifest = manifest or read_manifest(path)
+    for name, expected in manifest['files'].items():
+        if name in skip:
+            continue
+        file_path = os.path.join(path, name)
+        if not os.path.exists(file_path):
+            raise BundleError(f"Arquivo ausente no bundle: {name}")
+        if _sha256(file_path) != expected:
+            raise BundleError(f"Checksum inválido no bundle: {name}")
+    return manifest
+
+
+def load_bundle(path, backend='compiled', verify=True):
+    """
+    Carrega o modelo de um bundle.
+
+    backend='compiled' abre os arrays do motor compilado com memory-map
+    (somente leitura); backend='lightgbm' carrega model.txt em um Booster.
+
+    Com `verify` o checksum SHA-256 de cada arquivo do manifest é conferido
+    antes de abrir o modelo; no backend lightgbm o model.txt é lido uma única
+    vez e o checksum é conferido nos mesmos bytes que vão para o Booster.
+    """
+    manifest = read_manifest(path)
+    if verify:
+        verify_bundle(path, manifest, skip=(MODEL_FILE,) if backend == 'lightgbm' else ())
+    classes = manifest['classes']
+    input_columns, n_inputs = None, None
+    if 'input_features' in manifest:
+        input_columns = [manifest['input_features'].index(name) for name in manifest['feature_names']]
+        n_inputs = len(manifest['input_features'])
+
+    if backend == 'compiled':
+        engine = manifest['engine']
+        arrays = {}
+        for name in CompiledEnsemble.ARRAYS:
+            file_name = f"{ENGINE_DIR}/{name}.npy"
+            try:
+                arrays[name] = np.load(os.path.join(path, ENGINE_DIR, name + '.npy'), mmap_mode='r')
+            except FileNotFoundError:
+                raise BundleError(f"Arquivo ausente no bundle: {file_name}")
+            except ValueError as e:
+                # Arquivo truncado: menor que o cabeçalho ou que os dados declarados nele
+                raise BundleError(f"Arquivo inválido no bundle: {file_name} ({e})")
+        model = CompiledEnsemble(
+            **arrays, max_depth=engine['max_depth'], n_features=engine['n_features'],
+            feature_names=manifest['feature_names'], classes=classes,
+            input_columns=input_columns, n_inputs=n_inputs
+        )
+    elif backend == 'lightgbm':
+        import lightgbm as lgb
+        try:
+            with open(os.path.join(path, MODEL_FILE), 'rb') as f:
+                model_bytes = f.read()
+        except FileNotFoundError:
+            raise BundleError(f"Arquivo ausente no bundle: {MODEL_FILE}")
+        # Checksum dos próprios bytes do Booster (o verify_bundle acima pulou este arquivo)
+        if verify and hashlib.sha256(model_bytes).hexdigest() != manifest['files'][MODEL_FILE]:
+            raise BundleError(f"Checksum inválido no bundle: {MODEL_FILE}")
+        model = BoosterModel(lgb.Booster(model_str=model_bytes.decode()), classes, input_columns, n_inputs)
+    else:
+        raise ValueError(f"Backend desconhecido: {backend}")
+
+    model.model_version = manifest['model_version']
+    model.bundle_path = path
+    return model
+
+
+def load_bundle_scaler(path):
+    """Parâmetros do scaler gravados no manifest (None se o bundle não tiver scaler)"""
+    manifest = read_manifest(path)
+    params = manifest.get('scaler')
+    if params is None:
+        return None
+    return ScalerParams(params['features'], params['mean'], params['scale'], manifest.get('input_scaled', False))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bundle versionado do modelo de crédito")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build = commands.add_parser('build', help="gera um bundle a partir dos arquivos .pkl")
+    build.add_argument('--model', default='lgbm_model_optimized.pkl')
+    build.add_argument('--scaler', default='scaler.pkl')
+    build.add_argument('-o', '--output', default='model_bundle')
+    build.add_argument('--scaled-input', action='store_true',
+                       help="o modelo foi treinado com as features normalizadas pelo scaler")
+
+    info = commands.add_parser('info', help="verifica e descreve um bundle")
+    info.add_argument('path', nargs='?', default='model_bundle')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        # pickle só é usado aqui, para converter os artefatos legados
+        import pickle
+        with open(args.model, 'rb') as f:
+            model = pickle.load(f)
+        with open(args.scaler, 'rb') as f:
+            scaler = pickle.load(f)
+        manifest = build_bundle(
+            model, scaler, args.output, {'source': os.path.basename(args.model)}, args.scaled_input
+        )
+        print(f"Bundle gerado em {args.output} (versão {manifest['model_version']})")
+        return 0
+
+    try:
+        start = time.perf_counter()
+        manifest = verify_bundle(args.path)
+        load_bundle(args.path, verify=False)
+        elapsed = time.perf_counter() - start
+    except BundleError as e:
+        print(f"Erro: {e}", file=sys.stderr)
+        return 1
+    print(f"Bundle: {args.path}")
+    print(f"   Versão do modelo: {manifest['model_version']} (criado em {manifest['created_at']})")
+    print(f"   Árvores: {manifest['engine']['n_trees']} | Features: {len(manifest['feature_names'])}")
+    print(f"   Checksums OK, carregado em {elapsed * 1000:.1f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
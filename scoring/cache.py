@@ -0,0 +1,147 @@
+"""
+Cache de predições (LRU com expiração por tempo).
+
+A chave é o hash do vetor canônico de 17 features (float64, na ordem de
+MODEL_COLUMNS) junto com a versão do modelo. Clientes reenviados com os mesmos
+dados reutilizam as probabilidades já calculadas; o limiar de decisão é
+aplicado depois, então o mesmo cache serve para qualquer threshold.
+
+Quando o modelo muda (outra `model_version`), o cache é esvaziado
+automaticamente na próxima consulta.
+
+Configuração por variáveis de ambiente:
+    CREDIT_CACHE_SIZE   número máximo de entradas (0 desativa o cache)
+    CREDIT_CACHE_TTL    segundos até uma entrada expirar (0 = sem expiração)
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+CACHE_SIZE = int(os.environ.get('CREDIT_CACHE_SIZE', 10000))
+CACHE_TTL = float(os.environ.get('CREDIT_CACHE_TTL', 3600))
+
+
+def feature_key(model_version, row):
+    """Hash de uma linha de features (-0.0 e 0.0 geram a mesma chave)"""
+    canonical = np.ascontiguousarray(row, dtype=np.float64) + 0.0
+    digest = hashlib.blake2b(canonical.tobytes(), digest_size=16).hexdigest()
+    return (model_version, digest)
+
+
+class PredictionCache:
+    """
+    Cache LRU de probabilidades por cliente, seguro para uso entre threads.
+
+    `predict_proba(model, X, compute)` devolve as probabilidades de todas as
+    linhas, chamando `compute` uma única vez só com as linhas ausentes do cache.
+    """
+
+    def __init__(self, maxsize=CACHE_SIZE, ttl=CACHE_TTL, clock=time.monotonic):
+        if maxsize <= 0:
+            raise ValueError("maxsize deve ser positivo")
+        self.maxsize = maxsize
+        self.ttl = ttl or None
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.model_version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _check_version(self, model_version):
+        # Modelo trocado: as probabilidades antigas não valem mais
+        if model_version != self.model_version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self.model_version = model_version
+
+    def _get(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, proba = entry
+        if expires_at is not None and now >= expires_at:
+            del self._entries[key]
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return proba
+
+    def _put(self, key, proba, now):
+        expires_at = now + self.ttl if self.ttl else None
+        self._entries[key] = (expires_at, proba)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def predict_proba(self, model, X, compute):
+        """Probabilidades (n_linhas, 2), calculando com `compute` só as linhas ausentes"""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        version = getattr(model, 'model_version', None)
+        keys = [feature_key(version, row) for row in X]
+        probabilities = np.empty((X.shape[0], 2), dtype=np.float64)
+
+        missing = []
+        with self._lock:
+            self._check_version(version)
+            now = self._clock()
+            for i, key in enumerate(keys):
+                proba = self._get(key, now)
+                if proba is None:
+                    missing.append(i)
+                else:
+                    probabilities[i] = proba
+            self.hits += X.shape[0] - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            computed = compute(X[missing])
+            probabilities[missing] = computed
+            with self._lock:
+                if version == self.model_version:
+                    now = self._clock()
+                    for i, proba in zip(missing, computed):
+                        self._put(keys[i], np.array(proba, dtype=np.float64), now)
+        return probabilities
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hit_rate,
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations,
+            'model_version': self.model_version
+        }
+
+
+def create_cache(maxsize=CACHE_SIZE, ttl=CACHE_TTL):
+    """Cache configurado pelo ambiente, ou None se CREDIT_CACHE_SIZE=0"""
+    return PredictionCache(maxsize, ttl) if maxsize > 0 else None
@@ -0,0 +1,276 @@
+"""
+Compressão do modelo para inferência mais rápida.
+
+A partir do modelo atual (bundle ou .pkl) gera um bundle menor:
+
+    features   as features sem nenhum split no ensemble (hoje high_debt e
+               low_cibil) saem do modelo. O bundle continua aceitando a matriz
+               de 17 colunas, lendo só as colunas usadas, e as probabilidades
+               não mudam
+    árvores    o ensemble é truncado no menor número de árvores cuja AUC em
+               X_test fica a até --auc-tolerance da AUC do modelo completo.
+               As AUCs de todos os tamanhos saem de uma única passada pelas
+               árvores (score acumulado, CompiledEnsemble.staged_raw)
+    float32    opcional: thresholds arredondados para float32, gravados com
+               metade do espaço no motor compilado. Só muda a decisão de um
+               split para valores entre o threshold original e o arredondado
+
+O relatório compara o modelo original e o comprimido: features, árvores,
+tamanho do bundle, AUC, concordância das decisões no limiar, maior diferença
+de probabilidade e latência (um cliente e lotes de 500 linhas).
+
+Truncar o ensemble muda as probabilidades (com learning_rate 0.01, menos
+árvores deixam os scores mais próximos da taxa base): confira a concordância
+das decisões e o limiar (scoring/evaluation.py) antes de ativar o bundle, de
+preferência em modo sombra no registro de modelos.
+
+Uso:
+    python -m scoring.compress                              # tolerância de 0.001 na AUC
+    python -m scoring.compress --no-truncate --float32      # só remove features e arredonda thresholds
+    python -m scoring.registry add model_bundle_compact --shadow
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from scoring.bundle import BoosterModel, build_bundle, is_bundle, read_manifest
+from scoring.engine import CompiledEnsemble
+from scoring.evaluation import Evaluation
+from scoring.features import MODEL_COLUMNS, build_features
+from scoring.model import DECISION_THRESHOLD, MODEL_BACKEND, MODEL_PATH, load_model, load_scaler, preprocess_input
+
+OUTPUT_PATH = 'model_bundle_compact'
+
+# Perda máxima de AUC (em X_test) aceita ao truncar o ensemble
+DEFAULT_AUC_TOLERANCE = 0.001
+
+# Features com menos que esta fração dos splits aparecem como quase sem uso no relatório
+LOW_USAGE_SHARE = 0.01
+
+BENCH_ITERATIONS = 500
+BENCH_BATCH_SIZE = 500
+BENCH_REPEATS = 3
+
+
+def feature_usage(booster):
+    """Número de splits e ganho total de cada feature, da mais para a menos usada"""
+    usage = pd.DataFrame({
+        'feature': booster.feature_name(),
+        'splits': booster.feature_importance('split'),
+        'ganho': booster.feature_importance('gain')
+    })
+    usage['participacao'] = usage['splits'] / usage['splits'].sum()
+    return usage.sort_values(['splits', 'ganho'], ascending=False, kind='stable', ignore_index=True)
+
+
+def unused_features(booster):
+    """Features que nenhuma árvore usa: removê-las não muda nenhuma predição"""
+    return [name for name, splits in zip(booster.feature_name(), booster.feature_importance('split')) if splits == 0]
+
+
+def truncation_curve(booster, X, y):
+    """AUC em (X, y) do ensemble truncado em cada número de árvores, DataFrame (arvores, auc)"""
+    staged = CompiledEnsemble.from_booster(booster).staged_raw(X)
+    # A AUC do score bruto é a mesma da probabilidade (a sigmoide preserva a ordem)
+    auc = [Evaluation(y, staged[:, k]).roc_auc() for k in range(staged.shape[1])]
+    return pd.DataFrame({'arvores': np.arange(1, staged.shape[1] + 1), 'auc': auc})
+
+
+def smallest_ensemble(curve, tolerance=DEFAULT_AUC_TOLERANCE):
+    """Menor número de árvores com AUC a até `tolerance` da AUC do ensemble completo"""
+    target = curve['auc'].iloc[-1] - tolerance
+    return int(curve.loc[curve['auc'] >= target, 'arvores'].iloc[0])
+
+
+def _float32(value):
+    # repr é a menor representação decimal que o LightGBM relê como o mesmo double
+    return repr(float(np.float32(float(value))))
+
+
+def compact_model_string(booster, keep=None, num_trees=None, float32=False):
+    """
+    Texto de um modelo LightGBM só com as features `keep` (na ordem original),
+    as primeiras `num_trees` árvores e, com float32=True, os thresholds
+    arredondados para float32.
+    """
+    names = booster.feature_name()
+    keep = names if keep is None else [name for name in names if name in set(keep)]
+    missing = set(names) - set(keep) - set(unused_features(booster))
+    if missing:
+        raise ValueError(f"Features usadas pelo modelo não podem ser removidas: {', '.join(sorted(missing))}")
+    position = {names.index(name): i for i, name in enumerate(keep)}
+
+    lines = []
+    # num_iteration=-1: todas as árvores
+    for line in booster.model_to_string(num_iteration=num_trees or -1).split('\n'):
+        key, _, value = line.partition('=')
+        if key == 'max_feature_idx':
+            line = f'max_feature_idx={len(keep) - 1}'
+        elif key == 'feature_names':
+            line = 'feature_names=' + ' '.join(keep)
+        elif key == 'feature_infos':
+            infos = value.split(' ')
+            line = 'feature_infos=' + ' '.join(infos[names.index(name)] for name in keep)
+        elif key == 'tree_sizes':
+            continue  # os tamanhos mudam; sem eles o LightGBM lê as árvores em sequência
+        elif key == 'split_feature':
+            line = 'split_feature=' + ' '.join(str(position[int(i)]) for i in value.split(' '))
+        elif key == 'threshold' and float32:
+            line = 'threshold=' + ' '.join(_float32(v) for v in value.split(' '))
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def _source_params(source, model):
+    """Parâmetros de treinamento do modelo de origem, para o manifest do bundle comprimido"""
+    if is_bundle(source):
+        return read_manifest(source)['metadata'].get('lightgbm_params', {})
+    return {k: v for k, v in model.get_params().items() if v is None or isinstance(v, (bool, int, float, str))}
+
+
+def evaluation_data(data='X_test', labels='y_test', scaler=None):
+    """Features (mesmo caminho do scoring) e classes do conjunto de avaliação"""
+    from scoring.formats import load_dataset
+    raw = load_dataset(data)
+    X = build_features(raw)
+    return raw, preprocess_input(X, scaler, out=X), load_dataset(labels).iloc[:, 0].to_numpy()
+
+
+def compress(source=MODEL_PATH, destination=OUTPUT_PATH, data='X_test', labels='y_test',
+             tolerance=DEFAULT_AUC_TOLERANCE, truncate=True, float32=False):
+    """
+    Gera o bundle comprimido em `destination`. Retorna (manifest, curva de
+    truncamento, features removidas).
+    """
+    import lightgbm as lgb
+    model = load_model(source, 'lightgbm', record=False)
+    scaler = load_scaler(source)
+    booster = model.booster_
+    _, X, y = evaluation_data(data, labels, scaler)
+
+    removed = unused_features(booster)
+    curve = truncation_curve(booster, X, y)
+    n_trees = smallest_ensemble(curve, tolerance) if truncate else booster.num_trees()
+    keep = [name for name in booster.feature_name() if name not in removed]
+    compact = lgb.Booster(model_str=compact_model_string(booster, keep, n_trees, float32))
+
+    metadata = {
+        'source': os.path.basename(os.path.normpath(source)),
+        'lightgbm_params': _source_params(source, model),
+        'compression': {
+            'removed_features': removed,
+            'n_trees': n_trees,
+            'original_trees': booster.num_trees(),
+            'auc_tolerance': tolerance if truncate else None,
+            'float32_thresholds': bool(float32)
+        }
+    }
+    manifest = build_bundle(BoosterModel(compact, model.classes_), scaler, destination, metadata,
+                            scaler is not None and scaler.apply, MODEL_COLUMNS)
+    return manifest, curve, removed
+
+
+def _size_kb(path):
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names) / 1024
+    return os.path.getsize(path) / 1024
+
+
+def compare(source, destination, data='X_test', labels='y_test', backend=MODEL_BACKEND,
+            threshold=DECISION_THRESHOLD, iterations=BENCH_ITERATIONS, repeats=BENCH_REPEATS):
+    """
+    Relatório lado a lado do modelo original e do comprimido (precisão e
+    latência). As medições dos dois modelos se alternam, após um aquecimento,
+    e vale a melhor de `repeats` rodadas: medir um modelo inteiro antes do
+    outro favorece o segundo.
+    """
+    from scoring.benchmark import bench_latency, bench_throughput
+    from scoring.model import score
+
+    runs = {}
+    for label, path in (('original', source), ('comprimido', destination)):
+        model = load_model(path, backend, record=False)
+        scaler = load_scaler(path)
+        raw, X, y = evaluation_data(data, labels, scaler)
+        bench_throughput(model, scaler, X, [BENCH_BATCH_SIZE])
+        runs[label] = {'path': path, 'model': model, 'scaler': scaler, 'raw': raw, 'X': X, 'y': y,
+                       'p50': [], 'p99': [], 'rows_per_second': []}
+    for _ in range(repeats):
+        for run in runs.values():
+            latency = bench_latency(run['model'], run['scaler'], run['raw'], iterations)['ms']
+            batch = bench_throughput(run['model'], run['scaler'], run['X'], [BENCH_BATCH_SIZE])
+            run['p50'].append(latency['p50'])
+            run['p99'].append(latency['p99'])
+            run['rows_per_second'].append(batch[str(BENCH_BATCH_SIZE)]['rows_per_second'])
+
+    columns = {}
+    probabilities = {}
+    for label, run in runs.items():
+        model = run['model']
+        _, proba = score(model, run['X'], threshold)
+        probabilities[label] = proba[:, 1]
+        columns[label] = {
+            'features': model.n_features_in_,
+            'árvores': model.n_trees if hasattr(model, 'n_trees') else model.booster_.num_trees(),
+            'tamanho (KB)': _size_kb(run['path']),
+            'AUC': Evaluation(run['y'], proba[:, 1]).roc_auc(),
+            'latência p50 (ms)': min(run['p50']),
+            'latência p99 (ms)': min(run['p99']),
+            f'linhas/s (lotes de {BENCH_BATCH_SIZE})': max(run['rows_per_second'])
+        }
+
+    report = pd.DataFrame(columns)
+    report['diferença'] = report['comprimido'] - report['original']
+    original, compact = probabilities['original'], probabilities['comprimido']
+    agreement = np.mean((original > threshold) == (compact > threshold))
+    return report, {'agreement': float(agreement), 'max_abs_diff': float(np.max(np.abs(original - compact)))}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compressão do modelo de crédito (features, árvores e thresholds)")
+    parser.add_argument('--model', default=MODEL_PATH, help="modelo de origem (bundle ou .pkl)")
+    parser.add_argument('-o', '--output', default=OUTPUT_PATH, help="bundle comprimido")
+    parser.add_argument('--data', default='X_test', help="dataset de avaliação (features)")
+    parser.add_argument('--labels', default='y_test', help="classes reais (1 = Aprovado)")
+    parser.add_argument('--auc-tolerance', type=float, default=DEFAULT_AUC_TOLERANCE,
+                        help="perda máxima de AUC ao truncar o ensemble")
+    parser.add_argument('--no-truncate', action='store_true', help="mantém todas as árvores")
+    parser.add_argument('--float32', action='store_true', help="arredonda os thresholds para float32")
+    parser.add_argument('--backend', default=MODEL_BACKEND, choices=('lightgbm', 'compiled'),
+                        help="backend usado no benchmark")
+    parser.add_argument('--iterations', type=int, default=BENCH_ITERATIONS, help="clientes no teste de latência")
+    parser.add_argument('--curve-output', default=None, help="grava a AUC por número de árvores neste CSV")
+    args = parser.parse_args(argv)
+
+    usage = feature_usage(load_model(args.model, 'lightgbm', record=False).booster_)
+    print("Uso das features no ensemble:")
+    print(usage.to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+    low = usage.loc[(usage['splits'] > 0) & (usage['participacao'] < LOW_USAGE_SHARE), 'feature'].tolist()
+    if low:
+        print(f"\nQuase sem uso (< {LOW_USAGE_SHARE:.0%} dos splits, mantidas por mudarem as predições): "
+              f"{', '.join(low)}")
+
+    manifest, curve, removed = compress(args.model, args.output, args.data, args.labels, args.auc_tolerance,
+                                        not args.no_truncate, args.float32)
+    compression = manifest['metadata']['compression']
+    print(f"\nBundle comprimido em {args.output} (versão {manifest['model_version']})")
+    print(f"   Features removidas: {', '.join(removed) or 'nenhuma'}")
+    print(f"   Árvores: {compression['n_trees']} de {compression['original_trees']}"
+          + (f" (tolerância de {args.auc_tolerance:g} na AUC)" if not args.no_truncate else ""))
+    if args.curve_output:
+        curve.to_csv(args.curve_output, index=False)
+
+    report, decisions = compare(args.model, args.output, args.data, args.labels, args.backend,
+                                iterations=args.iterations)
+    print(f"\nOriginal x comprimido (backend {args.backend}):")
+    print(report.to_string(float_format=lambda v: f"{v:.4f}"))
+    print(f"\nDecisões iguais no limiar {DECISION_THRESHOLD:g}: {decisions['agreement']:.2%} | "
+          f"maior diferença de probabilidade: {decisions['max_abs_diff']:.4f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,418 @@
+"""
+Registro persistente das decisões (trilha de auditoria).
+
+Cada decisão do app (aba individual e lote) e da API é gravada em um banco
+SQLite local com as 17 features (os campos de entrada e as calculadas), a
+probabilidade de aprovação, a decisão, o limiar, a versão do modelo, a origem
+e o horário.
+
+Gravação fora do caminho do scoring:
+    - record() só copia as features e põe o bloco em uma fila (microssegundos);
+    - uma thread grava a fila em lotes (até FLUSH_ROWS linhas ou FLUSH_INTERVAL
+      segundos), uma transação por lote, com o banco em modo WAL e
+      synchronous=NORMAL: leitores (a aba Histórico) não bloqueiam o gravador
+      e vários processos (workers da API, app) podem gravar no mesmo arquivo;
+    - com mais de MAX_PENDING_ROWS linhas pendentes, as decisões individuais e
+      da API são descartadas e contadas (credit_decisions_logged_total) em vez
+      de atrasar a resposta; o lote espera a fila esvaziar (block=True), para
+      não perder linhas de um arquivo.
+
+Consultas rápidas: a tabela decision_summary guarda, por dia (UTC), origem e
+faixa de probabilidade, o total de decisões, de aprovados e a soma das
+probabilidades, atualizada na mesma transação das inserções. A taxa de
+aprovação por dia e a distribuição por faixas não percorrem o registro; as
+últimas decisões usam os índices por horário e por decisão.
+
+Configuração: CREDIT_DECISIONS_PATH (padrão decisions.db; vazio desativa).
+
+Uso:
+    python -m scoring.decisions                     # resumo dos últimos 30 dias
+    python -m scoring.decisions --recent 20 --decision rejeitado
+"""
+import argparse
+import atexit
+import itertools
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from scoring.features import MODEL_COLUMNS
+from scoring.metrics import record_decisions
+from scoring.model import DECISION_THRESHOLD
+
+DECISIONS_PATH = os.environ.get('CREDIT_DECISIONS_PATH', 'decisions.db')
+
+# Origens das decisões
+SOURCES = ('individual', 'lote', 'api')
+
+# Gravação em lotes: até FLUSH_ROWS linhas ou FLUSH_INTERVAL segundos após a primeira pendente
+FLUSH_ROWS = 50000
+FLUSH_INTERVAL = 0.2
+MAX_PENDING_ROWS = 500000
+
+# Espera por um lock de outro processo antes de falhar (segundos)
+BUSY_TIMEOUT = 30
+
+# Faixas de probabilidade de aprovação do resumo (0-10%, 10-20%, ...)
+BANDS = 10
+
+RECENT_LIMIT = 100
+
+_META_COLUMNS = ['created_at', 'source', 'reference', 'row_number', 'model_version', 'threshold', 'probability',
+                 'decision']
+
+SCHEMA = [
+    f"""
+    CREATE TABLE IF NOT EXISTS decisions (
+        id INTEGER PRIMARY KEY,
+        created_at REAL NOT NULL,
+        source TEXT NOT NULL,
+        reference TEXT,
+        row_number INTEGER,
+        model_version TEXT,
+        threshold REAL NOT NULL,
+        probability REAL NOT NULL,
+        decision INTEGER NOT NULL,
+        {', '.join(f'{col} REAL' for col in MODEL_COLUMNS)}
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_decisions_created_at ON decisions (created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_decisions_decision ON decisions (decision, created_at)",
+    """
+    CREATE TABLE IF NOT EXISTS decision_summary (
+        day TEXT NOT NULL,
+        source TEXT NOT NULL,
+        band INTEGER NOT NULL,
+        decisions INTEGER NOT NULL,
+        approved INTEGER NOT NULL,
+        probability_sum REAL NOT NULL,
+        PRIMARY KEY (day, source, band)
+    ) WITHOUT ROWID
+    """
+]
+
+_INSERT = (f"INSERT INTO decisions ({', '.join(_META_COLUMNS + MODEL_COLUMNS)}) "
+           f"VALUES ({', '.join('?' * (len(_META_COLUMNS) + len(MODEL_COLUMNS)))})")
+
+_UPSERT_SUMMARY = """
+    INSERT INTO decision_summary (day, source, band, decisions, approved, probability_sum) VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (day, source, band) DO UPDATE SET
+        decisions = decisions + excluded.decisions,
+        approved = approved + excluded.approved,
+        probability_sum = probability_sum + excluded.probability_sum
+"""
+
+
+def connect(path=DECISIONS_PATH):
+    """Conexão em modo WAL, criando as tabelas e os índices se necessário"""
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    with conn:
+        for statement in SCHEMA:
+            conn.execute(statement)
+    return conn
+
+
+def _day(timestamp):
+    return time.strftime('%Y-%m-%d', time.gmtime(timestamp))
+
+
+class _Pending:
+    """Bloco de decisões aguardando gravação"""
+
+    __slots__ = ('created_at', 'source', 'reference', 'rows', 'model_version', 'threshold', 'probability',
+                 'decision', 'features')
+
+    def __init__(self, created_at, source, reference, rows, model_version, threshold, probability, decision,
+                 features):
+        self.created_at = created_at
+        self.source = source
+        self.reference = reference
+        self.rows = rows
+        self.model_version = model_version
+        self.threshold = threshold
+        self.probability = probability
+        self.decision = decision
+        self.features = features
+
+    def __len__(self):
+        return len(self.probability)
+
+    def records(self):
+        # Tuplas montadas coluna a coluna por zip, sem concatenar tuplas por linha
+        n = len(self)
+        return zip(
+            itertools.repeat(self.created_at, n), itertools.repeat(self.source, n),
+            itertools.repeat(self.reference, n),
+            self.rows.tolist() if self.rows is not None else itertools.repeat(None, n),
+            itertools.repeat(self.model_version, n), self.threshold.tolist(), self.probability.tolist(),
+            self.decision.tolist(), *self.features.T.tolist()
+        )
+
+    def summary(self):
+        """Linhas do decision_summary (dia, origem, faixa, decisões, aprovados, soma das probabilidades)"""
+        band = np.minimum((self.probability * BANDS).astype(np.intp), BANDS - 1)
+        counts = np.bincount(band, minlength=BANDS)
+        approved = np.bincount(band, weights=self.decision == 1, minlength=BANDS)
+        probability_sum = np.bincount(band, weights=self.probability, minlength=BANDS)
+        day = _day(self.created_at)
+        return [(day, self.source, b, int(counts[b]), int(approved[b]), float(probability_sum[b]))
+                for b in np.flatnonzero(counts).tolist()]
+
+
+class DecisionLog:
+    """
+    Gravador em segundo plano do registro de decisões (um por processo).
+
+    record() nunca toca o disco; flush() espera as decisões pendentes serem
+    gravadas e close() grava o restante e encerra a thread (chamado também na
+    saída do interpretador).
+    """
+
+    def __init__(self, path=DECISIONS_PATH, flush_rows=FLUSH_ROWS, flush_interval=FLUSH_INTERVAL,
+                 max_pending_rows=MAX_PENDING_ROWS):
+        self.path = path
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.max_pending_rows = max_pending_rows
+        self.written = 0
+        self.dropped = 0
+        self.last_error = None
+        self._pending_rows = 0
+        self._condition = threading.Condition()
+        self._queue = queue.Queue()
+        self._closed = False
+        # Cria o banco já na abertura: erros de caminho aparecem aqui, e não na thread
+        connect(path).close()
+        self._thread = threading.Thread(target=self._run, name='decision-log', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    @property
+    def pending(self):
+        return self._pending_rows
+
+    def record(self, source, features, probabilities, decisions, model_version=None, threshold=DECISION_THRESHOLD,
+               reference=None, rows=None, block=False):
+        """
+        Enfileira decisões: features (n, 17) sem normalização, probabilidade
+        de aprovação, classe (1 = Aprovado) e, opcionalmente, o número da linha
+        de cada uma no arquivo de origem. Retorna False se as decisões foram
+        descartadas (fila cheia com block=False ou registro fechado).
+        """
+        probability = np.array(probabilities, dtype=np.float64).reshape(-1)
+        n = len(probability)
+        if n == 0:
+            return True
+        if self._closed:
+            return False
+        with self._condition:
+            if self._pending_rows + n > self.max_pending_rows and self._pending_rows > 0:
+                if not block:
+                    self.dropped += n
+                    record_decisions(0, n)
+                    return False
+                self._condition.wait_for(lambda: self._pending_rows + n <= self.max_pending_rows
+                                         or self._pending_rows == 0)
+            self._pending_rows += n
+        self._queue.put(_Pending(
+            time.time(), source, reference, None if rows is None else np.array(rows, dtype=np.int64),
+            model_version, np.broadcast_to(np.asarray(threshold, dtype=np.float64), (n,)),
+            probability, np.array(decisions, dtype=np.int64).reshape(-1),
+            np.array(features, dtype=np.float64).reshape(n, len(MODEL_COLUMNS))
+        ))
+        return True
+
+    def recorder(self, source, reference=None, block=True):
+        """Gravador com origem e referência fixas (ex.: um arquivo do lote, scoring/batch.py)"""
+        return DecisionRecorder(self, source, reference, block)
+
+    def _collect(self):
+        """Primeiro bloco pendente e os que chegarem até FLUSH_ROWS linhas ou FLUSH_INTERVAL segundos"""
+        first = self._queue.get()
+        if first is None:
+            return [], True
+        batch, rows = [first], len(first)
+        deadline = time.monotonic() + self.flush_interval
+        while rows < self.flush_rows:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+            rows += len(item)
+        return batch, False
+
+    def _write(self, conn, batch):
+        rows = sum(len(item) for item in batch)
+        try:
+            with conn:
+                for item in batch:
+                    conn.executemany(_INSERT, item.records())
+                    conn.executemany(_UPSERT_SUMMARY, item.summary())
+            self.written += rows
+            record_decisions(rows, 0)
+        except sqlite3.Error as e:
+            # Um erro de disco não pode derrubar o scoring: as decisões do lote são contadas como perdidas
+            self.last_error = str(e)
+            self.dropped += rows
+            record_decisions(0, rows)
+        with self._condition:
+            self._pending_rows -= rows
+            self._condition.notify_all()
+
+    def _run(self):
+        conn = connect(self.path)
+        try:
+            stop = False
+            while not stop:
+                batch, stop = self._collect()
+                if batch:
+                    self._write(conn, batch)
+        finally:
+            conn.close()
+
+    def flush(self, timeout=None):
+        """Espera as decisões já enfileiradas serem gravadas; retorna False no timeout"""
+        with self._condition:
+            return self._condition.wait_for(lambda: self._pending_rows == 0, timeout)
+
+    def close(self, timeout=10):
+        """Grava as decisões pendentes e encerra a thread"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def stats(self):
+        return {'path': self.path, 'written': self.written, 'dropped': self.dropped, 'pending': self.pending,
+                'last_error': self.last_error}
+
+
+class DecisionRecorder:
+    """Origem e referência fixas para as decisões de um arquivo ou serviço"""
+
+    def __init__(self, log, source, reference=None, block=True):
+        self.log = log
+        self.source = source
+        self.reference = reference
+        self.block = block
+
+    def record(self, features, probabilities, decisions, model_version=None, threshold=DECISION_THRESHOLD, rows=None):
+        return self.log.record(self.source, features, probabilities, decisions, model_version, threshold,
+                               self.reference, rows, self.block)
+
+
+def open_log(path=DECISIONS_PATH):
+    """DecisionLog no caminho configurado (None se o registro estiver desativado)"""
+    return DecisionLog(path) if path else None
+
+
+def _query(path, sql, params=()):
+    """Consulta somente leitura (DataFrame vazio se o banco ainda não existir)"""
+    if not path or not os.path.exists(path):
+        return None
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT)
+    try:
+        return pd.read_sql_query(sql, conn, params=params)
+    finally:
+        conn.close()
+
+
+def _source_filter(source, column='source'):
+    return (f" AND {column} = ?", (source,)) if source else ('', ())
+
+
+def daily_summary(path=DECISIONS_PATH, days=30, source=None):
+    """Decisões, aprovados, taxa de aprovação e probabilidade média por dia (UTC), dos últimos `days` dias"""
+    where, params = _source_filter(source)
+    table = _query(path, f"""
+        SELECT day AS dia, SUM(decisions) AS decisoes, SUM(approved) AS aprovados,
+               SUM(probability_sum) AS soma_prob
+        FROM decision_summary WHERE day >= ?{where} GROUP BY day ORDER BY day
+    """, (_day(time.time() - (days - 1) * 86400),) + params)
+    if table is None:
+        table = pd.DataFrame(columns=['dia', 'decisoes', 'aprovados', 'soma_prob'])
+    table['taxa_aprovacao'] = table['aprovados'] / table['decisoes']
+    table['prob_media'] = table.pop('soma_prob') / table['decisoes']
+    return table
+
+
+def band_summary(path=DECISIONS_PATH, days=30, source=None):
+    """Decisões e aprovados por faixa de probabilidade de aprovação, nos últimos `days` dias"""
+    where, params = _source_filter(source)
+    table = _query(path, f"""
+        SELECT band, SUM(decisions) AS decisoes, SUM(approved) AS aprovados
+        FROM decision_summary WHERE day >= ?{where} GROUP BY band ORDER BY band
+    """, (_day(time.time() - (days - 1) * 86400),) + params)
+    counts = pd.DataFrame({'band': np.arange(BANDS)})
+    if table is not None:
+        counts = counts.merge(table, on='band', how='left')
+    counts = counts.reindex(columns=['band', 'decisoes', 'aprovados']).fillna(0)
+    counts[['decisoes', 'aprovados']] = counts[['decisoes', 'aprovados']].astype(np.int64)
+    counts.insert(0, 'faixa', [f"{b / BANDS:.0%}-{(b + 1) / BANDS:.0%}" for b in counts.pop('band')])
+    counts['rejeitados'] = counts['decisoes'] - counts['aprovados']
+    return counts
+
+
+def recent(path=DECISIONS_PATH, limit=RECENT_LIMIT, decision=None, source=None):
+    """Últimas decisões (mais recentes primeiro); `decision` = 1 (Aprovado) ou 0 (Rejeitado) filtra pelo índice"""
+    where = ' WHERE 1 = 1'
+    params = ()
+    if decision is not None:
+        where += ' AND decision = ?'
+        params += (int(decision),)
+    source_where, source_params = _source_filter(source)
+    table = _query(path, f"""
+        SELECT {', '.join(_META_COLUMNS + MODEL_COLUMNS)} FROM decisions{where}{source_where}
+        ORDER BY created_at DESC, id DESC LIMIT ?
+    """, params + source_params + (int(limit),))
+    if table is None:
+        table = pd.DataFrame(columns=_META_COLUMNS + MODEL_COLUMNS)
+    table['created_at'] = pd.to_datetime(table['created_at'], unit='s', utc=True)
+    table['decision'] = np.where(table['decision'] == 1, 'Aprovado', 'Rejeitado')
+    return table.rename(columns={
+        'created_at': 'data_hora', 'source': 'origem', 'reference': 'referencia', 'row_number': 'linha',
+        'model_version': 'versao_modelo', 'threshold': 'limiar', 'probability': 'prob_aprovado',
+        'decision': 'decisao'
+    })
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Consulta o registro de decisões")
+    parser.add_argument('--db', default=DECISIONS_PATH or 'decisions.db', help="banco do registro")
+    parser.add_argument('--days', type=int, default=30, help="período do resumo em dias")
+    parser.add_argument('--source', choices=SOURCES, default=None, help="só decisões desta origem")
+    parser.add_argument('--recent', type=int, default=0, help="lista as N últimas decisões")
+    parser.add_argument('--decision', choices=('aprovado', 'rejeitado'), default=None)
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.db):
+        print(f"Registro não encontrado: {args.db}", file=sys.stderr)
+        return 1
+    daily = daily_summary(args.db, args.days, args.source)
+    total = int(daily['decisoes'].sum())
+    approved = int(daily['aprovados'].sum())
+    print(f"Decisões nos últimos {args.days} dias: {total:,} ({approved / total if total else 0:.1%} aprovadas)")
+    print(daily.to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+    print("\nPor faixa de probabilidade de aprovação:")
+    print(band_summary(args.db, args.days, args.source).to_string(index=False))
+    if args.recent:
+        decision = None if args.decision is None else int(args.decision == 'aprovado')
+        print(f"\nÚltimas {args.recent} decisões:")
+        print(recent(args.db, args.recent, decision, args.source).to_string(index=False))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
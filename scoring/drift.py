@@ -0,0 +1,321 @@
+"""
+Monitor de drift e de qualidade dos dados de entrada em relação ao X_train.csv.
+
+Referência (calculada uma vez com `python -m scoring.drift build`): para cada
+uma das 17 features e para o score do modelo, os percentis de X_train (até 99
+pontos de corte), a contagem de linhas entre cada par de pontos e a faixa
+(mínimo e máximo) vista no treinamento. O arquivo JSON tem poucos KB e vai com
+o app (X_train não vai para a imagem Docker).
+
+Monitoramento (DriftMonitor, a cada bloco pontuado): uma ordenação por
+feature e a busca dos pontos de corte nos valores ordenados. A memória é fixa (contagens por faixa de percentil),
+independente do número de linhas, e os monitores de blocos ou processos
+diferentes podem ser somados (merge).
+
+Métricas por feature e para o score:
+    PSI         sobre os decis da referência: < 0.1 estável, 0.1 a 0.25
+                moderado, >= 0.25 significativo
+    KS          maior diferença entre as distribuições acumuladas nos
+                percentis; drift quando passa do valor crítico (alfa = 1%)
+    qualidade   proporção de valores ausentes e fora da faixa do treinamento
+
+Uso:
+    python -m scoring.drift build                 # gera drift_reference.json
+    python -m scoring.drift check carteira.csv    # relatório de um arquivo
+    python -m scoring.batch carteira.csv -o resultados.csv --drift
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from scoring.features import MODEL_COLUMNS, build_features
+
+REFERENCE_PATH = os.environ.get('CREDIT_DRIFT_REFERENCE', 'drift_reference.json')
+
+# Nome da "feature" da probabilidade de aprovação
+SCORE = 'score'
+
+# Limites do PSI (convenção usual em risco de crédito)
+PSI_MODERATE = 0.1
+PSI_SIGNIFICANT = 0.25
+
+# Coeficiente do valor crítico do KS de duas amostras para alfa = 1%
+KS_COEFFICIENT = 1.628
+
+# Proporção mínima usada no PSI para faixas vazias
+PSI_EPSILON = 1e-4
+
+_PERCENTILES = np.arange(1, 100) / 100
+# Os decis são os percentis 10, 20, ..., 90: os cortes do PSI são um subconjunto dos do KS
+_DECILES = slice(9, None, 10)
+
+
+def _bins(values, edges):
+    """Faixa de cada valor: faixa i contém edges[i-1] <= valor < edges[i]"""
+    return np.searchsorted(edges, values, side='right')
+
+
+def _bin_counts(values, edges):
+    """
+    Contagem de valores em cada faixa de _bins (valores ausentes são ignorados).
+    Ordenar o bloco e procurar os ~100 cortes nele é várias vezes mais rápido
+    que procurar cada valor nos cortes.
+    """
+    values = np.sort(values)
+    present = len(values)
+    if present and np.isnan(values[-1]):
+        # A ordenação deixa os ausentes no fim
+        present -= np.count_nonzero(np.isnan(values))
+    below = np.searchsorted(values[:present], edges, side='left')
+    return np.diff(below, prepend=0, append=present)
+
+
+class Reference:
+    """Esboço da distribuição de treinamento de cada feature e do score"""
+
+    def __init__(self, features, edges, decile_edges, counts, minimum, maximum, model_version=None):
+        self.features = list(features)
+        self.edges = [np.asarray(e, dtype=np.float64) for e in edges]
+        self.decile_edges = [np.asarray(e, dtype=np.float64) for e in decile_edges]
+        self.counts = [np.asarray(c, dtype=np.int64) for c in counts]
+        self.minimum = np.asarray(minimum, dtype=np.float64)
+        self.maximum = np.asarray(maximum, dtype=np.float64)
+        self.model_version = model_version
+        self.rows = int(self.counts[0].sum())
+        self.index = {feature: i for i, feature in enumerate(self.features)}
+        # Faixas usadas no monitoramento: os percentis mais uma faixa abaixo do
+        # mínimo e outra acima do máximo do treinamento, para contar os valores
+        # fora da faixa no mesmo searchsorted
+        self.bin_edges = [
+            np.concatenate([[low], e, [np.nextafter(high, np.inf)]])
+            for e, low, high in zip(self.edges, self.minimum, self.maximum)
+        ]
+        self.bin_counts = [np.concatenate([[0], c, [0]]) for c in self.counts]
+        # Decil que contém cada faixa (os cortes dos decis são um subconjunto
+        # dos percentis), para o PSI sem uma segunda passada
+        self.psi_groups = [
+            _bins(np.concatenate([[-np.inf], e]), d) for e, d in zip(self.bin_edges, self.decile_edges)
+        ]
+
+    @classmethod
+    def from_data(cls, X, scores=None, model_version=None):
+        """Referência a partir da matriz de features (n_linhas, 17) sem normalização e dos scores"""
+        columns = [np.asarray(X[:, i], dtype=np.float64) for i in range(len(MODEL_COLUMNS))]
+        features = list(MODEL_COLUMNS)
+        if scores is not None:
+            columns.append(np.asarray(scores, dtype=np.float64))
+            features.append(SCORE)
+
+        edges, decile_edges, counts = [], [], []
+        for values in columns:
+            values = values[~np.isnan(values)]
+            cuts = np.quantile(values, _PERCENTILES)
+            edges.append(np.unique(cuts))
+            decile_edges.append(np.unique(cuts[_DECILES]))
+            counts.append(_bin_counts(values, edges[-1]))
+        return cls(features, edges, decile_edges, counts, [np.nanmin(v) for v in columns],
+                   [np.nanmax(v) for v in columns], model_version)
+
+    def to_dict(self):
+        return {
+            'model_version': self.model_version,
+            'rows': self.rows,
+            'features': {
+                feature: {
+                    'edges': self.edges[i].tolist(),
+                    'decile_edges': self.decile_edges[i].tolist(),
+                    'counts': self.counts[i].tolist(),
+                    'min': float(self.minimum[i]),
+                    'max': float(self.maximum[i])
+                }
+                for i, feature in enumerate(self.features)
+            }
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        items = data['features'].values()
+        return cls(
+            data['features'].keys(),
+            [item['edges'] for item in items],
+            [item['decile_edges'] for item in items],
+            [item['counts'] for item in items],
+            [item['min'] for item in items],
+            [item['max'] for item in items],
+            data.get('model_version')
+        )
+
+    def save(self, path=REFERENCE_PATH):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f)
+
+
+def load_reference(path=REFERENCE_PATH):
+    """Referência salva por `python -m scoring.drift build` (None se o arquivo não existir)"""
+    if not path or not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return Reference.from_dict(json.load(f))
+
+
+def psi(expected, actual):
+    """Population Stability Index entre duas contagens por faixa"""
+    expected = np.maximum(expected / max(expected.sum(), 1), PSI_EPSILON)
+    actual = np.maximum(actual / max(actual.sum(), 1), PSI_EPSILON)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+
+def ks(expected, actual):
+    """Estatística KS (maior distância entre as acumuladas) entre duas contagens por faixa"""
+    expected = np.cumsum(expected) / max(expected.sum(), 1)
+    actual = np.cumsum(actual) / max(actual.sum(), 1)
+    return float(np.max(np.abs(expected - actual)))
+
+
+def ks_critical(n_expected, n_actual):
+    """Valor crítico do KS de duas amostras (alfa = 1%)"""
+    if not n_expected or not n_actual:
+        return float('inf')
+    return KS_COEFFICIENT * np.sqrt((n_expected + n_actual) / (n_expected * n_actual))
+
+
+def psi_status(value):
+    if value >= PSI_SIGNIFICANT:
+        return 'significativo'
+    if value >= PSI_MODERATE:
+        return 'moderado'
+    return 'estável'
+
+
+class DriftMonitor:
+    """
+    Estatísticas acumuladas dos dados pontuados, comparáveis à referência.
+
+    update_features recebe a matriz de features (n_linhas, 17) sem
+    normalização; update_scores, as probabilidades de aprovação. O score só é
+    monitorado se a referência foi gerada com a mesma versão do modelo.
+    """
+
+    def __init__(self, reference, model_version=None):
+        self.reference = reference
+        # Contagens por faixa (a primeira e a última são as de fora da faixa do treinamento)
+        self.counts = [np.zeros_like(c) for c in reference.bin_counts]
+        self.missing = np.zeros(len(reference.features), dtype=np.int64)
+        self.score_enabled = (SCORE in reference.index and
+                              (model_version is None or model_version == reference.model_version))
+
+    def _update(self, i, values):
+        counts = _bin_counts(values, self.reference.bin_edges[i])
+        self.counts[i] += counts
+        self.missing[i] += len(values) - counts.sum()
+
+    def update_features(self, X):
+        # Uma cópia transposta (colunas contíguas) é mais barata que ordenar colunas com passo
+        columns = np.asarray(X, dtype=np.float64)[:, :len(MODEL_COLUMNS)].T.copy()
+        for i, values in enumerate(columns):
+            self._update(i, values)
+
+    def update_scores(self, scores):
+        if self.score_enabled:
+            self._update(self.reference.index[SCORE], np.asarray(scores, dtype=np.float64))
+
+    def merge(self, other):
+        """Soma as estatísticas de outro monitor (ex.: de outro processo)"""
+        for mine, theirs in zip(self.counts, other.counts):
+            mine += theirs
+        self.missing += other.missing
+        self.score_enabled = self.score_enabled and other.score_enabled
+        return self
+
+    def report(self):
+        """Uma linha por feature (e pelo score): PSI, KS, drift e qualidade dos dados"""
+        reference = self.reference
+        rows = []
+        for i, feature in enumerate(reference.features):
+            if feature == SCORE and not self.score_enabled:
+                continue
+            counts = self.counts[i]
+            expected = reference.bin_counts[i]
+            groups = reference.psi_groups[i]
+            n_groups = len(reference.decile_edges[i]) + 1
+            value_psi = psi(np.bincount(groups, expected, n_groups), np.bincount(groups, counts, n_groups))
+            value_ks = ks(expected, counts)
+            rows_i = int(counts.sum())
+            critical = ks_critical(reference.rows, rows_i)
+            total = max(rows_i + int(self.missing[i]), 1)
+            rows.append({
+                'feature': feature,
+                'linhas': rows_i,
+                'psi': value_psi,
+                'status_psi': psi_status(value_psi) if rows_i else 'sem dados',
+                'ks': value_ks,
+                'ks_critico': critical,
+                'drift_ks': bool(value_ks > critical),
+                'ausentes': self.missing[i] / total,
+                'fora_da_faixa': (counts[0] + counts[-1]) / total
+            })
+        return pd.DataFrame(rows)
+
+    def drifted(self):
+        """Features (e score) com PSI significativo ou KS acima do valor crítico"""
+        report = self.report()
+        flagged = (report['status_psi'] == 'significativo') | report['drift_ks']
+        return report.loc[flagged, 'feature'].tolist()
+
+
+def build_reference(model, scaler, data):
+    """Referência a partir dos dados de treinamento e dos scores do modelo"""
+    from scoring.model import preprocess_input, score
+    X = build_features(data)
+    _, probabilities = score(model, preprocess_input(X.copy(), scaler))
+    return Reference.from_data(X, probabilities[:, 1], getattr(model, 'model_version', None))
+
+
+def print_report(monitor, file=None):
+    """Relatório de drift em texto (linha de comando)"""
+    report = monitor.report()
+    with pd.option_context('display.width', 120, 'display.max_columns', None):
+        print(report.to_string(index=False, float_format=lambda v: f"{v:.4f}"), file=file)
+    drifted = monitor.drifted()
+    print(f"Drift em: {', '.join(drifted)}" if drifted else "Sem drift detectado", file=file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Referência e relatório de drift dos dados de entrada")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build = subparsers.add_parser('build', help="gera a referência a partir dos dados de treinamento")
+    build.add_argument('--data', default='X_train', help="dataset de treinamento (X_train)")
+    build.add_argument('-o', '--output', default=REFERENCE_PATH, help="arquivo da referência")
+    check = subparsers.add_parser('check', help="relatório de drift de um arquivo")
+    check.add_argument('input', help="arquivo a comparar (CSV, Parquet, Feather ou Arrow)")
+    check.add_argument('--reference', default=REFERENCE_PATH, help="arquivo da referência")
+    args = parser.parse_args(argv)
+
+    from scoring.formats import load_dataset
+    from scoring.model import load_model, load_scaler
+
+    if args.command == 'build':
+        reference = build_reference(load_model(), load_scaler(), load_dataset(args.data))
+        reference.save(args.output)
+        print(f"Referência de {reference.rows} linhas gravada em {args.output}")
+        return 0
+
+    reference = load_reference(args.reference)
+    if reference is None:
+        print(f"Referência não encontrada: {args.reference} (gere com `python -m scoring.drift build`)",
+              file=sys.stderr)
+        return 1
+    from scoring.batch import score_file
+    model = load_model()
+    monitor = DriftMonitor(reference, getattr(model, 'model_version', None))
+    score_file(model, load_scaler(), args.input, os.devnull, output_format='csv', monitor=monitor)
+    print_report(monitor)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,336 @@
+"""
+Motor de inferência compilado para o ensemble LightGBM.
+
+As árvores do modelo são exportadas uma única vez, no carregamento, para
+arrays planos do NumPy (feature de split, threshold, filhos e valor das
+folhas), e a predição não percorre as árvores nível a nível.
+
+Cada nó interno descarta as folhas de uma das suas subárvores. Os thresholds
+de uma feature dividem a reta em intervalos onde todas as decisões dos nós
+dessa feature são fixas; no carregamento é calculada, para cada intervalo, a
+máscara de bits das folhas ainda possíveis em cada árvore. A predição localiza
+o intervalo de cada valor (um único searchsorted para todas as features),
+combina as máscaras das features com E bit a bit e sobra exatamente um bit
+por árvore, cuja folha é encontrada pelo resto da divisão do bit por 37 (67
+com mais de 32 folhas): 2 é raiz primitiva módulo 37 e 67, então os restos
+das potências de 2 são distintos. O número de operações do NumPy não depende
+da profundidade nem do número de árvores.
+
+As probabilidades são idênticas bit a bit às de `predict_proba` do
+LGBMClassifier: as comparações usam float64, as regras de valores ausentes
+são as mesmas do LightGBM, as árvores são somadas na mesma ordem e a sigmoide
+usa a exp da libm, como o LightGBM (np.exp pode diferir em 1 ulp).
+"""
+import math
+
+import numpy as np
+
+# Códigos de missing_type (mesma semântica do LightGBM)
+MISSING_NONE = 0
+MISSING_ZERO = 1
+MISSING_NAN = 2
+
+_MISSING_TYPES = {'None': MISSING_NONE, 'Zero': MISSING_ZERO, 'NaN': MISSING_NAN}
+
+# Valores com módulo até este limite são tratados como zero (kZeroThreshold)
+ZERO_THRESHOLD = 1e-35
+
+# Valores de módulo maior são limitados a este antes das comparações (AvoidInf do LightGBM)
+MAX_VALUE = 1e300
+
+# Linhas avaliadas por bloco, para manter as matrizes (linhas x árvores) no cache
+DEFAULT_BLOCK_SIZE = 256
+
+# Blocos até este tamanho combinam as máscaras das features com uma única redução;
+# os maiores, feature a feature, sem a matriz (linhas x features x árvores)
+REDUCE_MAX_ROWS = 32
+
+# (folhas por árvore, tipo da máscara, módulo que separa as potências de 2)
+_MASK_TYPES = ((32, np.uint32, 37), (64, np.uint64, 67))
+
+
+def _go_right(fval, threshold, missing_type, default_left):
+    """Decisão de cada nó para os valores `fval` (regras de ausentes do LightGBM)"""
+    is_nan = np.isnan(fval)
+    fval = np.where(is_nan & (missing_type != MISSING_NAN), 0.0, fval)
+    is_missing = (((missing_type == MISSING_ZERO) & (np.abs(fval) <= ZERO_THRESHOLD)) |
+                  ((missing_type == MISSING_NAN) & is_nan))
+    return np.where(is_missing, ~default_left, ~(fval <= threshold))
+
+
+def sigmoid(raw):
+    """1 / (1 + exp(-raw)) com a exp da libm, bit a bit igual à sigmoide do LightGBM"""
+    exp = np.fromiter(map(math.exp, (-raw).tolist()), dtype=np.float64, count=len(raw))
+    return 1.0 / (1.0 + exp)
+
+
+class CompiledEnsemble:
+    """
+    Ensemble de árvores em arrays planos, com a mesma interface de predição do
+    LGBMClassifier (predict, predict_proba, classes_).
+
+    Folhas são nós cujos dois filhos apontam para o próprio nó. As tabelas de
+    máscaras (ver o início do módulo) são montadas a partir desses arrays na
+    construção, em alguns milissegundos.
+    """
+
+    # Arrays que definem o ensemble (salvos no bundle do modelo, ver scoring/bundle.py).
+    # threshold também pode ser float32 (modelo comprimido, scoring/compress.py)
+    ARRAYS = {
+        'split_feature': np.intp,
+        'threshold': np.float64,
+        'children': np.intp,
+        'leaf_value': np.float64,
+        'default_left': np.bool_,
+        'missing_type': np.int8,
+        'roots': np.intp
+    }
+
+    def __init__(self, split_feature, threshold, children, leaf_value, default_left,
+                 missing_type, roots, max_depth, n_features, feature_names=None, classes=(0, 1),
+                 input_columns=None, n_inputs=None):
+        # np.asarray não copia arrays já no tipo certo, preservando memory-maps
+        self.split_feature = np.asarray(split_feature, dtype=np.intp)
+        self.threshold = np.asarray(threshold)
+        if self.threshold.dtype not in (np.float32, np.float64):
+            self.threshold = self.threshold.astype(np.float64)
+        # Filhos intercalados: children[2 * nó] = esquerdo, children[2 * nó + 1] = direito
+        self.children = np.asarray(children, dtype=np.intp)
+        self.leaf_value = np.asarray(leaf_value, dtype=np.float64)
+        self.default_left = np.asarray(default_left, dtype=np.bool_)
+        self.missing_type = np.asarray(missing_type, dtype=np.int8)
+        self.roots = np.asarray(roots, dtype=np.intp)
+        self.max_depth = int(max_depth)
+        self.n_features_in_ = int(n_features)
+        self.feature_names = list(feature_names) if feature_names is not None else None
+        self.classes_ = np.asarray(classes)
+        # Modelo sem as features não usadas (scoring/compress.py): posição de cada
+        # feature do modelo na matriz de entrada completa (n_inputs colunas), que
+        # continua aceita sem cópia, lendo as colunas direto pelo índice
+        self.input_columns = None if input_columns is None else np.asarray(input_columns, dtype=np.intp)
+        self.n_inputs = self.n_features_in_ if n_inputs is None else int(n_inputs)
+        self._build_tables()
+
+    def arrays(self):
+        """Arrays do ensemble, na forma usada para salvar e recarregar o modelo"""
+        return {name: getattr(self, name) for name in self.ARRAYS}
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @classmethod
+    def from_booster(cls, booster, classes=(0, 1)):
+        """Exporta as árvores de um lightgbm.Booster para arrays planos"""
+        dump = booster.dump_model()
+        if dump['num_class'] != 1 or dump.get('average_output'):
+            raise ValueError("Motor compilado suporta apenas modelos binários (gbdt)")
+        if not str(dump['objective']).startswith('binary'):
+            raise ValueError(f"Objetivo não suportado: {dump['objective']}")
+
+        nodes = {
+            'split_feature': [], 'threshold': [], 'left_child': [], 'right_child': [],
+            'leaf_value': [], 'default_left': [], 'missing_type': []
+        }
+
+        def add_node(node):
+            index = len(nodes['threshold'])
+            for values in nodes.values():
+                values.append(0)
+            if 'split_index' not in node:
+                # Folha: aponta para si mesma
+                nodes['split_feature'][index] = 0
+                nodes['threshold'][index] = 0.0
+                nodes['left_child'][index] = index
+                nodes['right_child'][index] = index
+                nodes['leaf_value'][index] = node['leaf_value']
+                nodes['default_left'][index] = True
+                nodes['missing_type'][index] = MISSING_NONE
+                return index, 0
+
+            if node['decision_type'] != '<=':
+                raise ValueError("Motor compilado não suporta splits categóricos")
+            nodes['split_feature'][index] = node['split_feature']
+            nodes['threshold'][index] = node['threshold']
+            nodes['default_left'][index] = node['default_left']
+            nodes['missing_type'][index] = _MISSING_TYPES[node['missing_type']]
+            nodes['leaf_value'][index] = 0.0
+            left, left_depth = add_node(node['left_child'])
+            right, right_depth = add_node(node['right_child'])
+            nodes['left_child'][index] = left
+            nodes['right_child'][index] = right
+            return index, 1 + max(left_depth, right_depth)
+
+        roots = []
+        max_depth = 0
+        for tree in dump['tree_info']:
+            root, depth = add_node(tree['tree_structure'])
+            roots.append(root)
+            max_depth = max(max_depth, depth)
+
+        children = np.empty(2 * len(nodes['left_child']), dtype=np.intp)
+        children[0::2] = nodes['left_child']
+        children[1::2] = nodes['right_child']
+
+        return cls(
+            split_feature=nodes['split_feature'],
+            threshold=nodes['threshold'],
+            children=children,
+            leaf_value=nodes['leaf_value'],
+            default_left=nodes['default_left'],
+            missing_type=nodes['missing_type'],
+            roots=roots,
+            max_depth=max_depth,
+            n_features=dump['max_feature_idx'] + 1,
+            feature_names=dump.get('feature_names'),
+            classes=classes
+        )
+
+    @classmethod
+    def from_model(cls, model):
+        """Compila um LGBMClassifier já treinado"""
+        return cls.from_booster(model.booster_, classes=model.classes_)
+
+    def _build_tables(self):
+        """Tabelas de máscaras por intervalo de cada feature e valores das folhas por bit"""
+        n_nodes = len(self.split_feature)
+        children = self.children.reshape(-1, 2)
+        is_leaf = children[:, 0] == np.arange(n_nodes)
+
+        # Árvore de cada nó, descendo nível a nível a partir das raízes
+        tree = np.zeros(n_nodes, dtype=np.intp)
+        tree[self.roots] = np.arange(self.n_trees)
+        levels = []
+        nodes = self.roots[~is_leaf[self.roots]]
+        while len(nodes):
+            levels.append(nodes)
+            tree[children[nodes]] = tree[nodes, None]
+            nodes = children[nodes].ravel()
+            nodes = nodes[~is_leaf[nodes]]
+
+        # Um bit por folha dentro da sua árvore
+        leaves = np.flatnonzero(is_leaf)
+        leaves = leaves[np.argsort(tree[leaves], kind='stable')]
+        leaf_counts = np.bincount(tree[leaves], minlength=self.n_trees)
+        bit = np.arange(len(leaves)) - np.repeat(np.cumsum(leaf_counts) - leaf_counts, leaf_counts)
+        for max_leaves, dtype, modulus in _MASK_TYPES:
+            if leaf_counts.max() <= max_leaves:
+                break
+        else:
+            raise ValueError(f"Motor compilado suporta até 64 folhas por árvore ({leaf_counts.max()})")
+
+        # Folhas de cada subárvore, das folhas para a raiz
+        subtree = np.zeros(n_nodes, dtype=np.uint64)
+        subtree[leaves] = np.left_shift(np.uint64(1), bit.astype(np.uint64))
+        for nodes in reversed(levels):
+            subtree[nodes] = subtree[children[nodes, 0]] | subtree[children[nodes, 1]]
+        valid = subtree[self.roots]
+
+        # Folhas que continuam possíveis quando o nó vai para a esquerda ou para a direita
+        internal = np.flatnonzero(~is_leaf)
+        keep_left = (valid[tree[internal]] & ~subtree[children[internal, 1]]).astype(dtype)
+        keep_right = (valid[tree[internal]] & ~subtree[children[internal, 0]]).astype(dtype)
+        features = self.split_feature[internal]
+
+        # Uma tabela (um intervalo por linha + linha do NaN, árvores) por feature usada
+        used = np.unique(features) if len(internal) else np.zeros(1, dtype=np.intp)
+        breakpoints, tables = [], []
+        for feature in used:
+            selected = features == feature
+            nodes = internal[selected]
+            threshold = self.threshold[nodes].astype(np.float64)
+            missing_type = self.missing_type[nodes]
+            # Limites de [-MAX_VALUE, MAX_VALUE] e, com MissingType::Zero, da faixa do
+            # zero [-ZERO_THRESHOLD, ZERO_THRESHOLD], no formato x <= ponto
+            bounds = [np.nextafter(-MAX_VALUE, -np.inf), MAX_VALUE]
+            if np.any(missing_type == MISSING_ZERO):
+                bounds += [np.nextafter(-ZERO_THRESHOLD, -np.inf), ZERO_THRESHOLD]
+            points = np.union1d(threshold, bounds)
+            # O intervalo k (points[k - 1] < x <= points[k]) é representado por points[k]
+            # e o último por +inf, limitados como o LightGBM limita x; depois vem o NaN
+            values = np.append(np.clip(np.append(points, np.inf), -MAX_VALUE, MAX_VALUE), np.nan)
+            right = _go_right(values[:, None], threshold, missing_type, self.default_left[nodes])
+            table = np.tile(valid.astype(dtype), (len(values), 1))
+            np.bitwise_and.at(table, (np.arange(len(values))[:, None], tree[nodes]),
+                              np.where(right, keep_right[selected], keep_left[selected]))
+            breakpoints.append(points)
+            tables.append(table)
+
+        # Um searchsorted em todos os pontos localiza o intervalo em todas as features:
+        # _rows[r, j] = linha da tabela da feature j para os valores com r pontos menores.
+        # O +inf no final separa o NaN, que o searchsorted ordena depois dele
+        self._used = used
+        self._input_used = used if self.input_columns is None else self.input_columns[used]
+        self._feature_index = np.arange(len(used))
+        self._points = np.append(np.sort(np.concatenate(breakpoints)), np.inf)
+        sizes = np.array([len(table) for table in tables])
+        offsets = np.cumsum(sizes) - sizes
+        self._rows = np.empty((len(self._points) + 1, len(used)), dtype=np.intp)
+        self._rows[0] = offsets
+        for j, points in enumerate(breakpoints):
+            self._rows[1:, j] = offsets[j] + np.searchsorted(points, self._points, side='right')
+        self._rows[-1] = offsets + sizes - 1
+        self._masks = np.concatenate(tables)
+        self._modulus = dtype(modulus)
+        # Índices no mesmo tipo das máscaras (uint64 + int64 viraria float64)
+        self._leaf_offsets = np.arange(self.n_trees, dtype=dtype) * dtype(modulus)
+        powers = np.array([pow(2, k, modulus) for k in range(max_leaves)], dtype=np.intp)
+        self._leaf_table = np.zeros(self.n_trees * modulus, dtype=np.float64)
+        self._leaf_table[tree[leaves] * modulus + powers[bit]] = self.leaf_value[leaves]
+
+    def _as_array(self, X):
+        """Matriz float64 e o índice, nessa matriz, de cada feature usada nos splits"""
+        if hasattr(X, 'to_numpy'):
+            X = X.to_numpy(dtype=np.float64)
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] == self.n_features_in_:
+            return X, self._used
+        if X.shape[1] == self.n_inputs:
+            return X, self._input_used
+        raise ValueError(
+            f"Número de features incorreto: esperado {self.n_features_in_}, recebido {X.shape[1]}"
+        )
+
+    def _leaf_values(self, X, columns):
+        """Valor da folha atingida em cada árvore, matriz (linhas, árvores)"""
+        rank = np.searchsorted(self._points, X[:, columns], side='left')
+        rows = self._rows[rank, self._feature_index]
+        if len(rows) <= REDUCE_MAX_ROWS:
+            masks = np.bitwise_and.reduce(self._masks[rows], axis=1)
+        else:
+            masks = self._masks[rows[:, 0]]
+            for j in range(1, rows.shape[1]):
+                masks &= self._masks[rows[:, j]]
+        masks %= self._modulus
+        masks += self._leaf_offsets
+        return self._leaf_table[masks]
+
+    def predict_raw(self, X, block_size=DEFAULT_BLOCK_SIZE):
+        """Score bruto (log-odds) de cada linha"""
+        X, columns = self._as_array(X)
+        raw = np.empty(X.shape[0], dtype=np.float64)
+        for start in range(0, X.shape[0], block_size):
+            values = self._leaf_values(X[start:start + block_size], columns)
+            # cumsum soma as árvores em sequência, na mesma ordem do LightGBM
+            raw[start:start + block_size] = np.cumsum(values, axis=1)[:, -1]
+        return raw
+
+    def staged_raw(self, X):
+        """Score bruto acumulado após cada árvore, matriz (linhas, árvores); a última coluna é predict_raw"""
+        X, columns = self._as_array(X)
+        return np.cumsum(self._leaf_values(X, columns), axis=1)
+
+    def predict_proba(self, X):
+        """Probabilidades (classe 0, classe 1), como LGBMClassifier.predict_proba"""
+        raw = self.predict_raw(X)
+        proba = np.empty((raw.shape[0], 2), dtype=np.float64)
+        proba[:, 1] = sigmoid(raw)
+        proba[:, 0] = 1.0 - proba[:, 1]
+        return proba
+
+    def predict(self, X):
+        """Classe prevista, como LGBMClassifier.predict"""
+        proba = self.predict_proba(X)
+        return self.classes_[(proba[:, 1] > 0.5).astype(int)]
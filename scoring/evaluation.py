@@ -0,0 +1,346 @@
+"""
+Avaliação do modelo e escolha do limiar de decisão.
+
+Os scores do conjunto rotulado são calculados uma única vez e ordenados uma
+única vez; com as somas acumuladas de aprovados e rejeitados reais na ordem
+dos scores, toda métrica sai de buscas binárias e diferenças dessas somas:
+
+    curvas ROC e precisão-recall, AUC e average precision (mesmas definições
+    do sklearn), matriz de confusão em qualquer conjunto de limiares, limiar de
+    menor custo (custos diferentes para aprovar um mau pagador e rejeitar um
+    bom), calibração por faixas de probabilidade e Brier score.
+
+Convenção: classe positiva = 1 = Aprovado (a mesma do app e da API) e a regra
+de decisão é prob. de aprovação > limiar (scoring/model.py). Na matriz de
+confusão: vp = aprovados corretamente, fp = aprovados que deveriam ser
+rejeitados, vn = rejeitados corretamente, fn = rejeitados que deveriam ser
+aprovados.
+
+Intervalos de confiança por bootstrap: cada reamostragem é um vetor de pesos
+(quantas vezes cada linha foi sorteada) sobre a mesma ordenação, então não há
+nova ordenação por réplica. Os blocos de réplicas rodam em paralelo em
+processos, com sementes fixas por bloco: o resultado não depende do número de
+processos.
+
+Uso:
+    python -m scoring.evaluation                        # modelo atual em X_test / y_test
+    python -m scoring.evaluation --bootstrap 1000 --comparison model_comparison.csv
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from scoring.model import DECISION_THRESHOLD
+
+COMPARISON_PATH = 'model_comparison.csv'
+COMPARISON_COLUMNS = ['Modelo', 'AUC Score', 'Recall (Aprovado)', 'Precision (Aprovado)', 'F1-Score']
+
+# Custo de aprovar um mau pagador em relação ao de rejeitar um bom cliente
+COST_FALSE_APPROVAL = 5.0
+COST_FALSE_REJECTION = 1.0
+
+CALIBRATION_BINS = 10
+
+BOOTSTRAP_SAMPLES = 1000
+# Réplicas por tarefa (e por semente) do bootstrap
+BOOTSTRAP_BLOCK = 50
+BOOTSTRAP_METRICS = ('auc', 'average_precision', 'precision', 'recall', 'f1', 'brier')
+
+
+def _ratio(numerator, denominator):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(denominator > 0, numerator / np.where(denominator > 0, denominator, 1), 0.0)
+
+
+class Evaluation:
+    """
+    Métricas de um conjunto rotulado a partir de uma única ordenação dos scores.
+
+    `y_true` são as classes reais (1 = Aprovado) e `scores` as probabilidades de
+    aprovação. `weights` (opcional) é a multiplicidade de cada linha, usada
+    pelo bootstrap.
+    """
+
+    def __init__(self, y_true, scores, weights=None):
+        scores = np.asarray(scores, dtype=np.float64).ravel()
+        labels = np.asarray(y_true).ravel().astype(np.float64)
+        if scores.shape != labels.shape:
+            raise ValueError(f"Tamanhos diferentes: {len(labels)} classes e {len(scores)} scores")
+        order = np.argsort(scores, kind='stable')
+        self.scores = scores[order]
+        self.labels = labels[order]
+        # Primeira posição de cada valor distinto de score (ordem crescente)
+        self.starts = np.flatnonzero(np.r_[True, self.scores[1:] != self.scores[:-1]])
+        self._accumulate(None if weights is None else np.asarray(weights, dtype=np.float64)[order])
+
+    def _accumulate(self, weights):
+        positives = self.labels if weights is None else self.labels * weights
+        negatives = (1.0 - self.labels) if weights is None else (1.0 - self.labels) * weights
+        # Aprovados e rejeitados reais entre as k linhas de menor score
+        self._cum_pos = np.concatenate([[0.0], np.cumsum(positives)])
+        self._cum_neg = np.concatenate([[0.0], np.cumsum(negatives)])
+        self.weights = weights
+
+    def reweighted(self, weights):
+        """Mesma ordenação com outros pesos por linha (na ordem dos scores ordenados)"""
+        other = object.__new__(Evaluation)
+        other.scores, other.labels, other.starts = self.scores, self.labels, self.starts
+        other._accumulate(np.asarray(weights, dtype=np.float64))
+        return other
+
+    @property
+    def rows(self):
+        return self._cum_pos[-1] + self._cum_neg[-1]
+
+    @property
+    def positives(self):
+        return self._cum_pos[-1]
+
+    @property
+    def negatives(self):
+        return self._cum_neg[-1]
+
+    def confusion(self, thresholds):
+        """Matriz de confusão para cada limiar (aprovado quando score > limiar): vp, fp, vn, fn"""
+        thresholds = np.atleast_1d(np.asarray(thresholds, dtype=np.float64))
+        below = np.searchsorted(self.scores, thresholds, side='right')
+        fn = self._cum_pos[below]
+        vn = self._cum_neg[below]
+        return {'vp': self.positives - fn, 'fp': self.negatives - vn, 'vn': vn, 'fn': fn}
+
+    def _operating_points(self):
+        """vp e fp aprovando a partir de cada score distinto, do maior para o menor"""
+        starts = self.starts[::-1]
+        return self.positives - self._cum_pos[starts], self.negatives - self._cum_neg[starts], self.scores[starts]
+
+    def roc_curve(self):
+        """(taxa de falsos positivos, taxa de verdadeiros positivos, limiares), como sklearn.metrics.roc_curve"""
+        vp, fp, thresholds = self._operating_points()
+        fpr = np.concatenate([[0.0], _ratio(fp, self.negatives)])
+        tpr = np.concatenate([[0.0], _ratio(vp, self.positives)])
+        return fpr, tpr, np.concatenate([[np.inf], thresholds])
+
+    def roc_auc(self):
+        fpr, tpr, _ = self.roc_curve()
+        return float(np.sum(np.diff(fpr) * (tpr[1:] + tpr[:-1]) / 2))
+
+    def pr_curve(self):
+        """(precisão, recall, limiares) da classe Aprovado, do maior limiar para o menor"""
+        vp, fp, thresholds = self._operating_points()
+        return _ratio(vp, vp + fp), _ratio(vp, self.positives), thresholds
+
+    def average_precision(self):
+        """Soma de (R_n - R_n-1) * P_n, como sklearn.metrics.average_precision_score"""
+        precision, recall, _ = self.pr_curve()
+        return float(np.sum(np.diff(recall, prepend=0.0) * precision))
+
+    def brier(self):
+        if self.weights is None:
+            return float(np.mean((self.scores - self.labels) ** 2))
+        return float(np.sum(self.weights * (self.scores - self.labels) ** 2) / self.weights.sum())
+
+    def calibration(self, bins=CALIBRATION_BINS):
+        """Prob. média prevista e taxa real de aprovados por faixa de probabilidade"""
+        index = np.minimum((self.scores * bins).astype(np.int64), bins - 1)
+        weights = np.ones(len(self.scores)) if self.weights is None else self.weights
+        rows = np.bincount(index, weights, bins)
+        predicted = np.bincount(index, weights * self.scores, bins)
+        observed = np.bincount(index, weights * self.labels, bins)
+        return pd.DataFrame({
+            'faixa_inicio': np.arange(bins) / bins,
+            'faixa_fim': np.arange(1, bins + 1) / bins,
+            'linhas': rows if self.weights is not None else rows.astype(np.int64),
+            'prob_media': _ratio(predicted, rows),
+            'taxa_aprovados': _ratio(observed, rows)
+        })
+
+    def expected_calibration_error(self, bins=CALIBRATION_BINS):
+        table = self.calibration(bins)
+        return float(np.sum(table['linhas'] * np.abs(table['prob_media'] - table['taxa_aprovados'])) / self.rows)
+
+    def candidate_thresholds(self):
+        """Um limiar por ponto de operação distinto, inclusive aprovar todos e rejeitar todos"""
+        return np.concatenate([[np.nextafter(self.scores[0], -np.inf)], self.scores[self.starts]])
+
+    def threshold_table(self, thresholds=None, cost_false_approval=COST_FALSE_APPROVAL,
+                        cost_false_rejection=COST_FALSE_REJECTION):
+        """
+        Métricas em cada limiar (todos os pontos de operação distintos, por
+        padrão): matriz de confusão, precisão/recall/F1 de cada classe,
+        acurácia, taxa de aprovação e custo.
+        """
+        thresholds = self.candidate_thresholds() if thresholds is None else np.asarray(thresholds, dtype=np.float64)
+        c = self.confusion(thresholds)
+        vp, fp, vn, fn = c['vp'], c['fp'], c['vn'], c['fn']
+        precision = _ratio(vp, vp + fp)
+        recall = _ratio(vp, self.positives)
+        return pd.DataFrame({
+            'limiar': thresholds,
+            'vp': vp, 'fp': fp, 'vn': vn, 'fn': fn,
+            'precisao_aprovado': precision,
+            'recall_aprovado': recall,
+            'f1_aprovado': _ratio(2 * precision * recall, precision + recall),
+            'precisao_rejeitado': _ratio(vn, vn + fn),
+            'recall_rejeitado': _ratio(vn, self.negatives),
+            'acuracia': _ratio(vp + vn, self.rows),
+            'taxa_aprovacao': _ratio(vp + fp, self.rows),
+            'custo': cost_false_approval * fp + cost_false_rejection * fn
+        })
+
+    def optimal_threshold(self, cost_false_approval=COST_FALSE_APPROVAL, cost_false_rejection=COST_FALSE_REJECTION):
+        """Linha de threshold_table com o menor custo total (o maior limiar em caso de empate)"""
+        table = self.threshold_table(None, cost_false_approval, cost_false_rejection)
+        cost = table['custo'].to_numpy()
+        best = len(cost) - 1 - int(np.argmin(cost[::-1]))
+        return table.iloc[best]
+
+    def metrics(self, threshold=DECISION_THRESHOLD):
+        """Métricas principais em um limiar (as mesmas do bootstrap)"""
+        row = self.threshold_table([threshold]).iloc[0]
+        return {
+            'auc': self.roc_auc(),
+            'average_precision': self.average_precision(),
+            'precision': float(row['precisao_aprovado']),
+            'recall': float(row['recall_aprovado']),
+            'f1': float(row['f1_aprovado']),
+            'brier': self.brier()
+        }
+
+
+_worker = {}
+
+
+def _init_worker(evaluation, threshold):
+    _worker['evaluation'] = evaluation
+    _worker['threshold'] = threshold
+
+
+def _bootstrap_block(seed, replicates):
+    """Métricas de um bloco de réplicas (pesos multinomiais sobre a ordenação já feita)"""
+    evaluation = _worker['evaluation']
+    rng = np.random.default_rng(seed)
+    n = len(evaluation.scores)
+    results = np.empty((replicates, len(BOOTSTRAP_METRICS)))
+    for i in range(replicates):
+        weights = np.bincount(rng.integers(0, n, n), minlength=n)
+        metrics = evaluation.reweighted(weights).metrics(_worker['threshold'])
+        results[i] = [metrics[name] for name in BOOTSTRAP_METRICS]
+    return results
+
+
+def bootstrap(evaluation, threshold=DECISION_THRESHOLD, samples=BOOTSTRAP_SAMPLES, confidence=0.95,
+              workers=None, seed=0):
+    """
+    Intervalos de confiança (percentis) das métricas por bootstrap.
+    Retorna um DataFrame com metrica, valor, ic_inferior e ic_superior.
+    """
+    sizes = [min(BOOTSTRAP_BLOCK, samples - start) for start in range(0, samples, BOOTSTRAP_BLOCK)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    workers = min(workers or os.cpu_count() or 1, len(sizes))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(evaluation, threshold)) as pool:
+            blocks = list(pool.map(_bootstrap_block, seeds, sizes))
+    else:
+        _init_worker(evaluation, threshold)
+        blocks = [_bootstrap_block(s, size) for s, size in zip(seeds, sizes)]
+        _worker.clear()
+
+    values = np.vstack(blocks)
+    alpha = (1 - confidence) / 2
+    low, high = np.quantile(values, [alpha, 1 - alpha], axis=0)
+    point = evaluation.metrics(threshold)
+    return pd.DataFrame({
+        'metrica': list(BOOTSTRAP_METRICS),
+        'valor': [point[name] for name in BOOTSTRAP_METRICS],
+        'ic_inferior': low,
+        'ic_superior': high
+    })
+
+
+def comparison_row(name, evaluation, threshold=DECISION_THRESHOLD):
+    """Linha do model_comparison.csv para um modelo"""
+    metrics = evaluation.metrics(threshold)
+    return dict(zip(COMPARISON_COLUMNS, [name, metrics['auc'], metrics['recall'], metrics['precision'],
+                                         metrics['f1']]))
+
+
+def update_comparison(rows, path=COMPARISON_PATH):
+    """Grava (ou substitui, pelo nome do modelo) linhas no model_comparison.csv, mantendo as demais"""
+    new = pd.DataFrame(rows, columns=COMPARISON_COLUMNS)
+    try:
+        current = pd.read_csv(path, float_precision='round_trip')
+        current = current[~current['Modelo'].isin(new['Modelo'])]
+        table = pd.concat([current, new], ignore_index=True) if len(current) else new
+    except FileNotFoundError:
+        table = new
+    table.to_csv(path, index=False)
+    return table
+
+
+def score_dataset(model, scaler, data):
+    """Probabilidades de aprovação de um dataset (campos brutos ou as 17 features), em uma única passada"""
+    from scoring.features import build_features
+    from scoring.model import preprocess_input, score
+    X = build_features(data)
+    _, probabilities = score(model, preprocess_input(X, scaler, out=X))
+    return probabilities[:, 1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Avaliação do modelo e escolha do limiar")
+    parser.add_argument('--data', default='X_test', help="dataset de avaliação (features)")
+    parser.add_argument('--labels', default='y_test', help="dataset das classes reais (1 = Aprovado)")
+    parser.add_argument('--model', default=None, help="modelo a avaliar (padrão: CREDIT_MODEL_PATH)")
+    parser.add_argument('--name', default='LightGBM Otimizado', help="nome do modelo no model_comparison.csv")
+    parser.add_argument('--threshold', type=float, default=DECISION_THRESHOLD)
+    parser.add_argument('--cost-false-approval', type=float, default=COST_FALSE_APPROVAL,
+                        help="custo de aprovar quem deveria ser rejeitado")
+    parser.add_argument('--cost-false-rejection', type=float, default=COST_FALSE_REJECTION,
+                        help="custo de rejeitar quem deveria ser aprovado")
+    parser.add_argument('--bootstrap', type=int, default=0, help="réplicas do bootstrap (0 desativa)")
+    parser.add_argument('--workers', type=int, default=0, help="processos do bootstrap (0 = um por núcleo)")
+    parser.add_argument('--comparison', default=None, help="atualiza a linha do modelo neste CSV")
+    parser.add_argument('--thresholds-output', default=None, help="grava a tabela de limiares neste arquivo")
+    args = parser.parse_args(argv)
+
+    from scoring.formats import load_dataset, write_table
+    from scoring.model import MODEL_PATH, load_model, load_scaler
+
+    model = load_model(args.model or MODEL_PATH)
+    scaler = load_scaler(args.model or MODEL_PATH) if args.model else load_scaler()
+    labels = load_dataset(args.labels).iloc[:, 0].to_numpy()
+    evaluation = Evaluation(labels, score_dataset(model, scaler, load_dataset(args.data)))
+
+    metrics = evaluation.metrics(args.threshold)
+    print(f"Avaliação de {args.name} ({int(evaluation.rows)} linhas, {int(evaluation.positives)} aprovados reais)")
+    print(f"   AUC: {metrics['auc']:.4f} | Average precision: {metrics['average_precision']:.4f} | "
+          f"Brier: {metrics['brier']:.4f} | ECE: {evaluation.expected_calibration_error():.4f}")
+    print(f"   Limiar {args.threshold:.2f}: precisão {metrics['precision']:.4f}, recall {metrics['recall']:.4f}, "
+          f"F1 {metrics['f1']:.4f} (classe Aprovado)")
+    best = evaluation.optimal_threshold(args.cost_false_approval, args.cost_false_rejection)
+    print(f"   Limiar de menor custo ({args.cost_false_approval:g} por aprovação indevida, "
+          f"{args.cost_false_rejection:g} por rejeição indevida): {best['limiar']:.4f} "
+          f"(custo {best['custo']:.0f}, taxa de aprovação {best['taxa_aprovacao']:.1%})")
+    print("\nCalibração:")
+    print(evaluation.calibration().to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+
+    if args.bootstrap:
+        intervals = bootstrap(evaluation, args.threshold, args.bootstrap, workers=args.workers or None)
+        print(f"\nIntervalos de confiança de 95% ({args.bootstrap} réplicas):")
+        print(intervals.to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+    if args.thresholds_output:
+        write_table(evaluation.threshold_table(None, args.cost_false_approval, args.cost_false_rejection),
+                    args.thresholds_output)
+    if args.comparison:
+        update_comparison([comparison_row(args.name, evaluation, args.threshold)], args.comparison)
+        print(f"\n{args.comparison} atualizado")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,157 @@
+"""
+Explicações por cliente (contribuições TreeSHAP) e códigos de motivo.
+
+As contribuições vêm da saída nativa do LightGBM (`pred_contrib=True`), que
+implementa o TreeSHAP exato: para cada linha, a contribuição de cada uma das
+17 features para o log-odds de aprovação, mais o valor base do modelo. A soma
+das contribuições é exatamente o score bruto da linha.
+
+Os motivos de cada decisão são as k features que mais empurraram o score na
+direção da decisão tomada: as mais negativas para rejeições e as mais
+positivas para aprovações.
+
+Custo: o TreeSHAP é bem mais caro que a predição (ver `explain` no
+scoring/benchmark.py), por isso as explicações são opcionais no lote e na API
+e podem ser restritas aos rejeitados (`reasons_for='rejected'`).
+"""
+import os
+
+import numpy as np
+
+from scoring.features import MODEL_COLUMNS
+
+DEFAULT_TOP_K = 3
+
+# Orçamento de custo das explicações, verificado pelo benchmark (scoring/benchmark.py)
+COST_BUDGET = {
+    'single_p99_ms': 5.0,      # um cliente (aba individual e API)
+    'batch_ms_per_row': 2.0    # lote, por linha explicada
+}
+
+# Para quem calcular os motivos no lote
+REASONS_FOR = ('all', 'rejected')
+
+# Descrição das features para os códigos de motivo
+FEATURE_LABELS = {
+    'no_of_dependents': "Número de dependentes",
+    'income_annum': "Renda anual",
+    'loan_amount': "Valor do empréstimo",
+    'loan_term': "Prazo do empréstimo",
+    'cibil_score': "Score de crédito (CIBIL)",
+    'residential_assets_value': "Ativos residenciais",
+    'commercial_assets_value': "Ativos comerciais",
+    'luxury_assets_value': "Ativos de luxo",
+    'bank_asset_value': "Ativos bancários",
+    'credit_income_ratio': "Razão crédito/renda",
+    'total_assets': "Total de ativos",
+    'assets_income_ratio': "Razão ativos/renda",
+    'loan_assets_ratio': "Razão empréstimo/ativos",
+    'high_debt': "Endividamento alto",
+    'low_cibil': "Score de crédito baixo",
+    'education_encoded': "Escolaridade",
+    'self_employed_encoded': "Autônomo"
+}
+
+_FEATURE_NAMES = np.array(MODEL_COLUMNS, dtype=object)
+
+
+def booster_for(model):
+    """
+    lightgbm.Booster do modelo. O motor compilado não calcula contribuições;
+    nesse caso o Booster é carregado (uma vez) do model.txt do bundle.
+    """
+    booster = getattr(model, 'booster_', None)
+    if booster is None:
+        bundle_path = getattr(model, 'bundle_path', None)
+        if bundle_path is None:
+            raise ValueError("Explicações requerem o modelo LightGBM (booster ou bundle)")
+        import lightgbm as lgb
+        from scoring.bundle import MODEL_FILE
+        booster = lgb.Booster(model_file=os.path.join(bundle_path, MODEL_FILE))
+        model.booster_ = booster
+    return booster
+
+
+def contributions(model, processed_data):
+    """
+    Contribuições TreeSHAP, array (n_linhas, 18): as 17 features na ordem de
+    MODEL_COLUMNS e, na última coluna, o valor base (log-odds).
+    """
+    if hasattr(processed_data, 'to_numpy'):
+        processed_data = processed_data.to_numpy(dtype=np.float64)
+    X = np.asarray(processed_data, dtype=np.float64)
+    if X.ndim == 1:
+        X = X.reshape(1, -1)
+    columns = getattr(model, 'input_columns', None)
+    if columns is None:
+        return booster_for(model).predict(X, pred_contrib=True)
+    # Modelo comprimido (scoring/compress.py): as features removidas não têm
+    # splits, então a contribuição delas é exatamente zero
+    if X.shape[1] == model.n_inputs:
+        X = X[:, columns]
+    partial = booster_for(model).predict(X, pred_contrib=True)
+    contrib = np.zeros((X.shape[0], model.n_inputs + 1))
+    contrib[:, columns] = partial[:, :-1]
+    contrib[:, -1] = partial[:, -1]
+    return contrib
+
+
+def top_reasons(contrib, approved, k=DEFAULT_TOP_K):
+    """
+    Índices e valores das k features que mais pesaram na decisão de cada linha,
+    arrays (n_linhas, k). Aprovados: maiores contribuições positivas;
+    rejeitados: mais negativas. Quando menos de k features empurram para a
+    decisão, as posições restantes ficam vazias (índice -1, valor NaN): uma
+    contribuição contrária à decisão não é motivo dela.
+    """
+    features = contrib[:, :len(MODEL_COLUMNS)]
+    direction = np.where(np.asarray(approved, dtype=bool), 1.0, -1.0)[:, None]
+    k = min(k, features.shape[1])
+    index = np.argsort(-features * direction, axis=1, kind='stable')[:, :k]
+    values = np.take_along_axis(features, index, axis=1)
+    opposing = values * direction <= 0
+    index[opposing] = -1
+    values[opposing] = np.nan
+    return index, values
+
+
+def reason_columns(model, processed_data, predictions, k=DEFAULT_TOP_K, reasons_for='all'):
+    """
+    Colunas Motivo_i (código da feature) e Impacto_Motivo_i (contribuição em
+    log-odds) para o resultado em lote. Com reasons_for='rejected' só os
+    rejeitados são explicados; os demais ficam vazios.
+    """
+    if reasons_for not in REASONS_FOR:
+        raise ValueError(f"reasons_for inválido: {reasons_for} (opções: {', '.join(REASONS_FOR)})")
+    # Não há mais motivos que features (mesmo limite de top_reasons)
+    k = min(k, len(MODEL_COLUMNS))
+    approved = np.asarray(predictions) == 1
+    rows = np.flatnonzero(~approved) if reasons_for == 'rejected' else np.arange(len(approved))
+    n_rows = len(approved)
+
+    columns = {}
+    names = np.full((n_rows, k), '', dtype=object)
+    values = np.full((n_rows, k), np.nan)
+    if len(rows):
+        X = np.asarray(processed_data)[rows]
+        index, impact = top_reasons(contributions(model, X), approved[rows], k)
+        names[rows] = np.where(index >= 0, _FEATURE_NAMES[index], '')
+        values[rows] = impact
+    for i in range(k):
+        columns[f'Motivo_{i + 1}'] = names[:, i]
+        columns[f'Impacto_Motivo_{i + 1}'] = values[:, i]
+    return columns
+
+
+def explain(model, processed_data, predictions, k=DEFAULT_TOP_K):
+    """Motivos de cada linha como listas de dicts (API e aba individual)"""
+    approved = np.asarray(predictions) == 1
+    contrib = contributions(model, processed_data)
+    index, impact = top_reasons(contrib, approved, k)
+    return [
+        [
+            {'feature': MODEL_COLUMNS[i], 'description': FEATURE_LABELS[MODEL_COLUMNS[i]], 'contribution': float(v)}
+            for i, v in zip(row_index, row_impact) if i >= 0
+        ]
+        for row_index, row_impact in zip(index.tolist(), impact.tolist())
+    ]
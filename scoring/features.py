@@ -0,0 +1,228 @@
+"""
+Engenharia de features do modelo de crédito.
+
+Deriva as 17 colunas do modelo a partir dos 11 campos brutos do cliente com
+operações vetorizadas do NumPy. A mesma função atende um único cliente (aba
+"Análise Individual" e API) e arquivos com milhões de linhas (análise em lote).
+"""
+import numpy as np
+import pandas as pd
+
+# Campos brutos informados para cada cliente
+RAW_COLUMNS = [
+    'no_of_dependents',
+    'income_annum',
+    'loan_amount',
+    'loan_term',
+    'cibil_score',
+    'residential_assets_value',
+    'commercial_assets_value',
+    'luxury_assets_value',
+    'bank_asset_value',
+    'education_encoded',
+    'self_employed_encoded'
+]
+
+# Colunas do modelo (ordem correta, mesma do treinamento)
+MODEL_COLUMNS = [
+    'no_of_dependents',
+    'income_annum',
+    'loan_amount',
+    'loan_term',
+    'cibil_score',
+    'residential_assets_value',
+    'commercial_assets_value',
+    'luxury_assets_value',
+    'bank_asset_value',
+    'credit_income_ratio',
+    'total_assets',
+    'assets_income_ratio',
+    'loan_assets_ratio',
+    'high_debt',
+    'low_cibil',
+    'education_encoded',
+    'self_employed_encoded'
+]
+
+ENGINEERED_COLUMNS = [col for col in MODEL_COLUMNS if col not in RAW_COLUMNS]
+
+# Features contínuas normalizadas pelo StandardScaler (as binárias ficam de fora)
+SCALED_COLUMNS = [
+    'no_of_dependents',
+    'income_annum',
+    'loan_amount',
+    'loan_term',
+    'cibil_score',
+    'residential_assets_value',
+    'commercial_assets_value',
+    'luxury_assets_value',
+    'bank_asset_value',
+    'credit_income_ratio',
+    'total_assets',
+    'assets_income_ratio',
+    'loan_assets_ratio'
+]
+
+COLUMN_INDEX = {col: i for i, col in enumerate(MODEL_COLUMNS)}
+
+ASSET_COLUMNS = [
+    'residential_assets_value',
+    'commercial_assets_value',
+    'luxury_assets_value',
+    'bank_asset_value'
+]
+
+# Limites das features binárias
+HIGH_DEBT_RATIO = 4
+LOW_CIBIL_SCORE = 650
+
+# Features engineered que dependem de cada campo bruto
+DEPENDENT_COLUMNS = {
+    'income_annum': ['credit_income_ratio', 'high_debt', 'assets_income_ratio'],
+    'loan_amount': ['credit_income_ratio', 'high_debt', 'loan_assets_ratio'],
+    'cibil_score': ['low_cibil'],
+    **{col: ['total_assets', 'assets_income_ratio', 'loan_assets_ratio'] for col in ASSET_COLUMNS}
+}
+
+# Colunas em texto aceitas no lugar das colunas já codificadas
+CATEGORICAL_ENCODINGS = {
+    'education_encoded': ('education', 'Graduate'),
+    'self_employed_encoded': ('self_employed', 'Yes')
+}
+
+
+def _raw_column(data, col):
+    """Obtém um campo bruto como array float64 (aceita a versão categórica em texto)"""
+    if col not in data and col in CATEGORICAL_ENCODINGS:
+        source, positive = CATEGORICAL_ENCODINGS[col]
+        if source in data:
+            values = np.atleast_1d(np.asarray(data[source]))
+            return (np.char.strip(values.astype(str)) == positive).astype(np.float64)
+    if col not in data:
+        raise KeyError(f"Coluna obrigatória ausente: {col}")
+    values = data[col]
+    if isinstance(values, pd.Series):
+        values = values.to_numpy()
+    return np.atleast_1d(np.asarray(values, dtype=np.float64))
+
+
+def _ratio(numerator, denominator, out):
+    """Divisão com guarda para denominador zero (resultado 0, como no app)"""
+    out.fill(0.0)
+    np.divide(numerator, denominator, out=out, where=denominator > 0)
+    return out
+
+
+def build_features(data, out=None, scaler=None):
+    """
+    Deriva as 17 colunas do modelo a partir dos campos brutos.
+
+    `data` pode ser um dict de um único cliente (valores escalares), um dict de
+    arrays ou um DataFrame. Retorna um array float64 (n_linhas, 17) na ordem de
+    MODEL_COLUMNS. `out` permite reaproveitar um array já alocado (float64 ou
+    float32).
+
+    Com `scaler` a normalização (scale_features) é aplicada no próprio `out`
+    ao final, se o modelo a exigir; o resultado já vai direto para o modelo,
+    sem passar por preprocess_input.
+    """
+    raw = {col: _raw_column(data, col) for col in RAW_COLUMNS}
+    n_rows = max(len(values) for values in raw.values())
+
+    if out is None:
+        out = np.empty((n_rows, len(MODEL_COLUMNS)), dtype=np.float64)
+
+    for col, values in raw.items():
+        out[:, COLUMN_INDEX[col]] = values
+
+    income_annum = raw['income_annum']
+    loan_amount = raw['loan_amount']
+
+    total_assets = raw[ASSET_COLUMNS[0]].copy()
+    for col in ASSET_COLUMNS[1:]:
+        total_assets += raw[col]
+    out[:, COLUMN_INDEX['total_assets']] = total_assets
+
+    # As colunas de saída não são contíguas; as razões usam um buffer temporário
+    buffer = np.empty(n_rows, dtype=np.float64)
+
+    credit_income_ratio = _ratio(loan_amount, income_annum, buffer)
+    out[:, COLUMN_INDEX['credit_income_ratio']] = credit_income_ratio
+    out[:, COLUMN_INDEX['high_debt']] = credit_income_ratio > HIGH_DEBT_RATIO
+    out[:, COLUMN_INDEX['assets_income_ratio']] = _ratio(total_assets, income_annum, buffer)
+    out[:, COLUMN_INDEX['loan_assets_ratio']] = _ratio(loan_amount, total_assets, buffer)
+    out[:, COLUMN_INDEX['low_cibil']] = raw['cibil_score'] < LOW_CIBIL_SCORE
+
+    if scaler is not None and scaler.apply:
+        scale_features(out, scaler, out=out)
+    return out
+
+
+def rederive_features(X, changed):
+    """
+    Recalcula no próprio X (n_linhas, 17), sem normalização, só as features
+    engineered que dependem dos campos brutos em `changed` (DEPENDENT_COLUMNS).
+    Usa as mesmas operações de build_features, com resultados idênticos.
+    """
+    targets = {col for raw in changed for col in DEPENDENT_COLUMNS.get(raw, [])}
+    if not targets:
+        return X
+
+    def column(name):
+        return X[:, COLUMN_INDEX[name]]
+
+    buffer = np.empty(X.shape[0], dtype=np.float64)
+    if 'total_assets' in targets:
+        total_assets = column(ASSET_COLUMNS[0]).copy()
+        for col in ASSET_COLUMNS[1:]:
+            total_assets += column(col)
+        X[:, COLUMN_INDEX['total_assets']] = total_assets
+    if 'credit_income_ratio' in targets:
+        X[:, COLUMN_INDEX['credit_income_ratio']] = _ratio(column('loan_amount'), column('income_annum'), buffer)
+    if 'high_debt' in targets:
+        X[:, COLUMN_INDEX['high_debt']] = column('credit_income_ratio') > HIGH_DEBT_RATIO
+    if 'assets_income_ratio' in targets:
+        X[:, COLUMN_INDEX['assets_income_ratio']] = _ratio(column('total_assets'), column('income_annum'), buffer)
+    if 'loan_assets_ratio' in targets:
+        X[:, COLUMN_INDEX['loan_assets_ratio']] = _ratio(column('loan_amount'), column('total_assets'), buffer)
+    if 'low_cibil' in targets:
+        X[:, COLUMN_INDEX['low_cibil']] = column('cibil_score') < LOW_CIBIL_SCORE
+    return X
+
+
+def scale_features(X, scaler, out=None):
+    """
+    Normaliza as colunas de SCALED_COLUMNS de uma matriz (n_linhas, 17).
+
+    Média e desvio são expandidos para as 17 colunas (0 e 1 nas binárias), então
+    a transformação é uma subtração e uma divisão sobre a matriz inteira, sem
+    indexação por coluna nem arrays temporários; as binárias saem inalteradas.
+    `out=X` normaliza no próprio array.
+    """
+    mean, scale = scaler.affine(MODEL_COLUMNS)
+    if out is None:
+        out = np.empty_like(X)
+    np.subtract(X, mean, out=out)
+    np.divide(out, scale, out=out)
+    return out
+
+
+def build_features_frame(data):
+    """Mesmo que build_features, retornando um DataFrame com os nomes das colunas"""
+    index = data.index if isinstance(data, pd.DataFrame) else None
+    return pd.DataFrame(build_features(data), columns=MODEL_COLUMNS, index=index)
+
+
+def has_raw_columns(columns):
+    """Indica se as colunas informadas permitem derivar as features do modelo"""
+    columns = set(columns)
+    for col in RAW_COLUMNS:
+        source = CATEGORICAL_ENCODINGS.get(col, (None,))[0]
+        if col not in columns and source not in columns:
+            return False
+    return True
+
+
+def derive_features(applicant):
+    """Calcula as features engineered de um cliente a partir dos campos brutos"""
+    return dict(zip(MODEL_COLUMNS, build_features(applicant)[0].tolist()))
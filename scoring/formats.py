@@ -0,0 +1,346 @@
+"""
+Leitura e escrita de tabelas em CSV e formatos colunares (Parquet, Feather e
+Arrow IPC).
+
+Os formatos colunares evitam a interpretação de texto do CSV e, quando lidos de
+um caminho local, são abertos com memory-mapping. A escrita é incremental
+(bloco a bloco), para o scoring em lote por streaming.
+
+Conversão de datasets:
+    python -m scoring.formats X_train.csv X_train.feather
+"""
+import argparse
+import io
+import itertools
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - pyarrow vem com o streamlit
+    pa = None
+
+# Extensão -> formato
+FORMATS = {
+    '.csv': 'csv',
+    '.parquet': 'parquet',
+    '.pq': 'parquet',
+    '.feather': 'feather',
+    '.arrow': 'arrow',
+    '.ipc': 'arrow'
+}
+
+# Formatos oferecidos no upload e no download do app
+UPLOAD_TYPES = ['csv', 'parquet', 'feather', 'arrow']
+
+MIME_TYPES = {
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+    'feather': 'application/vnd.apache.arrow.file',
+    'arrow': 'application/vnd.apache.arrow.file'
+}
+
+# Ordem de preferência ao procurar um dataset (colunar primeiro)
+DATASET_EXTENSIONS = ['.feather', '.arrow', '.parquet', '.csv']
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("Formatos colunares requerem o pacote pyarrow (pip install pyarrow)")
+
+
+def detect_format(source):
+    """Formato de um caminho ou arquivo (pela extensão do nome)"""
+    name = source if isinstance(source, (str, os.PathLike)) else getattr(source, 'name', '')
+    extension = os.path.splitext(str(name))[1].lower()
+    if extension not in FORMATS:
+        raise ValueError(f"Formato de arquivo não suportado: '{extension or name}' "
+                         f"(aceitos: {', '.join(sorted(FORMATS))})")
+    return FORMATS[extension]
+
+
+def _is_path(source):
+    return isinstance(source, (str, os.PathLike))
+
+
+def _open_ipc(source):
+    """Abre um arquivo Arrow IPC/Feather v2, com memory-map quando é um caminho"""
+    if _is_path(source):
+        return pa.ipc.open_file(pa.memory_map(str(source), 'r'))
+    return pa.ipc.open_file(source)
+
+
+def _open_parquet(source):
+    if _is_path(source):
+        return pq.ParquetFile(str(source), memory_map=True)
+    return pq.ParquetFile(source)
+
+
+def read_table(source, columns=None, fmt=None, nrows=None):
+    """Lê uma tabela inteira (ou as primeiras `nrows` linhas) como DataFrame"""
+    fmt = fmt or detect_format(source)
+    if fmt == 'csv':
+        return pd.read_csv(source, usecols=columns, nrows=nrows)
+    if nrows is not None:
+        return next(iter_batches(source, nrows, fmt, columns), pd.DataFrame(columns=columns))
+
+    _require_pyarrow()
+    if fmt == 'parquet':
+        table = _open_parquet(source).read(columns=columns)
+    else:
+        table = _open_ipc(source).read_all()
+        if columns is not None:
+            table = table.select(columns)
+    return table.to_pandas()
+
+
+def iter_batches(source, chunksize, fmt=None, columns=None):
+    """
+    Gera DataFrames de até `chunksize` linhas, sem carregar o arquivo inteiro.
+    Um arquivo sem linhas gera um único bloco vazio, com as colunas e os tipos
+    do arquivo.
+    """
+    fmt = fmt or detect_format(source)
+    if fmt == 'csv':
+        # O pandas já gera um bloco vazio para um CSV só com o cabeçalho
+        yield from pd.read_csv(source, usecols=columns, chunksize=chunksize)
+        return
+
+    _require_pyarrow()
+    if fmt == 'parquet':
+        parquet = _open_parquet(source)
+        if parquet.metadata.num_rows == 0:
+            yield _empty_frame(parquet.schema_arrow, columns)
+            return
+        for batch in parquet.iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+        return
+
+    reader = _open_ipc(source)
+    empty = True
+    for i in range(reader.num_record_batches):
+        batch = reader.get_batch(i)
+        if columns is not None:
+            batch = batch.select(columns)
+        for start in range(0, batch.num_rows, chunksize):
+            empty = False
+            yield batch.slice(start, chunksize).to_pandas()
+    if empty:
+        yield _empty_frame(reader.schema, columns)
+
+
+def _empty_frame(schema, columns=None):
+    """DataFrame sem linhas com as colunas e os tipos de um esquema Arrow"""
+    table = schema.empty_table()
+    if columns is not None:
+        table = table.select(columns)
+    return table.to_pandas()
+
+
+class TableWriter:
+    """
+    Grava DataFrames bloco a bloco em CSV, Parquet ou Arrow IPC/Feather.
+
+    O arquivo sempre existe após close(): sem nenhum bloco gravado ele fica só
+    com o esquema (o cabeçalho do CSV ou uma tabela Parquet/Arrow vazia) com as
+    colunas de `columns`.
+    """
+
+    def __init__(self, destination, fmt=None, columns=None):
+        self.destination = destination
+        self.fmt = fmt or detect_format(destination)
+        self.columns = list(columns or [])
+        self.rows = 0
+        self._started = False
+        self._writer = None
+        self._schema = None
+        self._empty = None
+        if self.fmt != 'csv':
+            _require_pyarrow()
+
+    def write(self, frame):
+        if self.fmt == 'csv':
+            frame.to_csv(self.destination, mode='a' if self._started else 'w',
+                         header=not self._started, index=False)
+            self._started = True
+        elif frame.empty and self._writer is None:
+            # Um bloco vazio (ex.: todas as linhas inválidas) definiria o esquema
+            # com tipos nulos; só é gravado em close() se nenhum outro vier
+            self._empty = frame
+        else:
+            self._write_table(pa.Table.from_pandas(frame, preserve_index=False))
+        self.rows += len(frame)
+
+    def _write_table(self, table):
+        if self._writer is None:
+            self._schema = table.schema
+            if self.fmt == 'parquet':
+                self._writer = pq.ParquetWriter(self.destination, self._schema)
+            else:
+                self._writer = pa.ipc.new_file(self.destination, self._schema)
+            self._started = True
+        elif not table.schema.equals(self._schema):
+            # Blocos de CSV podem inferir tipos diferentes (ex.: int64 x float64)
+            table = table.cast(self._schema)
+        self._writer.write_table(table)
+
+    def write_text(self, text, rows):
+        """Acrescenta `rows` linhas de CSV já serializado (usado pelo scoring paralelo)"""
+        if self.fmt != 'csv':
+            raise ValueError("write_text só é suportado para saída CSV")
+        with open(self.destination, 'a' if self._started else 'w', newline='') as f:
+            f.write(text)
+        self._started = True
+        self.rows += rows
+
+    def close(self):
+        if not self._started and self._empty is None:
+            # Nenhum bloco: grava só o esquema, para o arquivo poder ser lido
+            self.write(pd.DataFrame(columns=self.columns))
+        if self._writer is None and self._empty is not None:
+            self._write_table(pa.Table.from_pandas(self._empty, preserve_index=False))
+            self._empty = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TablePages:
+    """
+    Leitura por página de uma tabela já gravada em disco, sem carregar o
+    arquivo na memória nem convertê-lo inteiro em DataFrame: usado na
+    visualização dos resultados do lote, que podem ter milhões de linhas.
+
+    CSV: o arquivo é percorrido uma vez em blocos (busca vetorizada das quebras
+    de linha), guardando o início de uma linha a cada CSV_INDEX_STRIDE; uma
+    página lê a partir do ponto indexado anterior e só as suas linhas são
+    interpretadas. Campos com quebra de linha entre aspas não são suportados
+    (os resultados do scoring não têm).
+    Parquet e Arrow/Feather: arquivo aberto com memory-map e só os row groups ou
+    record batches da página são lidos (o TableWriter grava um por bloco do lote).
+    """
+
+    # Linhas entre dois pontos do índice do CSV e tamanho dos blocos lidos ao indexar
+    CSV_INDEX_STRIDE = 1024
+    CSV_BLOCK_SIZE = 1 << 20
+
+    def __init__(self, path, fmt=None):
+        self.path = str(path)
+        self.fmt = fmt or detect_format(path)
+        self._file = None
+        if self.fmt == 'csv':
+            self._index_csv()
+            return
+        _require_pyarrow()
+        if self.fmt == 'parquet':
+            self._file = _open_parquet(self.path)
+            sizes = [self._file.metadata.row_group(i).num_rows for i in range(self._file.num_row_groups)]
+        else:
+            self._file = _open_ipc(self.path)
+            sizes = [self._file.get_batch(i).num_rows for i in range(self._file.num_record_batches)]
+        # Primeira linha de cada row group / record batch
+        self._starts = np.concatenate([[0], np.cumsum(sizes, dtype=np.int64)])
+        self.rows = int(self._starts[-1])
+
+    def _index_csv(self):
+        # Quebra de linha k (a partir de 0) termina a linha k; a seguinte é a linha de dados k
+        offsets = []
+        newlines = 0
+        position = 0
+        last = b''
+        with open(self.path, 'rb') as f:
+            self._header = f.readline()
+            f.seek(0)
+            while True:
+                block = f.read(self.CSV_BLOCK_SIZE)
+                if not block:
+                    break
+                ends = np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == ord('\n'))
+                rows = newlines + np.arange(len(ends))
+                offsets.append(position + ends[rows % self.CSV_INDEX_STRIDE == 0] + 1)
+                newlines += len(ends)
+                position += len(block)
+                last = block[-1:]
+        # Início da linha de dados 0, CSV_INDEX_STRIDE, 2 * CSV_INDEX_STRIDE, ...
+        self._offsets = np.concatenate(offsets) if offsets else np.zeros(0, dtype=np.int64)
+        lines = newlines + (1 if last not in (b'', b'\n') else 0)
+        self.rows = max(lines - 1, 0)
+
+    def close(self):
+        """Libera o arquivo aberto (Parquet e Arrow/Feather)"""
+        if self._file is not None:
+            if self.fmt == 'parquet':
+                self._file.close()
+            self._file = None
+
+    def page(self, start, nrows):
+        """Linhas start .. start + nrows - 1 (a partir de 0) como DataFrame"""
+        start = max(0, min(int(start), self.rows))
+        stop = min(start + int(nrows), self.rows)
+        if self.fmt == 'csv':
+            if stop <= start:
+                return pd.read_csv(io.BytesIO(self._header))
+            checkpoint = start // self.CSV_INDEX_STRIDE
+            first = checkpoint * self.CSV_INDEX_STRIDE
+            with open(self.path, 'rb') as f:
+                f.seek(int(self._offsets[checkpoint]))
+                body = b''.join(itertools.islice(f, start - first, stop - first))
+            return pd.read_csv(io.BytesIO(self._header + body))
+        if stop <= start:
+            schema = self._file.schema_arrow if self.fmt == 'parquet' else self._file.schema
+            return schema.empty_table().to_pandas()
+        first = int(np.searchsorted(self._starts, start, side='right')) - 1
+        last = max(first + 1, int(np.searchsorted(self._starts, stop, side='left')))
+        if self.fmt == 'parquet':
+            table = self._file.read_row_groups(list(range(first, last)))
+        else:
+            table = pa.Table.from_batches([self._file.get_batch(i) for i in range(first, last)],
+                                          schema=self._file.schema)
+        return table.slice(start - int(self._starts[first]), stop - start).to_pandas()
+
+
+def write_table(frame, destination, fmt=None):
+    """Grava um DataFrame inteiro no formato indicado pela extensão"""
+    with TableWriter(destination, fmt) as writer:
+        writer.write(frame)
+
+
+def find_dataset(stem, directory='.'):
+    """Caminho de um dataset (ex.: 'X_test'), preferindo as cópias colunares"""
+    for extension in DATASET_EXTENSIONS:
+        path = os.path.join(directory, stem + extension)
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError(f"Dataset não encontrado: {stem} ({', '.join(DATASET_EXTENSIONS)})")
+
+
+def load_dataset(stem, directory='.'):
+    """Carrega um dataset do projeto (X_train, X_test, y_train, y_test)"""
+    return read_table(find_dataset(stem, directory))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Converte tabelas entre CSV, Parquet, Feather e Arrow")
+    parser.add_argument('input', help="arquivo de entrada")
+    parser.add_argument('output', help="arquivo de saída (formato pela extensão)")
+    args = parser.parse_args(argv)
+
+    frame = read_table(args.input)
+    write_table(frame, args.output)
+    print(f"{len(frame)} linhas gravadas em {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,338 @@
+"""
+Métricas do caminho de scoring no formato de texto do Prometheus.
+
+Registro próprio e sem dependências: histogramas de latência por etapa,
+contadores de linhas pontuadas e de erros, tempo de carregamento do modelo e
+estatísticas do cache de predições. O custo por medição é de poucos
+microssegundos (dois perf_counter e um lock).
+
+Exposição:
+    - API: GET /metrics (scoring/api.py)
+    - app Streamlit: servidor HTTP local em CREDIT_METRICS_PORT (ex.: 9100)
+
+Cada processo tem o próprio registro; com vários workers do uvicorn cada
+coleta do Prometheus vê um worker. Os processos do scoring em lote paralelo
+não enviam métricas ao processo principal.
+
+Com CREDIT_METRICS_LOG=<arquivo> (ou '-' para stderr) cada medição também é
+gravada como uma linha JSON (log estruturado).
+"""
+import bisect
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Limites dos buckets de latência (segundos)
+LATENCY_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+METRICS_PORT = int(os.environ.get('CREDIT_METRICS_PORT', 0))
+METRICS_LOG = os.environ.get('CREDIT_METRICS_LOG')
+
+logger = logging.getLogger('scoring.metrics')
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{value}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Base das métricas: nome, descrição e séries por combinação de labels"""
+
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def header(self):
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, *labels):
+        with self._lock:
+            self._series[labels] = self._series.get(labels, 0) + amount
+
+    def set(self, value, *labels):
+        """Substitui o valor (coletores que copiam um total acumulado em outro lugar)"""
+        with self._lock:
+            self._series[labels] = value
+
+    def value(self, *labels):
+        with self._lock:
+            return self._series.get(labels, 0)
+
+    def samples(self):
+        # Cópia sob o lock: a exposição roda enquanto outras threads registram novas séries
+        with self._lock:
+            series = sorted(self._series.items())
+        for labels, value in series:
+            yield f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}'
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # [contagem por bucket (+Inf no final), soma]
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def count(self, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            return sum(series[0]) if series else 0
+
+    def samples(self):
+        # Cópia sob o lock, inclusive das contagens, que observe altera no lugar
+        with self._lock:
+            series = sorted((labels, (list(counts), total)) for labels, (counts, total) in self._series.items())
+        for labels, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                bucket_labels = _format_labels(self.labelnames + ('le',), labels + (_format_value(bound),))
+                yield f'{self.name}_bucket{bucket_labels} {cumulative}'
+            label_text = _format_labels(self.labelnames, labels)
+            yield f'{self.name}_sum{label_text} {_format_value(total)}'
+            yield f'{self.name}_count{label_text} {cumulative}'
+
+
+class Registry:
+    """Conjunto de métricas e coletores (funções chamadas a cada exposição)"""
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+
+    def render(self):
+        """Texto no formato de exposição do Prometheus (versão 0.0.4)"""
+        for collector in self.collectors:
+            collector()
+        lines = []
+        for metric in self.metrics:
+            samples = list(metric.samples())
+            if samples:
+                lines.extend(metric.header())
+                lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'credit_stage_seconds', 'Latência de cada etapa do scoring em segundos', ['stage']
+))
+ROWS_SCORED = REGISTRY.register(Counter(
+    'credit_rows_scored_total', 'Linhas pontuadas pelo modelo'
+))
+ERRORS = REGISTRY.register(Counter(
+    'credit_errors_total', 'Erros por etapa do scoring', ['stage']
+))
+MODEL_LOAD_SECONDS = REGISTRY.register(Gauge(
+    'credit_model_load_seconds', 'Tempo do último carregamento do modelo em segundos', ['backend']
+))
+MODEL_INFO = REGISTRY.register(Gauge(
+    'credit_model_info', 'Modelo carregado (valor 1)', ['model_version', 'backend']
+))
+MODEL_SWAPS = REGISTRY.register(Counter(
+    'credit_model_swaps_total', 'Trocas de modelo sem reinício (registro de modelos)', ['role']
+))
+SHADOW_INFO = REGISTRY.register(Gauge(
+    'credit_shadow_model_info', 'Modelo em modo sombra (valor 1)', ['model_version']
+))
+SHADOW_ROWS = REGISTRY.register(Counter(
+    'credit_shadow_rows_total', 'Linhas do modelo sombra por resultado da comparação com o ativo', ['result']
+))
+DECISIONS_LOGGED = REGISTRY.register(Counter(
+    'credit_decisions_logged_total', 'Decisões do registro de decisões por resultado da gravação', ['result']
+))
+CACHE_EVENTS = REGISTRY.register(Counter(
+    'credit_cache_events_total', 'Eventos do cache de predições', ['event']
+))
+CACHE_SIZE = REGISTRY.register(Gauge(
+    'credit_cache_entries', 'Entradas no cache de predições'
+))
+
+
+# Ligado por configure_log(); testado antes de montar cada linha de log
+_log_enabled = False
+
+
+def _log(event, **fields):
+    logger.info(json.dumps({'ts': time.time(), 'event': event, **fields}))
+
+
+class timed:
+    """
+    Mede uma etapa no histograma credit_stage_seconds (uso: `with timed('features'):`).
+    Exceções são contadas em credit_errors_total. É uma classe, e não um
+    contextlib.contextmanager, para reduzir o custo por chamada.
+    """
+
+    __slots__ = ('stage', 'rows', 'start')
+
+    def __init__(self, stage, rows=None):
+        self.stage = stage
+        self.rows = rows
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is not None:
+            if issubclass(exc_type, Exception):
+                ERRORS.inc(1, self.stage)
+                if _log_enabled:
+                    _log('error', stage=self.stage, error=exc_type.__name__)
+            return False
+        elapsed = time.perf_counter() - self.start
+        STAGE_SECONDS.observe(elapsed, self.stage)
+        if _log_enabled:
+            _log('stage', stage=self.stage, seconds=elapsed, rows=self.rows)
+        return False
+
+
+def count_rows(rows):
+    ROWS_SCORED.inc(rows)
+
+
+def record_model_load(model, backend, seconds):
+    MODEL_LOAD_SECONDS.set(seconds, backend)
+    # Só o último modelo carregado aparece em credit_model_info
+    MODEL_INFO.clear()
+    MODEL_INFO.set(1, str(getattr(model, 'model_version', 'desconhecida')), backend)
+    if _log_enabled:
+        _log('model_load', backend=backend, seconds=seconds, model_version=getattr(model, 'model_version', None))
+
+
+def record_model_swap(role, model_version):
+    """Troca do modelo ativo ou do sombra (role = 'active' ou 'shadow')"""
+    MODEL_SWAPS.inc(1, role)
+    if role == 'shadow':
+        SHADOW_INFO.clear()
+        if model_version is not None:
+            SHADOW_INFO.set(1, str(model_version))
+    if _log_enabled:
+        _log('model_swap', role=role, model_version=model_version)
+
+
+def record_shadow(agree, disagree, skipped=0):
+    """Linhas pontuadas pelo modelo sombra: mesma decisão, decisão diferente e descartadas"""
+    if agree:
+        SHADOW_ROWS.inc(agree, 'agree')
+    if disagree:
+        SHADOW_ROWS.inc(disagree, 'disagree')
+    if skipped:
+        SHADOW_ROWS.inc(skipped, 'skipped')
+
+
+def record_decisions(written, dropped=0):
+    """Decisões gravadas e descartadas pelo registro de decisões (scoring/decisions.py)"""
+    if written:
+        DECISIONS_LOGGED.inc(written, 'written')
+    if dropped:
+        DECISIONS_LOGGED.inc(dropped, 'dropped')
+
+
+def register_cache(cache):
+    """Expõe as estatísticas de um PredictionCache (scoring/cache.py)"""
+    if cache is None:
+        return
+
+    def collect():
+        stats = cache.stats()
+        for event in ('hits', 'misses', 'evictions', 'expirations', 'invalidations'):
+            CACHE_EVENTS.set(stats[event], event)
+        CACHE_SIZE.set(stats['size'])
+
+    REGISTRY.add_collector(collect)
+
+
+def configure_log(destination=METRICS_LOG):
+    """Ativa o log estruturado (uma linha JSON por medição) em um arquivo ou stderr"""
+    global _log_enabled
+    if not destination or logger.handlers:
+        return
+    handler = logging.StreamHandler(sys.stderr) if destination == '-' else logging.FileHandler(destination)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    _log_enabled = True
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port=METRICS_PORT, host='127.0.0.1'):
+    """Servidor HTTP local com /metrics em uma thread de fundo (None se port=0)"""
+    if not port:
+        return None
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+configure_log()
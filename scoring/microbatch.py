@@ -0,0 +1,148 @@
+"""
+Micro-batching assíncrono para o scoring online.
+
+Requisições individuais que chegam ao mesmo tempo são agrupadas em uma fila
+asyncio: o lote é fechado ao atingir `max_batch_size` clientes ou após
+`max_wait_ms` milissegundos desde o primeiro da fila, pontuado como uma única
+matriz (o mesmo caminho vetorizado do lote) e cada resultado volta para quem
+o pediu. Sob concorrência o throughput sobe muito; a latência extra fica
+limitada a `max_wait_ms` mais o tempo de pontuar o lote.
+
+Configuração por variáveis de ambiente:
+    CREDIT_BATCH_MAX_SIZE      clientes por lote (1 desativa o agrupamento)
+    CREDIT_BATCH_MAX_WAIT_MS   espera máxima para completar um lote
+"""
+import asyncio
+import logging
+import os
+import time
+
+from scoring.metrics import REGISTRY, STAGE_SECONDS, Histogram
+
+MAX_BATCH_SIZE = int(os.environ.get('CREDIT_BATCH_MAX_SIZE', 64))
+MAX_WAIT_MS = float(os.environ.get('CREDIT_BATCH_MAX_WAIT_MS', 2))
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = REGISTRY.register(Histogram(
+    'credit_microbatch_size', 'Clientes por lote do micro-batching',
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+))
+
+
+class MicroBatcher:
+    """
+    Agrupa chamadas de `submit(item)` em lotes para `score_fn(itens)`.
+
+    `score_fn` é síncrona, recebe a lista de itens e retorna uma lista de
+    resultados na mesma ordem; roda em uma thread para não bloquear o event
+    loop. O laço de agrupamento é iniciado na primeira chamada; se ele for
+    encerrado por uma exceção, ela é registrada no log e repassada aos pedidos
+    do lote em andamento, e um novo laço passa a atender a fila.
+    """
+
+    def __init__(self, score_fn, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size deve ser pelo menos 1")
+        self.score_fn = score_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = None
+        self._task = None
+        self._loop = None
+        # Lote sendo pontuado pelo laço (itens, futures, instante de entrada)
+        self._batch = []
+
+    async def submit(self, item):
+        """Enfileira um item e aguarda o resultado dele"""
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._loop is not loop:
+            # Primeira chamada (ou novo event loop): fila e laço pertencem ao loop atual
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._start()
+        elif self._task.done():
+            # O laço morreu (a exceção já foi registrada em _task_done); um novo atende a mesma fila
+            self._start()
+        future = loop.create_future()
+        await self._queue.put((item, future, time.perf_counter()))
+        return await future
+
+    def _start(self):
+        self._task = self._loop.create_task(self._run())
+        self._task.add_done_callback(self._task_done)
+
+    def _task_done(self, task):
+        """Registra a exceção que encerrou o laço e a repassa aos pedidos do lote em andamento"""
+        if task.cancelled() or task.exception() is None:
+            return
+        error = task.exception()
+        logger.error("Laço do micro-batching encerrado por erro", exc_info=error)
+        for _, future, _ in self._batch:
+            if not future.done():
+                future.set_exception(error)
+        self._batch = []
+        if task is self._task and not self._queue.empty() and not self._loop.is_closed():
+            # Pedidos já na fila não esperam por uma nova chamada de submit
+            self._start()
+
+    async def _collect(self):
+        """Espera o primeiro item e completa o lote até o tamanho ou o prazo máximo"""
+        batch = [await self._queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            # Itens que já estão na fila entram sem esperar
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            # Pedidos cancelados pelo cliente enquanto esperavam na fila
+            batch = [entry for entry in batch if not entry[1].cancelled()]
+            if not batch:
+                continue
+            self._batch = batch
+            now = time.perf_counter()
+            for _, _, queued_at in batch:
+                STAGE_SECONDS.observe(now - queued_at, 'queue')
+            BATCH_SIZE.observe(len(batch))
+
+            try:
+                results = await loop.run_in_executor(None, self.score_fn, [item for item, _, _ in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future, _), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+            self._batch = []
+
+    async def close(self):
+        """Encerra o laço de agrupamento (pedidos ainda na fila são cancelados)"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            # O laço já tinha morrido; a exceção foi registrada em _task_done
+            pass
+        while not self._queue.empty():
+            _, future, _ = self._queue.get_nowait()
+            future.cancel()
+        self._task = None
@@ -0,0 +1,143 @@
+"""
+Carregamento do modelo e predição de crédito.
+
+Funções compartilhadas entre o app Streamlit (app.py) e a API de scoring
+(scoring/api.py), para que ambos usem exatamente o mesmo caminho de predição.
+"""
+import hashlib
+import os
+import pickle
+import time
+
+import numpy as np
+
+from scoring.bundle import ScalerParams, is_bundle, load_bundle, load_bundle_scaler
+from scoring.engine import CompiledEnsemble
+from scoring.features import MODEL_COLUMNS, scale_features
+from scoring.metrics import count_rows, record_model_load, timed
+
+# Bundle versionado (scoring/bundle.py); os arquivos .pkl são o formato legado
+BUNDLE_PATH = 'model_bundle'
+LEGACY_MODEL_PATH = 'lgbm_model_optimized.pkl'
+LEGACY_SCALER_PATH = 'scaler.pkl'
+
+_DEFAULT_PATH = BUNDLE_PATH if is_bundle(BUNDLE_PATH) else None
+MODEL_PATH = os.environ.get('CREDIT_MODEL_PATH', _DEFAULT_PATH or LEGACY_MODEL_PATH)
+SCALER_PATH = os.environ.get('CREDIT_SCALER_PATH', _DEFAULT_PATH or LEGACY_SCALER_PATH)
+
+# Backend de inferência: 'lightgbm' (LGBMClassifier ou Booster do bundle) ou 'compiled'
+# (scoring/engine.py, mesmas probabilidades e menor latência, ver README)
+MODEL_BACKEND = os.environ.get('CREDIT_MODEL_BACKEND', 'lightgbm')
+BACKENDS = ('lightgbm', 'compiled')
+
+# Probabilidade de aprovação acima da qual o crédito é aprovado
+DECISION_THRESHOLD = float(os.environ.get('CREDIT_DECISION_THRESHOLD', 0.5))
+
+
+def load_model(path=MODEL_PATH, backend=MODEL_BACKEND, record=True):
+    """
+    Carrega o modelo treinado (bundle versionado ou .pkl legado).
+    Com record=False o carregamento não aparece em credit_model_info (ex.:
+    versões ainda em aquecimento ou em modo sombra, scoring/registry.py).
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend desconhecido: {backend} (opções: {', '.join(BACKENDS)})")
+    start = time.perf_counter()
+    if is_bundle(path):
+        model = load_bundle(path, backend)
+    else:
+        with open(path, 'rb') as f:
+            content = f.read()
+        model = pickle.loads(content)
+        version = hashlib.sha256(content).hexdigest()[:12]
+        if backend == 'compiled':
+            # O Booster original continua disponível para as explicações (scoring/explain.py)
+            booster = model.booster_
+            model = CompiledEnsemble.from_model(model)
+            model.booster_ = booster
+        model.model_version = version
+    model.load_seconds = time.perf_counter() - start
+    if record:
+        record_model_load(model, backend, model.load_seconds)
+    return model
+
+
+def load_scaler(path=SCALER_PATH):
+    """
+    Carrega os parâmetros do scaler (ScalerParams).
+
+    No bundle, o manifest indica se o modelo espera as features normalizadas.
+    O .pkl legado acompanha um modelo treinado sem normalização, então o
+    scaler é carregado desativado.
+    """
+    if is_bundle(path):
+        return load_bundle_scaler(path)
+    with open(path, 'rb') as f:
+        return ScalerParams.from_scaler(pickle.load(f), apply=False)
+
+
+def preprocess_input(input_data, scaler, out=None):
+    """
+    Pré-processa os dados de entrada aplicando normalização com o scaler
+    IMPORTANTE: O scaler normaliza apenas as 13 features numéricas contínuas
+    (SCALED_COLUMNS). As features binárias (high_debt, low_cibil,
+    education_encoded, self_employed_encoded) NÃO são normalizadas.
+
+    A normalização só é aplicada se o modelo foi treinado com ela
+    (`scaler.apply`); o modelo atual usa as features sem normalização e os
+    dados passam sem cópia. `out` permite normalizar em um array já alocado
+    (inclusive o próprio input_data).
+    """
+    if scaler is None or not scaler.apply:
+        return input_data
+    if hasattr(input_data, 'to_numpy'):
+        input_data = input_data[MODEL_COLUMNS].to_numpy(dtype=np.float64)
+    return scale_features(input_data, scaler, out)
+
+
+def score(model, processed_data, threshold=DECISION_THRESHOLD):
+    """
+    Executa o ensemble uma única vez e deriva a classe das probabilidades.
+
+    Retorna (classes, probabilidades), com probabilidades no formato
+    (n_linhas, 2) = [rejeição, aprovação]. Com threshold=0.5 as classes são
+    as mesmas de model.predict.
+    """
+    with timed('inference', len(processed_data)):
+        probabilities = model.predict_proba(processed_data)
+    return apply_threshold(model, probabilities, threshold), probabilities
+
+
+def apply_threshold(model, probabilities, threshold=DECISION_THRESHOLD):
+    """Classe de cada linha a partir das probabilidades [rejeição, aprovação]"""
+    return model.classes_[(probabilities[:, 1] > threshold).astype(int)]
+
+
+def predict_batch(model, scaler, input_data, threshold=DECISION_THRESHOLD, cache=None):
+    """
+    Pré-processa e pontua várias linhas em uma única passada pelo modelo.
+
+    Com `cache` (scoring.cache.PredictionCache) só as linhas ainda não vistas
+    por esta versão do modelo são pré-processadas e pontuadas.
+    """
+    count_rows(len(input_data))
+    if cache is None:
+        with timed('preprocess', len(input_data)):
+            processed_data = preprocess_input(input_data, scaler)
+        return score(model, processed_data, threshold)
+
+    def compute(rows):
+        with timed('preprocess', len(rows)):
+            processed_rows = preprocess_input(rows, scaler)
+        with timed('inference', len(rows)):
+            return model.predict_proba(processed_rows)
+
+    with timed('cache', len(input_data)):
+        probabilities = cache.predict_proba(model, input_data, compute)
+    return apply_threshold(model, probabilities, threshold), probabilities
+
+
+def predict_credit(model, scaler, input_data, threshold=DECISION_THRESHOLD, cache=None):
+    """Pontua um único cliente, retornando (classe, [prob. rejeição, prob. aprovação])"""
+    predictions, probabilities = predict_batch(model, scaler, input_data, threshold, cache)
+    return predictions[0], probabilities[0]
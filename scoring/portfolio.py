@@ -0,0 +1,152 @@
+"""
+Análise da carteira pontuada em lote, calculada bloco a bloco.
+
+Para cada segmento (faixa de CIBIL, prazo, escolaridade e autônomo) são
+acumulados o número de clientes, de aprovados e a soma das probabilidades de
+aprovação, além do histograma das probabilidades por valor do segmento. Cada
+bloco custa alguns np.bincount sobre as colunas já calculadas para o modelo;
+a memória é fixa, independente do número de linhas, e os resumos de blocos ou
+processos diferentes podem ser somados (merge), como o monitor de drift.
+
+Uso:
+    python -m scoring.batch carteira.csv -o resultados.csv --portfolio
+"""
+import numpy as np
+import pandas as pd
+
+from scoring.features import COLUMN_INDEX
+
+# Faixas de probabilidade de aprovação do histograma (0-5%, 5-10%, ...)
+HISTOGRAM_BINS = 20
+
+# Faixas de CIBIL: 650 é o limite de low_cibil (scoring/features.py)
+CIBIL_EDGES = (550, 650, 750)
+CIBIL_LABELS = ['300-549', '550-649', '650-749', '750-900']
+
+# Prazo máximo aceito pelo esquema (scoring/schema.py)
+MAX_LOAN_TERM = 30
+
+
+def _cibil_band(X):
+    return np.searchsorted(CIBIL_EDGES, X[:, COLUMN_INDEX['cibil_score']], side='right')
+
+
+def _loan_term(X):
+    return np.clip(X[:, COLUMN_INDEX['loan_term']], 0, MAX_LOAN_TERM).astype(np.intp)
+
+
+def _flag(column):
+    return lambda X: (X[:, COLUMN_INDEX[column]] == 1).astype(np.intp)
+
+
+# Segmento -> (título, rótulo de cada código, códigos das linhas da matriz de features)
+SEGMENTS = {
+    'cibil': ('Faixa CIBIL', CIBIL_LABELS, _cibil_band),
+    'loan_term': ('Prazo (anos)', [str(term) for term in range(MAX_LOAN_TERM + 1)], _loan_term),
+    'education': ('Escolaridade', ['Not Graduate', 'Graduate'], _flag('education_encoded')),
+    'self_employed': ('Autônomo', ['No', 'Yes'], _flag('self_employed_encoded'))
+}
+
+
+def histogram_labels():
+    return [f"{b / HISTOGRAM_BINS:.0%}-{(b + 1) / HISTOGRAM_BINS:.0%}" for b in range(HISTOGRAM_BINS)]
+
+
+class PortfolioSummary:
+    """
+    Agregados da carteira acumulados por bloco.
+
+    update recebe a matriz de features (n_linhas, 17) sem normalização, as
+    probabilidades de aprovação e as classes previstas (1 = Aprovado).
+    """
+
+    def __init__(self):
+        # Por segmento: clientes por (código, faixa de probabilidade), aprovados e soma das probabilidades por código
+        self.histograms = {name: np.zeros((len(labels), HISTOGRAM_BINS), dtype=np.int64)
+                           for name, (_, labels, _) in SEGMENTS.items()}
+        self.approved = {name: np.zeros(len(labels), dtype=np.int64) for name, (_, labels, _) in SEGMENTS.items()}
+        self.prob_sum = {name: np.zeros(len(labels), dtype=np.float64) for name, (_, labels, _) in SEGMENTS.items()}
+        # Aprovados por faixa de probabilidade (o limiar pode cortar uma faixa ao meio)
+        self.approved_histogram = np.zeros(HISTOGRAM_BINS, dtype=np.int64)
+
+    @property
+    def total(self):
+        # Todo segmento cobre todas as linhas
+        return int(self.histograms['cibil'].sum())
+
+    def update(self, X, probabilities, predictions):
+        X = np.asarray(X, dtype=np.float64)
+        probabilities = np.asarray(probabilities, dtype=np.float64)
+        if len(probabilities) == 0:
+            return
+        bins = np.minimum((probabilities * HISTOGRAM_BINS).astype(np.intp), HISTOGRAM_BINS - 1)
+        approved = np.asarray(predictions) == 1
+        self.approved_histogram += np.bincount(bins[approved], minlength=HISTOGRAM_BINS)
+        for name, (_, labels, codes_for) in SEGMENTS.items():
+            codes = codes_for(X)
+            n_codes = len(labels)
+            self.histograms[name] += np.bincount(
+                codes * HISTOGRAM_BINS + bins, minlength=n_codes * HISTOGRAM_BINS
+            ).reshape(n_codes, HISTOGRAM_BINS)
+            self.approved[name] += np.bincount(codes[approved], minlength=n_codes)
+            self.prob_sum[name] += np.bincount(codes, weights=probabilities, minlength=n_codes)
+
+    def merge(self, other):
+        """Soma os agregados de outro resumo (ex.: de outro processo)"""
+        for name in SEGMENTS:
+            self.histograms[name] += other.histograms[name]
+            self.approved[name] += other.approved[name]
+            self.prob_sum[name] += other.prob_sum[name]
+        self.approved_histogram += other.approved_histogram
+        return self
+
+    def segment(self, name):
+        """Uma linha por valor do segmento com clientes: clientes, aprovados, taxa de aprovação e prob. média"""
+        title, labels, _ = SEGMENTS[name]
+        counts = self.histograms[name].sum(axis=1)
+        present = counts > 0
+        clients = counts[present]
+        approved = self.approved[name][present]
+        return pd.DataFrame({
+            title: np.asarray(labels)[present],
+            'clientes': clients,
+            'aprovados': approved,
+            'taxa_aprovacao': approved / clients,
+            'prob_media': self.prob_sum[name][present] / clients,
+            'participacao': clients / max(self.total, 1)
+        })
+
+    def histogram(self, name=None, label=None):
+        """
+        Clientes por faixa de probabilidade de aprovação; com `name` e `label`
+        só os de um valor do segmento (ex.: 'cibil', '300-549'). Aprovados e
+        rejeitados só são separados na carteira inteira.
+        """
+        if name is None:
+            counts = self.histograms['cibil'].sum(axis=0)
+            return pd.DataFrame({
+                'faixa_prob': histogram_labels(),
+                'aprovados': self.approved_histogram,
+                'rejeitados': counts - self.approved_histogram
+            })
+        _, labels, _ = SEGMENTS[name]
+        return pd.DataFrame({
+            'faixa_prob': histogram_labels(),
+            'clientes': self.histograms[name][labels.index(label)]
+        })
+
+    def segment_labels(self, name):
+        """Valores do segmento com pelo menos um cliente"""
+        _, labels, _ = SEGMENTS[name]
+        counts = self.histograms[name].sum(axis=1)
+        return [label for label, count in zip(labels, counts) if count]
+
+
+def print_report(summary, file=None):
+    """Agregados por segmento em texto (linha de comando)"""
+    for name in SEGMENTS:
+        print(summary.segment(name).to_string(
+            index=False, formatters={'taxa_aprovacao': '{:.1%}'.format, 'prob_media': '{:.1%}'.format,
+                                     'participacao': '{:.1%}'.format}
+        ), file=file)
+        print(file=file)
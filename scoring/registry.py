@@ -0,0 +1,495 @@
+"""
+Registro de modelos versionado (em arquivos) e troca do modelo sem reinício.
+
+Estrutura do registro (CREDIT_REGISTRY_PATH, padrão model_registry/):
+
+    versions/<versão>/   um bundle por versão (scoring/bundle.py), imutável
+    state.json           versão ativa, versão anterior (rollback) e versão sombra
+
+O state.json é regravado de forma atômica (arquivo temporário + os.replace),
+então quem lê o registro nunca vê um estado parcial.
+
+ModelServer (app e API) mantém o modelo ativo e, opcionalmente, um modelo
+sombra. Uma thread de fundo consulta o registro a cada CREDIT_REGISTRY_POLL
+segundos; quando a versão ativa muda, o novo bundle é carregado e aquecido
+(predições em linhas de X_test.csv) ainda em segundo plano, e só então passa
+a atender, com a troca de uma única referência. Os pedidos em andamento
+terminam com o modelo com que começaram. Enquanto o registro não tem versão
+ativa, o modelo servido é o de CREDIT_MODEL_PATH (scoring/model.py). Se a
+versão ativa falhar na inicialização, o servidor sobe com a versão anterior
+do registro ou, sem ela, com CREDIT_MODEL_PATH, e o erro fica em last_error.
+Uma versão que falhou só é tentada de novo quando os arquivos dela mudam.
+
+Modo sombra: o modelo candidato pontua as mesmas linhas em uma thread
+separada, sem atrasar a resposta; a latência e a concordância das decisões
+com o modelo ativo ficam em credit_shadow_rows_total,
+credit_stage_seconds{stage="shadow"} e ModelServer.shadow_stats().
+
+Uso:
+    python -m scoring.registry add model_bundle --promote   # registra e ativa um bundle
+    python -m scoring.registry list
+    python -m scoring.registry shadow <versão>              # candidato em modo sombra
+    python -m scoring.registry promote <versão>
+    python -m scoring.registry rollback
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+from scoring.bundle import BundleError, is_bundle, read_manifest, verify_bundle
+from scoring.features import build_features
+from scoring.formats import read_table
+from scoring.metrics import record_model_load, record_model_swap, record_shadow, timed
+from scoring.model import (
+    DECISION_THRESHOLD, MODEL_BACKEND, MODEL_PATH, SCALER_PATH, load_model, load_scaler, preprocess_input
+)
+
+REGISTRY_PATH = os.environ.get('CREDIT_REGISTRY_PATH', 'model_registry')
+VERSIONS_DIR = 'versions'
+STATE_FILE = 'state.json'
+
+# Intervalo entre as consultas ao registro (segundos; 0 desativa a troca automática)
+POLL_INTERVAL = float(os.environ.get('CREDIT_REGISTRY_POLL', 5))
+
+# Aquecimento antes da troca: lote e linhas avulsas do primeiro arquivo existente
+# (X_test.csv não vai para a imagem Docker; o exemplo do app vai)
+WARMUP_SOURCES = (
+    os.environ.get('CREDIT_WARMUP_DATA', 'X_test.csv'),
+    os.path.join('Arquivos', 'exemplo_lote.csv')
+)
+WARMUP_ROWS = 256
+WARMUP_SINGLE_ROWS = 32
+
+# Chamadas do modelo sombra em andamento; acima disso as linhas são descartadas
+SHADOW_MAX_PENDING = int(os.environ.get('CREDIT_SHADOW_MAX_PENDING', 8))
+
+EMPTY_STATE = {'active': None, 'previous': None, 'shadow': None, 'updated_at': None}
+
+
+class RegistryError(Exception):
+    """Versão inexistente, registro vazio ou versão que falhou no aquecimento"""
+
+
+class ModelRegistry:
+    """Versões registradas (bundles) e estado do registro em um diretório"""
+
+    def __init__(self, root=REGISTRY_PATH):
+        self.root = root
+        self.versions_dir = os.path.join(root, VERSIONS_DIR)
+        self.state_path = os.path.join(root, STATE_FILE)
+
+    def path(self, version):
+        return os.path.join(self.versions_dir, version)
+
+    def signature(self, version):
+        """Nome, tamanho e mtime dos arquivos de uma versão (muda quando os arquivos são corrigidos)"""
+        files = []
+        try:
+            for directory, _, names in os.walk(self.path(version)):
+                for name in names:
+                    stat = os.stat(os.path.join(directory, name))
+                    files.append((os.path.join(directory, name), stat.st_size, stat.st_mtime_ns))
+        except OSError:
+            return None
+        return tuple(sorted(files))
+
+    def has_version(self, version):
+        return bool(version) and is_bundle(self.path(version))
+
+    def versions(self):
+        """Manifests das versões registradas, da mais antiga para a mais nova"""
+        if not os.path.isdir(self.versions_dir):
+            return []
+        names = [name for name in os.listdir(self.versions_dir) if not name.startswith('.')]
+        manifests = [read_manifest(self.path(name)) for name in names if is_bundle(self.path(name))]
+        return sorted(manifests, key=lambda manifest: manifest['created_at'])
+
+    def state(self):
+        try:
+            with open(self.state_path) as f:
+                return {**EMPTY_STATE, **json.load(f)}
+        except FileNotFoundError:
+            return dict(EMPTY_STATE)
+
+    def _write_state(self, **changes):
+        state = {**self.state(), **changes, 'updated_at': datetime.now(timezone.utc).isoformat(timespec='seconds')}
+        os.makedirs(self.root, exist_ok=True)
+        fd, staging = tempfile.mkstemp(prefix='.state-', dir=self.root)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(state, f, indent=2)
+            os.replace(staging, self.state_path)
+        except BaseException:
+            os.remove(staging)
+            raise
+        return state
+
+    def _check(self, version):
+        if not self.has_version(version):
+            raise RegistryError(f"Versão não registrada: {version}")
+
+    def register(self, bundle_path):
+        """
+        Copia um bundle (com checksums conferidos) para o registro e retorna a
+        versão. Versões são imutáveis: registrar de novo a mesma versão não faz nada.
+        """
+        manifest = verify_bundle(bundle_path)
+        version = manifest['model_version']
+        if self.has_version(version):
+            return version
+        os.makedirs(self.versions_dir, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix='.version-', dir=self.versions_dir)
+        try:
+            shutil.copytree(bundle_path, staging, dirs_exist_ok=True)
+            os.chmod(staging, 0o755)
+            os.replace(staging, self.path(version))
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        return version
+
+    def promote(self, version):
+        """
+        Ativa uma versão (a ativa atual vira a anterior, para o rollback). Os
+        checksums são conferidos aqui, antes de os servidores carregarem a versão.
+        """
+        self._check(version)
+        verify_bundle(self.path(version))
+        state = self.state()
+        if state['active'] == version:
+            return state
+        return self._write_state(
+            active=version, previous=state['active'],
+            shadow=None if state['shadow'] == version else state['shadow']
+        )
+
+    def rollback(self):
+        """Volta para a versão ativa anterior"""
+        state = self.state()
+        if not state['previous']:
+            raise RegistryError("Não há versão anterior para o rollback")
+        return self._write_state(active=state['previous'], previous=state['active'])
+
+    def set_shadow(self, version):
+        """Coloca uma versão em modo sombra (None desativa)"""
+        if version is not None:
+            self._check(version)
+        return self._write_state(shadow=version)
+
+
+class Deployment:
+    """Uma versão carregada e aquecida: modelo, scaler e os caminhos de onde vieram"""
+
+    def __init__(self, version, model, scaler, model_path, scaler_path, load_seconds):
+        self.version = version
+        self.model = model
+        self.scaler = scaler
+        self.model_path = model_path
+        self.scaler_path = scaler_path
+        self.load_seconds = load_seconds
+
+
+def warmup_data(sources=WARMUP_SOURCES, rows=WARMUP_ROWS):
+    """Features das primeiras linhas do primeiro arquivo de aquecimento existente"""
+    for path in sources:
+        if path and os.path.exists(path):
+            return build_features(read_table(path, nrows=rows))
+    raise RegistryError(f"Nenhum arquivo de aquecimento encontrado: {', '.join(filter(None, sources))}")
+
+
+def warm_up(model, scaler, X, single_rows=WARMUP_SINGLE_ROWS):
+    """
+    Primeiras predições de uma versão, antes de ela atender: um lote e linhas
+    avulsas (o caminho da API), fora das métricas de inferência. Falha se as
+    probabilidades não forem válidas.
+    """
+    processed = preprocess_input(X.copy(), scaler)
+    probabilities = model.predict_proba(processed)
+    for i in range(min(single_rows, len(processed))):
+        model.predict_proba(processed[i:i + 1])
+    if not np.all(np.isfinite(probabilities)) or probabilities.min() < 0 or probabilities.max() > 1:
+        raise RegistryError("Probabilidades inválidas no aquecimento")
+    return probabilities
+
+
+class ShadowStats:
+    """Concordância e latência acumuladas do modelo sombra"""
+
+    def __init__(self, version=None):
+        self.version = version
+        self.calls = 0
+        self.rows = 0
+        self.agreements = 0
+        self.skipped = 0
+        self.seconds = 0.0
+        self.abs_diff_sum = 0.0
+        self.max_abs_diff = 0.0
+
+    def add(self, rows, agreements, seconds, abs_diff):
+        self.calls += 1
+        self.rows += rows
+        self.agreements += agreements
+        self.seconds += seconds
+        self.abs_diff_sum += float(abs_diff.sum())
+        self.max_abs_diff = max(self.max_abs_diff, float(abs_diff.max(initial=0.0)))
+
+    def as_dict(self):
+        return {
+            'version': self.version,
+            'calls': self.calls,
+            'rows': self.rows,
+            'skipped': self.skipped,
+            'agreement': self.agreements / self.rows if self.rows else None,
+            'mean_abs_diff': self.abs_diff_sum / self.rows if self.rows else None,
+            'max_abs_diff': self.max_abs_diff,
+            'mean_latency_ms': self.seconds / self.calls * 1000 if self.calls else None
+        }
+
+
+class ModelServer:
+    """
+    Modelo servido pelo app e pela API, trocado sem reinício quando o registro muda.
+
+    Leia `server.active` uma vez por pedido e use o modelo e o scaler desse
+    objeto: a troca substitui a referência inteira, nunca um dos dois.
+    """
+
+    def __init__(self, registry=None, backend=MODEL_BACKEND, model_path=MODEL_PATH, scaler_path=SCALER_PATH):
+        self.registry = registry if registry is not None else ModelRegistry()
+        self.backend = backend
+        self.model_path = model_path
+        self.scaler_path = scaler_path
+        self.active = None
+        self.shadow = None
+        self.last_error = None
+        # Versão que falhou -> assinatura dos arquivos no momento da falha
+        self._failed = {}
+        self._warmup = None
+        self._reload_lock = threading.Lock()
+        self._shadow_lock = threading.Lock()
+        self._shadow_pending = 0
+        self._shadow_stats = ShadowStats()
+        self._executor = None
+        self._stop = threading.Event()
+        self._watcher = None
+
+    def _load(self, version):
+        """Carrega e aquece uma versão do registro (None = modelo de model_path)"""
+        start = time.perf_counter()
+        if version is None:
+            model_path, scaler_path = self.model_path, self.scaler_path
+        else:
+            model_path = scaler_path = self.registry.path(version)
+        model = load_model(model_path, self.backend, record=False)
+        scaler = load_scaler(scaler_path)
+        if self._warmup is None:
+            self._warmup = warmup_data()
+        with timed('warmup', len(self._warmup)):
+            warm_up(model, scaler, self._warmup)
+        return Deployment(version or getattr(model, 'model_version', None), model, scaler, model_path, scaler_path,
+                          time.perf_counter() - start)
+
+    def refresh(self):
+        """
+        Confere o registro e troca o modelo ativo e o sombra se mudaram. Carga e
+        aquecimento acontecem antes da troca: se falharem, o modelo atual
+        continua atendendo, a versão só é tentada de novo quando seus arquivos
+        mudarem e o erro é propagado. Na inicialização (sem modelo atual) a
+        falha da versão ativa não é propagada: o servidor sobe com a versão
+        anterior ou com model_path e o erro fica em last_error.
+        Retorna True se algum modelo foi trocado.
+        """
+        with self._reload_lock:
+            state = self.registry.state()
+            changed = False
+
+            active = state['active'] if self.registry.has_version(state['active']) else None
+            if self.active is None:
+                deployment = self._load_startup(active, state['previous'])
+                self.active = deployment
+                record_model_load(deployment.model, self.backend, deployment.load_seconds)
+                changed = True
+            elif active is not None and active != self.active.version and not self._is_failed(active):
+                deployment = self._try_load(active)
+                previous, self.active = self.active, deployment
+                record_model_load(deployment.model, self.backend, deployment.load_seconds)
+                if previous is not None:
+                    record_model_swap('active', deployment.version)
+                changed = True
+
+            shadow = state['shadow'] if self.registry.has_version(state['shadow']) else None
+            current = self.shadow.version if self.shadow is not None else None
+            if shadow != current and not self._is_failed(shadow):
+                self.shadow = self._try_load(shadow) if shadow is not None else None
+                with self._shadow_lock:
+                    self._shadow_stats = ShadowStats(shadow)
+                record_model_swap('shadow', shadow)
+                changed = True
+            return changed
+
+    def _load_startup(self, active, previous):
+        """
+        Primeiro modelo do servidor: a versão ativa, a anterior do registro ou
+        model_path, o primeiro que carregar. Só falha se nenhum carregar.
+        """
+        candidates = [active]
+        if active is not None:
+            if previous != active and self.registry.has_version(previous):
+                candidates.append(previous)
+            candidates.append(None)
+        error = None
+        for version in candidates:
+            if version is not None and self._is_failed(version):
+                continue
+            try:
+                deployment = self._try_load(version)
+            except (OSError, BundleError, RegistryError, ValueError) as e:
+                error = error or e
+                continue
+            if error is not None:
+                # O modelo de reserva atende, mas a falha da versão ativa continua visível
+                self.last_error = f"{active}: {error}"
+            return deployment
+        raise error or RegistryError("Nenhum modelo pôde ser carregado")
+
+    def _is_failed(self, version):
+        """Versão que falhou e cujos arquivos não mudaram desde a falha"""
+        if version not in self._failed:
+            return False
+        if self._failed[version] != self.registry.signature(version):
+            del self._failed[version]
+            return False
+        return True
+
+    def _try_load(self, version):
+        try:
+            return self._load(version)
+        except (OSError, BundleError, RegistryError, ValueError) as e:
+            if version is not None:
+                self._failed[version] = self.registry.signature(version)
+            self.last_error = f"{version or self.model_path}: {e}"
+            raise
+
+    def watch(self, interval=POLL_INTERVAL):
+        """Consulta o registro em uma thread de fundo (erros ficam em last_error e credit_errors_total)"""
+        if not interval or self._watcher is not None:
+            return self._watcher
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    with timed('registry'):
+                        self.refresh()
+                except Exception:
+                    pass
+
+        self._watcher = threading.Thread(target=run, name='model-registry', daemon=True)
+        self._watcher.start()
+        return self._watcher
+
+    def shadow_score(self, input_data, probabilities, threshold=DECISION_THRESHOLD):
+        """
+        Pontua as mesmas linhas (features sem normalização) com o modelo sombra
+        em segundo plano e compara as decisões com as do ativo (`probabilities`).
+        Não bloqueia; com SHADOW_MAX_PENDING chamadas em andamento as linhas são
+        descartadas. `input_data` não pode ser alterado depois da chamada.
+        Retorna o Future da comparação (None sem modelo sombra ou se descartado).
+        """
+        shadow = self.shadow
+        if shadow is None:
+            return None
+        with self._shadow_lock:
+            if self._shadow_pending >= SHADOW_MAX_PENDING:
+                self._shadow_stats.skipped += len(input_data)
+                record_shadow(0, 0, len(input_data))
+                return None
+            self._shadow_pending += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='shadow')
+        return self._executor.submit(self._compare, shadow, input_data, probabilities, threshold)
+
+    def _compare(self, shadow, input_data, probabilities, threshold):
+        try:
+            start = time.perf_counter()
+            with timed('shadow', len(input_data)):
+                candidate = shadow.model.predict_proba(preprocess_input(input_data, shadow.scaler))
+            seconds = time.perf_counter() - start
+            agree = int(np.count_nonzero((candidate[:, 1] > threshold) == (probabilities[:, 1] > threshold)))
+            with self._shadow_lock:
+                if self._shadow_stats.version == shadow.version:
+                    self._shadow_stats.add(len(candidate), agree, seconds,
+                                           np.abs(candidate[:, 1] - probabilities[:, 1]))
+            record_shadow(agree, len(candidate) - agree)
+            return agree
+        finally:
+            with self._shadow_lock:
+                self._shadow_pending -= 1
+
+    def shadow_stats(self):
+        with self._shadow_lock:
+            return self._shadow_stats.as_dict()
+
+    def close(self):
+        self._stop.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Registro de modelos versionado")
+    parser.add_argument('--registry', default=REGISTRY_PATH, help="diretório do registro")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    add = commands.add_parser('add', help="registra um bundle (scoring/bundle.py)")
+    add.add_argument('bundle', nargs='?', default='model_bundle')
+    add.add_argument('--promote', action='store_true', help="ativa a versão registrada")
+    add.add_argument('--shadow', action='store_true', help="coloca a versão registrada em modo sombra")
+
+    commands.add_parser('list', help="versões registradas e estado")
+    promote = commands.add_parser('promote', help="ativa uma versão")
+    promote.add_argument('version')
+    commands.add_parser('rollback', help="volta para a versão ativa anterior")
+    shadow = commands.add_parser('shadow', help="coloca uma versão em modo sombra")
+    shadow.add_argument('version', nargs='?', help="omitir para desativar o modo sombra")
+
+    args = parser.parse_args(argv)
+    registry = ModelRegistry(args.registry)
+
+    try:
+        if args.command == 'add':
+            version = registry.register(args.bundle)
+            print(f"Versão {version} registrada em {registry.path(version)}")
+            if args.promote:
+                registry.promote(version)
+            elif args.shadow:
+                registry.set_shadow(version)
+        elif args.command == 'promote':
+            registry.promote(args.version)
+        elif args.command == 'rollback':
+            registry.rollback()
+        elif args.command == 'shadow':
+            registry.set_shadow(args.version)
+    except (BundleError, RegistryError) as e:
+        print(f"Erro: {e}", file=sys.stderr)
+        return 1
+
+    state = registry.state()
+    for manifest in registry.versions():
+        version = manifest['model_version']
+        roles = [role for role in ('active', 'previous', 'shadow') if state[role] == version]
+        print(f"   {version}  {manifest['created_at']}  {manifest['engine']['n_trees']} árvores  {' '.join(roles)}")
+    print(f"Ativa: {state['active'] or f'nenhuma ({MODEL_PATH})'} | Sombra: {state['shadow'] or 'nenhuma'}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
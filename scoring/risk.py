@@ -0,0 +1,156 @@
+"""
+Motor de regras de risco vetorizado.
+
+As regras são declarativas (feature, operador, limite) e avaliadas coluna a
+coluna sobre a matriz de features (n_linhas, 17) de build_features, sem laço
+por linha. O resultado de cada linha é uma máscara de bits: o bit i indica que
+a regra i da lista disparou. A mesma avaliação atende um único cliente (aba
+"Análise Individual") e arquivos com milhões de linhas (coluna Fatores_Risco).
+
+Formato de uma regra:
+    code        identificador curto (ex.: 'cibil_low')
+    feature     coluna de MODEL_COLUMNS
+    op          '>', '>=', '<', '<=', '==' ou '!='
+    value       limite numérico, ou
+    other       outra coluna de MODEL_COLUMNS, multiplicada por `factor` (padrão 1)
+    unless      code de uma regra anterior; se ela disparou, esta não dispara
+                (faixas exclusivas, como "alto" e "moderado")
+    message     texto exibido ao analista
+
+Regras adicionais podem ser carregadas de um arquivo JSON (lista de regras)
+indicado em CREDIT_RISK_RULES; elas são acrescentadas às regras padrão.
+"""
+import json
+import operator
+import os
+
+import numpy as np
+
+from scoring.features import COLUMN_INDEX
+
+OPERATORS = {
+    '>': operator.gt,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne
+}
+
+# Regras da aba "Análise de Risco"
+DEFAULT_RULES = [
+    {'code': 'credit_income_high', 'feature': 'credit_income_ratio', 'op': '>', 'value': 4,
+     'message': "Razão Crédito/Renda muito alta (> 4x)"},
+    {'code': 'credit_income_moderate', 'feature': 'credit_income_ratio', 'op': '>', 'value': 3,
+     'unless': 'credit_income_high', 'message': "Razão Crédito/Renda moderada (> 3x)"},
+    {'code': 'cibil_low', 'feature': 'cibil_score', 'op': '<', 'value': 650,
+     'message': "Score de crédito baixo (< 650)"},
+    {'code': 'cibil_moderate', 'feature': 'cibil_score', 'op': '<', 'value': 700,
+     'unless': 'cibil_low', 'message': "Score de crédito moderado (< 700)"},
+    {'code': 'loan_assets_high', 'feature': 'loan_assets_ratio', 'op': '>', 'value': 0.8,
+     'message': "Empréstimo muito alto em relação aos ativos (> 80%)"},
+    {'code': 'assets_low', 'feature': 'total_assets', 'op': '<', 'other': 'loan_amount', 'factor': 0.5,
+     'message': "Ativos totais baixos em relação ao empréstimo"}
+]
+
+RULES_PATH = os.environ.get('CREDIT_RISK_RULES')
+
+# Bits disponíveis na coluna Fatores_Risco (uint32)
+MAX_RULES = 32
+
+
+class RiskRules:
+    """Conjunto de regras validado, avaliado sobre matrizes de features"""
+
+    def __init__(self, rules=DEFAULT_RULES):
+        self.rules = [dict(rule) for rule in rules]
+        if len(self.rules) > MAX_RULES:
+            raise ValueError(f"No máximo {MAX_RULES} regras de risco (recebidas {len(self.rules)})")
+
+        self.codes = [rule['code'] for rule in self.rules]
+        self.messages = [rule.get('message', rule['code']) for rule in self.rules]
+        self._compiled = []
+        for i, rule in enumerate(self.rules):
+            if rule['code'] in self.codes[:i]:
+                raise ValueError(f"Regra de risco duplicada: {rule['code']}")
+            if rule.get('op') not in OPERATORS:
+                raise ValueError(f"Operador inválido na regra {rule['code']}: {rule.get('op')}")
+            for key in ('feature', 'other'):
+                if key in rule and rule[key] not in COLUMN_INDEX:
+                    raise ValueError(f"Coluna desconhecida na regra {rule['code']}: {rule[key]}")
+            if ('value' in rule) == ('other' in rule):
+                raise ValueError(f"A regra {rule['code']} precisa de 'value' ou de 'other'")
+            unless = rule.get('unless')
+            if unless is not None and unless not in self.codes[:i]:
+                raise ValueError(f"A regra {rule['code']} depende de uma regra anterior inexistente: {unless}")
+            self._compiled.append((
+                OPERATORS[rule['op']],
+                COLUMN_INDEX[rule['feature']],
+                COLUMN_INDEX.get(rule.get('other')),
+                float(rule.get('factor', 1.0)),
+                float(rule.get('value', 0.0)),
+                self.codes.index(unless) if unless is not None else None
+            ))
+
+    def __len__(self):
+        return len(self.rules)
+
+    def masks(self, X):
+        """Máscara booleana de cada regra, matriz (n_regras, n_linhas)"""
+        X = np.asarray(X)
+        masks = np.empty((len(self.rules), X.shape[0]), dtype=bool)
+        for i, (op, feature, other, factor, value, unless) in enumerate(self._compiled):
+            limit = X[:, other] * factor if other is not None else value
+            masks[i] = op(X[:, feature], limit)
+            if unless is not None:
+                masks[i] &= ~masks[unless]
+        return masks
+
+    def evaluate(self, X):
+        """Máscara de bits por linha (uint32): bit i = regra i disparou"""
+        flags = np.zeros(np.asarray(X).shape[0], dtype=np.uint32)
+        for i, mask in enumerate(self.masks(X)):
+            flags |= mask.astype(np.uint32) << np.uint32(i)
+        return flags
+
+    def codes_for(self, flags):
+        """Códigos das regras presentes em uma máscara de bits"""
+        flags = int(flags)
+        return [code for i, code in enumerate(self.codes) if flags >> i & 1]
+
+    def describe(self, flags):
+        """Mensagens das regras presentes em uma máscara de bits"""
+        flags = int(flags)
+        return [message for i, message in enumerate(self.messages) if flags >> i & 1]
+
+    def counts(self, flags):
+        """Quantas linhas dispararam cada regra, array (n_regras,)"""
+        flags = np.asarray(flags, dtype=np.uint32)
+        return np.array([np.count_nonzero(flags & np.uint32(1 << i)) for i in range(len(self.rules))],
+                        dtype=np.int64)
+
+    def reasons(self, flags, separator='; '):
+        """
+        Texto dos fatores de cada linha. As combinações distintas são poucas,
+        então cada uma é descrita uma vez e distribuída com np.unique.
+        """
+        unique, inverse = np.unique(np.asarray(flags, dtype=np.uint32), return_inverse=True)
+        texts = np.array([separator.join(self.codes_for(value)) for value in unique], dtype=object)
+        return texts[inverse]
+
+
+def load_rules(path=RULES_PATH):
+    """Regras padrão mais as regras do arquivo JSON em `path` (se houver)"""
+    rules = list(DEFAULT_RULES)
+    if path:
+        with open(path) as f:
+            rules.extend(json.load(f))
+    return RiskRules(rules)
+
+
+RULES = load_rules()
+
+
+def evaluate_risk(X, rules=None):
+    """Máscara de bits dos fatores de risco de cada linha da matriz de features"""
+    return (rules if rules is not None else RULES).evaluate(X)
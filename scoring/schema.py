@@ -0,0 +1,189 @@
+"""
+Esquema dos arquivos de entrada do scoring em lote.
+
+Antes de qualquer inferência cada bloco lido passa por esta camada:
+    - leitura tipada: o CSV é interpretado com os tipos do esquema (int64 ou
+      float64 nas colunas numéricas), sem inferência de tipos pelo pandas;
+    - colunas na ordem do modelo (MODEL_COLUMNS), seguidas das demais;
+    - validação vetorizada por coluna: valores ausentes, não numéricos, fora da
+      faixa (ex.: CIBIL 300-900, prazo 1-30) ou categorias desconhecidas.
+
+As linhas inválidas são retiradas do bloco e descritas no relatório de erros
+(uma linha por valor inválido: linha do arquivo, coluna, valor e motivo); as
+demais seguem para o modelo. Arquivos sem as colunas obrigatórias falham
+antes da leitura (check_columns).
+
+As features engineered (credit_income_ratio, total_assets, ...) são sempre
+recalculadas a partir dos campos brutos; se vierem no arquivo, são lidas como
+float64 e não são validadas.
+"""
+import io
+
+import numpy as np
+import pandas as pd
+
+from scoring.features import CATEGORICAL_ENCODINGS, ENGINEERED_COLUMNS, MODEL_COLUMNS, RAW_COLUMNS
+
+# Faixa válida de cada campo bruto: (mínimo, máximo), None = sem limite.
+# Os ativos não têm mínimo: os dados de treinamento têm valores residenciais negativos.
+FIELD_RANGES = {
+    'no_of_dependents': (0, 10),
+    'income_annum': (0, None),
+    'loan_amount': (0, None),
+    'loan_term': (1, 30),
+    'cibil_score': (300, 900),
+    'residential_assets_value': (None, None),
+    'commercial_assets_value': (None, None),
+    'luxury_assets_value': (None, None),
+    'bank_asset_value': (None, None),
+    'education_encoded': (0, 1),
+    'self_employed_encoded': (0, 1)
+}
+
+# Campos que só aceitam valores inteiros
+INTEGER_FIELDS = ['no_of_dependents', 'loan_term', 'education_encoded', 'self_employed_encoded']
+
+# Valores aceitos nas versões em texto das colunas categóricas
+CATEGORY_VALUES = {
+    'education': ('Graduate', 'Not Graduate'),
+    'self_employed': ('Yes', 'No')
+}
+
+# Tipos passados ao leitor de CSV (colunas ausentes no arquivo são ignoradas).
+# Inteiros ficam em int64: além de validar, são gravados nos resultados bem
+# mais rápido que float64. Valores ausentes ou fracionários nessas colunas
+# fazem o bloco ser relido sem tipos (parse_csv) e as linhas são rejeitadas.
+CSV_DTYPES = {
+    **{col: 'float64' for col in RAW_COLUMNS + ENGINEERED_COLUMNS},
+    **{col: 'int64' for col in INTEGER_FIELDS + ['high_debt', 'low_cibil']},
+    **{col: 'str' for col in CATEGORY_VALUES}
+}
+
+# Colunas do relatório de erros
+ERROR_COLUMNS = ['linha', 'coluna', 'valor', 'erro']
+
+
+class SchemaError(ValueError):
+    """Arquivo incompatível com o esquema (ex.: colunas obrigatórias ausentes)"""
+
+
+def required_columns(columns):
+    """Campos brutos (ou suas versões em texto) ausentes em `columns`"""
+    columns = set(columns)
+    missing = []
+    for col in RAW_COLUMNS:
+        source = CATEGORICAL_ENCODINGS.get(col, (None,))[0]
+        if col not in columns and source not in columns:
+            missing.append(col)
+    return missing
+
+
+def check_columns(columns):
+    """Falha cedo se o arquivo não tiver os campos brutos necessários"""
+    missing = required_columns(columns)
+    if missing:
+        raise SchemaError(f"Colunas obrigatórias ausentes: {', '.join(missing)}")
+    duplicated = pd.Index(columns)[pd.Index(columns).duplicated()].unique().tolist()
+    if duplicated:
+        raise SchemaError(f"Colunas duplicadas: {', '.join(map(str, duplicated))}")
+
+
+def column_order(columns):
+    """Colunas do modelo presentes (na ordem de MODEL_COLUMNS), depois as demais na ordem original"""
+    known = [col for col in MODEL_COLUMNS if col in columns]
+    return known + [col for col in columns if col not in known]
+
+
+def parse_csv(header, text):
+    """
+    Interpreta um bloco de texto CSV (sem cabeçalho) com os tipos do esquema.
+    Se alguma coluna numérica tiver texto, o bloco é relido sem tipos e os
+    valores inválidos ficam para validate(), que rejeita só essas linhas.
+    """
+    try:
+        return pd.read_csv(io.StringIO(header + text), dtype=CSV_DTYPES)
+    except ValueError:
+        return pd.read_csv(io.StringIO(header + text), dtype=str)
+
+
+def _errors(rows, column, values, message):
+    return pd.DataFrame({
+        'linha': rows,
+        'coluna': column,
+        'valor': np.asarray(values, dtype=object).astype(str),
+        'erro': message
+    })
+
+
+def validate(frame, first_row=1):
+    """
+    Valida e padroniza um bloco. Retorna (válidas, erros): as linhas válidas
+    com as colunas reordenadas (campos numéricos lidos como texto convertidos
+    para float64) e o relatório
+    de erros (ERROR_COLUMNS). `first_row` é o número no arquivo da primeira
+    linha do bloco (1 = primeira linha de dados).
+    """
+    check_columns(frame.columns)
+    rows = np.arange(first_row, first_row + len(frame))
+    bad = np.zeros(len(frame), dtype=bool)
+    errors = []
+    numeric = {}
+
+    for col in column_order(frame.columns):
+        if col in CATEGORY_VALUES:
+            # A versão em texto só é usada quando a coluna codificada não veio no arquivo
+            if any(source == col and encoded in frame for encoded, (source, _) in CATEGORICAL_ENCODINGS.items()):
+                continue
+            text = frame[col].to_numpy(dtype=object)
+            invalid = ~np.isin(np.char.strip(text.astype(str)), CATEGORY_VALUES[col]) | pd.isna(text)
+            if invalid.any():
+                bad |= invalid
+                errors.append(_errors(rows[invalid], col, text[invalid],
+                                      f"valor inválido (aceitos: {', '.join(CATEGORY_VALUES[col])})"))
+            continue
+        if col not in FIELD_RANGES:
+            continue
+
+        original = frame[col]
+        if original.dtype.kind in 'fiub':
+            values = original.to_numpy(dtype=np.float64)
+            missing = np.isnan(values)
+        else:
+            # Texto em coluna numérica (bloco relido sem tipos ou arquivo colunar)
+            values = pd.to_numeric(original, errors='coerce').to_numpy(dtype=np.float64)
+            numeric[col] = values
+            missing = original.isna().to_numpy()
+            not_numeric = np.isnan(values) & ~missing
+            if not_numeric.any():
+                bad |= not_numeric
+                errors.append(_errors(rows[not_numeric], col, original.to_numpy()[not_numeric], "valor não numérico"))
+
+        if missing.any():
+            bad |= missing
+            errors.append(_errors(rows[missing], col, values[missing], "valor ausente"))
+
+        low, high = FIELD_RANGES[col]
+        with np.errstate(invalid='ignore'):
+            out_of_range = np.isinf(values)
+            if low is not None:
+                out_of_range |= values < low
+            if high is not None:
+                out_of_range |= values > high
+            if col in INTEGER_FIELDS:
+                out_of_range |= values != np.round(values)
+        out_of_range &= ~np.isnan(values)
+        if out_of_range.any():
+            bad |= out_of_range
+            limits = f"{'-inf' if low is None else low} a {'inf' if high is None else high}"
+            message = f"deve ser inteiro de {limits}" if col in INTEGER_FIELDS else f"fora da faixa {limits}"
+            errors.append(_errors(rows[out_of_range], col, values[out_of_range], message))
+
+    valid = frame[column_order(frame.columns)]
+    if numeric or bad.any():
+        valid = valid.copy()
+        for col, values in numeric.items():
+            valid[col] = values
+        valid = valid[~bad]
+    report = (pd.concat(errors, ignore_index=True).sort_values('linha', kind='stable', ignore_index=True)
+              if errors else pd.DataFrame(columns=ERROR_COLUMNS))
+    return valid, report
@@ -0,0 +1,440 @@
+"""
+Treinamento reprodutível do modelo (substitui o notebook da Etapa 5).
+
+Gera, a partir de X_train.csv e y_train.csv, em OUTPUT_DIR (--output-dir):
+    lgbm_model_optimized.pkl   LGBMClassifier com os melhores hiperparâmetros
+    scaler.pkl                 StandardScaler das 13 features contínuas
+    feature_importance.csv     importância (número de splits) de cada feature
+    model_comparison.csv       baseline, LightGBM inicial e otimizado em X_test/y_test
+    model_bundle/              bundle versionado (scoring/bundle.py) do novo modelo
+
+Os artefatos servidos pelo app e pela API (model_bundle e os arquivos da raiz)
+nunca são sobrescritos: o novo modelo entra em produção pelo registro de
+modelos (python -m scoring.registry add train_output/model_bundle --promote),
+e os CSVs de comparação e importância ficam junto do modelo que descrevem.
+
+Busca de hiperparâmetros:
+    - grade PARAM_GRID avaliada por validação cruzada estratificada (3 folds,
+      AUC), como o GridSearchCV do notebook, mas com lgb.cv;
+    - o número de árvores não faz parte da grade: cada tentativa para quando a
+      AUC de validação não melhora por EARLY_STOPPING_ROUNDS rodadas;
+    - poda por successive halving: todas as tentativas rodam com o menor
+      orçamento de árvores (RUNG_ROUNDS) e só o melhor terço segue para o
+      orçamento seguinte;
+    - as tentativas rodam em paralelo em processos, com as threads do
+      LightGBM (que treinam os folds) divididas entre eles.
+
+Cache e retomada (--cache-dir):
+    - o Dataset do LightGBM é gravado no formato binário na primeira execução;
+      os processos carregam o binário em vez de refazer a discretização das
+      features, a etapa mais cara com muitos dados;
+    - cada tentativa concluída é gravada em trials.jsonl e uma execução
+      interrompida continua de onde parou. A chave inclui a impressão digital
+      dos dados e da validação cruzada: dados novos invalidam os resultados.
+
+X_train.csv já traz as 17 features calculadas no notebook e é usado como está
+(assim REFERENCE_PARAMS reproduz exatamente o modelo atual); arquivos só com
+os campos brutos passam por build_features.
+
+Uso:
+    python -m scoring.train                                   # busca completa, grava em train_output/
+    python -m scoring.train --output-dir novo --bundle novo/bundle_v2
+    python -m scoring.train --no-search                       # só REFERENCE_PARAMS
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import pickle
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from scoring.features import MODEL_COLUMNS, SCALED_COLUMNS, build_features
+
+SEED = 42
+N_FOLDS = 3
+EARLY_STOPPING_ROUNDS = 50
+
+# Orçamento de árvores de cada rodada do successive halving; a cada rodada
+# segue 1/HALVING_FACTOR das tentativas
+RUNG_ROUNDS = (250, 750, 2000)
+HALVING_FACTOR = 3
+
+CACHE_DIR = '.train_cache'
+TRIALS_FILE = 'trials.jsonl'
+
+# Diretório padrão dos artefatos, separado dos que o app e a API servem
+OUTPUT_DIR = 'train_output'
+BUNDLE_NAME = 'model_bundle'
+
+PARAM_GRID = {
+    'learning_rate': [0.01, 0.05, 0.1],
+    'max_depth': [3, 5, 7],
+    'num_leaves': [15, 31, 63],
+    'min_child_samples': [20, 50, 100]
+}
+
+# Parâmetros comuns a todas as tentativas (scale_pos_weight vem da proporção das classes)
+FIXED_PARAMS = {
+    'objective': 'binary',
+    'subsample': 0.8,
+    'colsample_bytree': 1.0,
+    'random_state': SEED,
+    'verbose': -1
+}
+
+# Resultado do GridSearchCV do notebook (modelo atual, 300 árvores)
+REFERENCE_PARAMS = {'learning_rate': 0.01, 'max_depth': 5, 'num_leaves': 31, 'min_child_samples': 50}
+REFERENCE_ESTIMATORS = 300
+
+# Parâmetros da discretização gravada no binário (feature_pre_filter=False
+# permite variar min_child_samples sobre o mesmo Dataset)
+DATASET_PARAMS = {'max_bin': 255, 'feature_pre_filter': False, 'verbose': -1}
+
+
+def training_matrix(data):
+    """As 17 features na ordem do modelo: as do arquivo, se existirem, ou derivadas dos campos brutos"""
+    if all(col in data for col in MODEL_COLUMNS):
+        return data[MODEL_COLUMNS].astype(np.float64)
+    return pd.DataFrame(build_features(data), columns=MODEL_COLUMNS)
+
+
+def _load(source):
+    """Arquivo (qualquer formato de scoring/formats.py) ou nome de um dataset do projeto (ex.: 'X_train')"""
+    from scoring.formats import load_dataset, read_table
+    return read_table(source) if os.path.exists(source) else load_dataset(source)
+
+
+def _dataset_exists(source):
+    from scoring.formats import find_dataset
+    try:
+        return os.path.exists(source) or bool(find_dataset(source))
+    except FileNotFoundError:
+        return False
+
+
+def load_training_data(data='X_train', labels='y_train'):
+    return training_matrix(_load(data)), _load(labels).iloc[:, 0].to_numpy()
+
+
+def scale_pos_weight(y):
+    """Rejeitados / aprovados, como no notebook"""
+    positives = np.count_nonzero(y == 1)
+    return (len(y) - positives) / positives
+
+
+def fingerprint(X, y, **settings):
+    """Impressão digital dos dados e das configurações que mudam os resultados da validação cruzada"""
+    digest = hashlib.sha256()
+    digest.update(np.ascontiguousarray(X, dtype=np.float64).tobytes())
+    digest.update(np.ascontiguousarray(y, dtype=np.float64).tobytes())
+    digest.update(json.dumps(settings, sort_keys=True).encode())
+    return digest.hexdigest()[:16]
+
+
+def dataset_cache(X, y, cache_dir=CACHE_DIR):
+    """Caminho do Dataset binário do LightGBM para estes dados (gerado se ainda não existir)"""
+    import lightgbm as lgb
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f'train-{fingerprint(X, y, **DATASET_PARAMS)}.bin')
+    if not os.path.exists(path):
+        dataset = lgb.Dataset(np.asarray(X, dtype=np.float64), label=y, feature_name=MODEL_COLUMNS,
+                              params=DATASET_PARAMS, free_raw_data=True)
+        # save_binary não sobrescreve um arquivo existente: o temporário não pode ser criado antes
+        staging = os.path.join(cache_dir, f'.{os.path.basename(path)}.{os.getpid()}')
+        try:
+            dataset.save_binary(staging)
+            os.replace(staging, path)
+        finally:
+            if os.path.exists(staging):
+                os.remove(staging)
+    return path
+
+
+def param_grid(grid=PARAM_GRID, trials=None, seed=SEED):
+    """Combinações da grade, em ordem fixa; com `trials` uma amostra reprodutível delas"""
+    names = sorted(grid)
+    combinations = [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+    if trials is not None and trials < len(combinations):
+        index = np.sort(np.random.default_rng(seed).choice(len(combinations), trials, replace=False))
+        combinations = [combinations[i] for i in index]
+    return combinations
+
+
+class TrialLog:
+    """Tentativas concluídas (trials.jsonl), para retomar uma busca interrompida"""
+
+    def __init__(self, path, data_fingerprint):
+        self.path = path
+        self.fingerprint = data_fingerprint
+        self.results = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        result = json.loads(line)
+                    except ValueError:
+                        continue  # última linha incompleta de uma execução interrompida
+                    if result.get('fingerprint') == data_fingerprint:
+                        self.results[self.key(result['params'], result['rounds'])] = result
+
+    @staticmethod
+    def key(params, rounds):
+        return json.dumps(params, sort_keys=True), rounds
+
+    def get(self, params, rounds):
+        return self.results.get(self.key(params, rounds))
+
+    def add(self, result):
+        result = {**result, 'fingerprint': self.fingerprint}
+        self.results[self.key(result['params'], result['rounds'])] = result
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(result) + '\n')
+
+
+_worker = {}
+
+
+def _init_worker(dataset_path, fixed_params, threads):
+    import lightgbm as lgb
+    _worker['dataset'] = lgb.Dataset(dataset_path, params=DATASET_PARAMS)
+    _worker['params'] = {**fixed_params, 'metric': 'auc', 'num_threads': threads}
+
+
+def _run_trial(params, rounds):
+    """Validação cruzada de uma combinação com até `rounds` árvores e parada antecipada"""
+    import lightgbm as lgb
+    start = time.perf_counter()
+    history = lgb.cv(
+        {**_worker['params'], **params}, _worker['dataset'], num_boost_round=rounds, nfold=N_FOLDS,
+        stratified=True, shuffle=True, seed=SEED,
+        callbacks=[lgb.early_stopping(EARLY_STOPPING_ROUNDS, verbose=False)]
+    )
+    scores = history['valid auc-mean']
+    best = int(np.argmax(scores))
+    return {
+        'params': params,
+        'rounds': rounds,
+        'auc': float(scores[best]),
+        'auc_std': float(history['valid auc-stdv'][best]),
+        'best_iteration': best + 1,
+        'seconds': time.perf_counter() - start
+    }
+
+
+def _stopped_early(result):
+    """
+    A tentativa parou pela parada antecipada antes do orçamento: com mais
+    árvores o lgb.cv refaria exatamente as mesmas iterações e o mesmo resultado
+    """
+    return result['best_iteration'] + EARLY_STOPPING_ROUNDS <= result['rounds']
+
+
+def search(X, y, grid=PARAM_GRID, trials=None, workers=None, cache_dir=CACHE_DIR, fresh=False, log=print):
+    """
+    Busca de hiperparâmetros com successive halving. Retorna a melhor
+    tentativa (dict com params, auc, auc_std e best_iteration) e um DataFrame
+    com todas elas (uma linha por combinação e orçamento), da última rodada
+    para a primeira e da melhor para a pior AUC. Tentativas que pararam antes
+    do orçamento da rodada anterior não são treinadas de novo: o resultado é
+    reaproveitado (coluna reaproveitada_de).
+    """
+    fixed = {**FIXED_PARAMS, 'scale_pos_weight': scale_pos_weight(y)}
+    candidates = param_grid(grid, trials)
+    data_fingerprint = fingerprint(X, y, fixed=fixed, folds=N_FOLDS, seed=SEED,
+                                   early_stopping=EARLY_STOPPING_ROUNDS, dataset=DATASET_PARAMS)
+    trials_path = os.path.join(cache_dir, TRIALS_FILE)
+    os.makedirs(cache_dir, exist_ok=True)
+    if fresh and os.path.exists(trials_path):
+        os.remove(trials_path)
+    trial_log = TrialLog(trials_path, data_fingerprint)
+    dataset_path = dataset_cache(X, y, cache_dir)
+
+    cpus = os.cpu_count() or 1
+    workers = max(1, min(workers or cpus, len(candidates)))
+    threads = max(1, cpus // workers)
+    pool = None
+    if workers > 1:
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                   initargs=(dataset_path, fixed, threads))
+    else:
+        _init_worker(dataset_path, fixed, threads)
+
+    results = []
+    best = None
+    try:
+        for rung, rounds in enumerate(RUNG_ROUNDS):
+            pending = []
+            carried = 0
+            for params in candidates:
+                if trial_log.get(params, rounds) is not None:
+                    continue
+                previous = trial_log.get(params, RUNG_ROUNDS[rung - 1]) if rung else None
+                if previous is not None and _stopped_early(previous):
+                    trial_log.add({**previous, 'rounds': rounds, 'seconds': 0.0,
+                                   'reaproveitada_de': previous.get('reaproveitada_de', previous['rounds'])})
+                    carried += 1
+                else:
+                    pending.append(params)
+            log(f"Rodada {rung + 1}/{len(RUNG_ROUNDS)}: {len(candidates)} tentativas com até {rounds} árvores "
+                f"({len(candidates) - len(pending) - carried} já concluídas, {carried} reaproveitadas "
+                f"da rodada anterior)")
+            if pool is not None:
+                futures = [pool.submit(_run_trial, params, rounds) for params in pending]
+                for future in as_completed(futures):
+                    trial_log.add(future.result())
+            else:
+                for params in pending:
+                    trial_log.add(_run_trial(params, rounds))
+
+            rung_results = sorted((trial_log.get(params, rounds) for params in candidates),
+                                  key=lambda result: -result['auc'])
+            results.extend({**result['params'], **{k: v for k, v in result.items() if k not in ('params', 'fingerprint')},
+                            'rodada': rung + 1} for result in rung_results)
+            best = rung_results[0]
+            # Poda: só o melhor terço segue (ao menos uma tentativa)
+            keep = max(1, len(candidates) // HALVING_FACTOR)
+            candidates = [result['params'] for result in rung_results[:keep]]
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        _worker.clear()
+
+    table = pd.DataFrame(results)
+    return best, table.sort_values(['rodada', 'auc'], ascending=[False, False], kind='stable', ignore_index=True)
+
+
+def fit_model(X, y, params=REFERENCE_PARAMS, n_estimators=REFERENCE_ESTIMATORS):
+    """LGBMClassifier final, treinado em todos os dados de treinamento"""
+    import lightgbm as lgb
+    model = lgb.LGBMClassifier(**FIXED_PARAMS, **params, n_estimators=n_estimators,
+                               scale_pos_weight=scale_pos_weight(y))
+    return model.fit(X, y)
+
+
+def fit_scaler(X):
+    """StandardScaler das 13 features contínuas (as binárias não são normalizadas)"""
+    from sklearn.preprocessing import StandardScaler
+    return StandardScaler().fit(X[SCALED_COLUMNS])
+
+
+def baseline_models(X, y):
+    """Modelos de comparação do notebook: regressão logística e LightGBM com os parâmetros padrão"""
+    import lightgbm as lgb
+    from sklearn.linear_model import LogisticRegression
+    return {
+        'Regressão Logística (Baseline)': LogisticRegression(max_iter=1000, random_state=SEED).fit(X, y),
+        'LightGBM Inicial': lgb.LGBMClassifier(random_state=SEED, verbose=-1,
+                                               scale_pos_weight=scale_pos_weight(y)).fit(X, y)
+    }
+
+
+def feature_importance(model):
+    """Número de splits por feature, da mais para a menos usada"""
+    importance = pd.DataFrame({'Feature': model.feature_name_, 'Importance': model.booster_.feature_importance()})
+    return importance.sort_values('Importance', ascending=False, kind='stable', ignore_index=True)
+
+
+def _write_atomic(path, write):
+    """Grava em um arquivo temporário no mesmo diretório e troca no final"""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, staging = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '-', dir=directory)
+    os.close(fd)
+    try:
+        write(staging)
+        os.replace(staging, path)
+    except BaseException:
+        os.remove(staging)
+        raise
+
+
+def _dump_pickle(obj):
+    def write(path):
+        with open(path, 'wb') as f:
+            pickle.dump(obj, f)
+    return write
+
+
+def train(output_dir=OUTPUT_DIR, data='X_train', labels='y_train', test_data='X_test', test_labels='y_test',
+          run_search=True, trials=None, workers=None, cache_dir=CACHE_DIR, fresh=False, bundle=None, log=print):
+    """
+    Treina e grava os artefatos e o bundle (padrão: `output_dir`/model_bundle)
+    em `output_dir`. Retorna (modelo, scaler, tabela de tentativas ou None).
+    """
+    from scoring.evaluation import COMPARISON_PATH, Evaluation, comparison_row, update_comparison
+
+    start = time.perf_counter()
+    X, y = load_training_data(data, labels)
+    log(f"Treinamento: {len(X)} linhas, {np.count_nonzero(y == 1)} aprovados")
+
+    table = None
+    params, n_estimators = REFERENCE_PARAMS, REFERENCE_ESTIMATORS
+    if run_search:
+        best, table = search(X, y, trials=trials, workers=workers, cache_dir=cache_dir, fresh=fresh, log=log)
+        params, n_estimators = best['params'], best['best_iteration']
+        log(f"Melhor combinação: {params}, {n_estimators} árvores (AUC CV {best['auc']:.4f} ± {best['auc_std']:.4f})")
+
+    model = fit_model(X, y, params, n_estimators)
+    scaler = fit_scaler(X)
+    _write_atomic(os.path.join(output_dir, 'lgbm_model_optimized.pkl'), _dump_pickle(model))
+    _write_atomic(os.path.join(output_dir, 'scaler.pkl'), _dump_pickle(scaler))
+    _write_atomic(os.path.join(output_dir, 'feature_importance.csv'),
+                  lambda path: feature_importance(model).to_csv(path, index=False))
+
+    if not (_dataset_exists(test_data) and _dataset_exists(test_labels)):
+        log(f"{test_data}/{test_labels} não encontrados: model_comparison.csv não foi atualizado")
+    else:
+        X_test, y_test = load_training_data(test_data, test_labels)
+        models = {**baseline_models(X, y), 'LightGBM Otimizado': model}
+        rows = [comparison_row(name, Evaluation(y_test, m.predict_proba(X_test)[:, 1])) for name, m in models.items()]
+        update_comparison(rows, os.path.join(output_dir, COMPARISON_PATH))
+        log(pd.DataFrame(rows).to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+
+    from scoring.bundle import build_bundle
+    bundle = bundle or os.path.join(output_dir, BUNDLE_NAME)
+    metadata = {'source': 'scoring.train', 'n_estimators': n_estimators, 'cv_folds': N_FOLDS}
+    manifest = build_bundle(model, scaler, bundle, metadata)
+    log(f"Bundle gerado em {bundle} (versão {manifest['model_version']}); para servi-lo: "
+        f"python -m scoring.registry add {bundle} --promote")
+
+    log(f"Artefatos gravados em {os.path.abspath(output_dir)} em {time.perf_counter() - start:.1f}s")
+    return model, scaler, table
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Treinamento reprodutível do modelo de crédito")
+    parser.add_argument('--data', default='X_train', help="dataset de treinamento (features)")
+    parser.add_argument('--labels', default='y_train', help="classes do treinamento (1 = Aprovado)")
+    parser.add_argument('--test-data', default='X_test', help="dataset de teste para o model_comparison.csv")
+    parser.add_argument('--test-labels', default='y_test')
+    parser.add_argument('--output-dir', default=OUTPUT_DIR,
+                        help="diretório dos artefatos (separado dos servidos pelo app e pela API)")
+    parser.add_argument('--no-search', action='store_true',
+                        help="treina só com REFERENCE_PARAMS (reproduz o modelo atual)")
+    parser.add_argument('--trials', type=int, default=None, help="amostra de combinações da grade (padrão: todas)")
+    parser.add_argument('--workers', type=int, default=0, help="processos da busca (0 = um por núcleo)")
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help="Dataset binário e tentativas concluídas")
+    parser.add_argument('--fresh', action='store_true', help="ignora as tentativas já concluídas")
+    parser.add_argument('--bundle', default=None,
+                        help=f"caminho do bundle (scoring/bundle.py); padrão: <output-dir>/{BUNDLE_NAME}")
+    parser.add_argument('--trials-output', default=None, help="grava a tabela de tentativas neste arquivo CSV")
+    args = parser.parse_args(argv)
+
+    _, _, table = train(
+        args.output_dir, args.data, args.labels, args.test_data, args.test_labels, not args.no_search,
+        args.trials, args.workers or None, args.cache_dir, args.fresh, args.bundle
+    )
+    if table is not None and args.trials_output:
+        table.to_csv(args.trials_output, index=False)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
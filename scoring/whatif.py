@@ -0,0 +1,136 @@
+"""
+Simulação de cenários (what-if) para um cliente.
+
+Gera uma grade de clientes perturbados variando um ou mais campos brutos (por
+padrão valor × prazo do empréstimo), recalcula apenas as features engineered
+que dependem dos campos alterados (DEPENDENT_COLUMNS em scoring/features.py) e
+pontua a grade inteira em uma única chamada do modelo. O resultado é a
+superfície de probabilidade de aprovação e a menor mudança que inverte a
+decisão atual.
+
+A grade padrão tem ~400 pontos e é pontuada em poucos milissegundos, dentro
+do orçamento interativo (LATENCY_BUDGET_MS, verificado pelo benchmark).
+"""
+import numpy as np
+import pandas as pd
+
+from scoring.features import ENGINEERED_COLUMNS, COLUMN_INDEX, RAW_COLUMNS, build_features, rederive_features
+from scoring.metrics import timed
+from scoring.model import DECISION_THRESHOLD, preprocess_input, score
+
+DEFAULT_AXES = ('loan_amount', 'loan_term')
+
+# Valor do empréstimo: fatores sobre o valor atual
+LOAN_AMOUNT_FACTORS = np.linspace(0.1, 2.0, 39)
+# Prazos presentes nos dados de treinamento (anos)
+LOAN_TERMS = np.arange(2, 21, 2, dtype=np.float64)
+
+# Latência máxima de uma simulação na aba individual (ms)
+LATENCY_BUDGET_MS = 100.0
+
+
+def default_values(feature, current):
+    """Valores padrão de um eixo da grade para o valor atual do cliente"""
+    if feature == 'loan_term':
+        return LOAN_TERMS
+    if current > 0:
+        return current * LOAN_AMOUNT_FACTORS
+    raise ValueError(f"Informe os valores do eixo {feature} (valor atual {current})")
+
+
+class SensitivityGrid:
+    """
+    Superfície de probabilidade de aprovação sobre a grade de valores.
+
+    `values[i]` são os valores do eixo `features[i]` (ordenados, incluindo o
+    valor atual do cliente); `probabilities` e `approved` têm uma dimensão por
+    eixo, na mesma ordem.
+    """
+
+    def __init__(self, features, values, base, probabilities, threshold):
+        self.features = tuple(features)
+        self.values = values
+        self.base = base
+        self.probabilities = probabilities
+        self.threshold = threshold
+        self.approved = probabilities > threshold
+        self.base_index = tuple(int(np.searchsorted(v, base[f])) for f, v in zip(self.features, values))
+        self.base_probability = float(probabilities[self.base_index])
+        self.base_approved = bool(self.approved[self.base_index])
+
+    def to_frame(self):
+        """Um ponto da grade por linha: valores dos eixos, probabilidade e decisão"""
+        mesh = np.meshgrid(*self.values, indexing='ij')
+        frame = pd.DataFrame({f: m.ravel() for f, m in zip(self.features, mesh)})
+        frame['probability'] = self.probabilities.ravel()
+        frame['approved'] = self.approved.ravel()
+        return frame
+
+    def _flip(self, candidates):
+        """Ponto de menor mudança relativa (soma por eixo) entre os candidatos"""
+        if not candidates.any():
+            return None
+        mesh = np.meshgrid(*self.values, indexing='ij')
+        cost = np.zeros(self.probabilities.shape)
+        for feature, values, m in zip(self.features, self.values, mesh):
+            current = self.base[feature]
+            scale = abs(current) if current else (values[-1] - values[0]) or 1.0
+            cost += np.abs(m - current) / scale
+        cost[~candidates] = np.inf
+        index = np.unravel_index(np.argmin(cost), cost.shape)
+        return {
+            'values': {f: float(v[i]) for f, v, i in zip(self.features, self.values, index)},
+            'change': {f: float(v[i] - self.base[f]) for f, v, i in zip(self.features, self.values, index)},
+            'relative_change': float(cost[index]),
+            'probability': float(self.probabilities[index])
+        }
+
+    def minimal_flip(self):
+        """
+        Menor mudança (relativa ao valor atual, somada nos eixos) que inverte a
+        decisão, ou None se nenhum ponto da grade a inverte.
+        """
+        return self._flip(self.approved != self.base_approved)
+
+    def flip_along(self, feature):
+        """Menor mudança só no eixo `feature`, com os demais nos valores atuais"""
+        axis = self.features.index(feature)
+        candidates = np.zeros(self.approved.shape, dtype=bool)
+        index = list(self.base_index)
+        index[axis] = slice(None)
+        candidates[tuple(index)] = self.approved[tuple(index)] != self.base_approved
+        return self._flip(candidates)
+
+
+def sensitivity_grid(model, scaler, applicant, axes=DEFAULT_AXES, threshold=DECISION_THRESHOLD):
+    """
+    Pontua a grade de cenários de um cliente.
+
+    `axes` é uma sequência de campos brutos (valores padrão de default_values)
+    ou um dict {campo: valores}. O valor atual do cliente sempre entra na grade.
+    """
+    if not isinstance(axes, dict):
+        axes = {feature: None for feature in axes}
+    base_row = build_features(applicant)
+    if base_row.shape[0] != 1:
+        raise ValueError("A simulação é feita para um único cliente")
+
+    features, values, base = [], [], {}
+    for feature, axis_values in axes.items():
+        if feature not in RAW_COLUMNS or feature in ENGINEERED_COLUMNS:
+            raise ValueError(f"Só campos brutos podem variar na simulação: {feature}")
+        current = float(base_row[0, COLUMN_INDEX[feature]])
+        if axis_values is None:
+            axis_values = default_values(feature, current)
+        features.append(feature)
+        values.append(np.union1d(np.asarray(axis_values, dtype=np.float64), [current]))
+        base[feature] = current
+
+    shape = tuple(len(v) for v in values)
+    with timed('whatif', int(np.prod(shape))):
+        grid = np.repeat(base_row, int(np.prod(shape)), axis=0)
+        for feature, m in zip(features, np.meshgrid(*values, indexing='ij')):
+            grid[:, COLUMN_INDEX[feature]] = m.ravel()
+        rederive_features(grid, features)
+        _, probabilities = score(model, preprocess_input(grid, scaler, out=grid), threshold)
+    return SensitivityGrid(features, values, base, probabilities[:, 1].reshape(shape), threshold)
@@ -1,16 +1,19 @@
 import pandas as pd
 import numpy as np
-import pickle
 import sys
 
+from scoring import load_model, load_scaler
+from scoring.formats import find_dataset, load_dataset
+from scoring.model import MODEL_PATH, SCALER_PATH
+
 def test_model_loading():
     print("TESTE 1: Carregamento do Modelo")
     
     try:
-        with open('lgbm_model_optimized.pkl', 'rb') as f:
-            model = pickle.load(f)
+        model = load_model()
         print("Modelo carregado com sucesso!")
-        print(f"   Tipo: {type(model).__name__}")
+        print(f"   Arquivo: {MODEL_PATH}")
+        print(f"   Tipo: {type(model).__name__} (versão {model.model_version})")
         return model
     except Exception as e:
         print(f"Erro ao carregar modelo: {e}")
@@ -20,9 +23,9 @@ def test_scaler_loading():
     print("TESTE 2: Carregamento do Scaler")
     
     try:
-        with open('scaler.pkl', 'rb') as f:
-            scaler = pickle.load(f)
+        scaler = load_scaler()
         print("Scaler carregado com sucesso!")
+        print(f"   Arquivo: {SCALER_PATH}")
         print(f"   Tipo: {type(scaler).__name__}")
         return scaler
     except Exception as e:
@@ -33,10 +36,11 @@ def test_data_loading():
     print("TESTE 3: Carregamento dos Dados de Teste")
     
     try:
-        X_test = pd.read_csv('X_test.csv')
-        y_test = pd.read_csv('y_test.csv').squeeze()
+        X_test = load_dataset('X_test')
+        y_test = load_dataset('y_test').squeeze()
         
         print("Dados carregados com sucesso!")
+        print(f"   Arquivos: {find_dataset('X_test')}, {find_dataset('y_test')}")
         print(f"   X_test shape: {X_test.shape}")
         print(f"   y_test shape: {y_test.shape}")
         print(f"\n   Colunas de X_test:")
@@ -54,33 +58,27 @@ def test_prediction(model, X_test, y_test):
     print("=" * 60)
     
     try:
-        # Fazer predição em uma amostra
-        sample = X_test.head(5)
-        predictions = model.predict(sample)
-        probabilities = model.predict_proba(sample)
+        from scoring import build_features, score
+        from scoring.evaluation import Evaluation
+        
+        # Uma única passada pelo modelo: classes e probabilidades (classe 1 = Aprovado)
+        predictions, probabilities = score(model, build_features(X_test))
         
         print("Predições realizadas com sucesso!")
         print(f"\n   Amostra de 5 predições:")
         for i in range(5):
-            status = "Aprovado" if predictions[i] == 0 else "Rejeitado"
-            prob_aprovado = probabilities[i][0] * 100
-            prob_rejeitado = probabilities[i][1] * 100
+            status = "Aprovado" if predictions[i] == 1 else "Rejeitado"
+            prob_aprovado = probabilities[i][1] * 100
+            prob_rejeitado = probabilities[i][0] * 100
             print(f"      {i+1}. {status} (Aprovado: {prob_aprovado:.2f}%, Rejeitado: {prob_rejeitado:.2f}%)")
         
-        # Calcular métricas no conjunto de teste completo
-        from sklearn.metrics import roc_auc_score, recall_score, f1_score
-        
-        y_pred = model.predict(X_test)
-        y_proba = model.predict_proba(X_test)[:, 1]
-        
-        auc = roc_auc_score(y_test, y_proba)
-        recall = recall_score(y_test, y_pred)
-        f1 = f1_score(y_test, y_pred)
+        # Métricas no conjunto de teste completo (scoring/evaluation.py)
+        metrics = Evaluation(y_test, probabilities[:, 1]).metrics()
         
         print(f"\n   Métricas no conjunto de teste:")
-        print(f"      AUC Score: {auc:.4f}")
-        print(f"      Recall (Rejeitado): {recall:.4f}")
-        print(f"      F1-Score: {f1:.4f}")
+        print(f"      AUC Score: {metrics['auc']:.4f}")
+        print(f"      Recall (Aprovado): {metrics['recall']:.4f}")
+        print(f"      F1-Score: {metrics['f1']:.4f}")
         
         return True
     except Exception as e:
@@ -137,6 +135,725 @@ def test_csv_example():
         print(f"Erro ao carregar exemplo: {e}")
         return False
 
+def test_compiled_engine():
+    """Compara bit a bit o motor compilado com o predict_proba do LightGBM"""
+    print("TESTE 7: Motor de Inferência Compilado")
+    
+    try:
+        model = load_model(backend='lightgbm')
+        compiled = load_model(backend='compiled')
+        X_test = load_dataset('X_test')
+        
+        expected = model.predict_proba(X_test)
+        obtained = compiled.predict_proba(X_test)
+        identical = np.array_equal(expected, obtained)
+        identical = identical and np.array_equal(model.predict(X_test), compiled.predict(X_test))
+        # Um cliente por vez e blocos pequenos (caminho da API e dos micro-lotes)
+        X = X_test.to_numpy(dtype=np.float64)
+        identical = identical and all(np.array_equal(compiled.predict_proba(X[i]), expected[i:i + 1])
+                                      for i in range(20))
+        identical = identical and np.array_equal(compiled.predict_raw(X, block_size=7),
+                                                 model.booster_.predict(X, raw_score=True))
+        # Ausentes e valores extremos seguem as mesmas regras do LightGBM
+        extremes = X[:40].copy()
+        extremes[::4, 4] = np.nan
+        extremes[1::4, 0] = np.inf
+        extremes[2::4, 9] = -np.inf
+        extremes[3::4, 10] = 0.0
+        identical = identical and np.array_equal(compiled.predict_proba(extremes), model.predict_proba(extremes))
+        
+        print(f"   Árvores compiladas: {compiled.n_trees} (profundidade máxima {compiled.max_depth})")
+        print(f"   Diferença máxima: {np.abs(expected - obtained).max():.3e}")
+        if identical:
+            print("Probabilidades idênticas às do LightGBM (bit a bit) e mesmas decisões!")
+        else:
+            print("Probabilidades divergem do LightGBM!")
+        
+        return identical
+    except Exception as e:
+        print(f"Erro no motor compilado: {e}")
+        return False
+
+def test_prediction_cache():
+    """Verifica acertos, expiração e invalidação do cache de predições"""
+    print("TESTE 8: Cache de Predições")
+    
+    try:
+        from scoring import predict_batch
+        from scoring.cache import PredictionCache
+        
+        model = load_model()
+        scaler = load_scaler()
+        X = load_dataset('X_test').to_numpy(dtype=np.float64)[:200]
+        now = [0.0]
+        cache = PredictionCache(maxsize=150, ttl=60, clock=lambda: now[0])
+        
+        _, expected = predict_batch(model, scaler, X)
+        _, first = predict_batch(model, scaler, X[:100], cache=cache)
+        _, second = predict_batch(model, scaler, X[:100], cache=cache)
+        ok = np.array_equal(first, expected[:100]) and np.array_equal(second, expected[:100])
+        ok = ok and cache.hits == 100 and cache.misses == 100
+        
+        predict_batch(model, scaler, X[100:], cache=cache)
+        ok = ok and len(cache) == 150 and cache.evictions == 50
+        
+        now[0] = 61.0
+        predict_batch(model, scaler, X[150:], cache=cache)
+        ok = ok and cache.expirations == 50
+        
+        model.model_version = 'outra-versao'
+        predict_batch(model, scaler, X[150:], cache=cache)
+        ok = ok and cache.invalidations == 1 and cache.misses == 300
+        
+        print(f"   Estatísticas: {cache.stats()}")
+        print("Cache consistente!" if ok else "Cache inconsistente!")
+        return ok
+    except Exception as e:
+        print(f"Erro no cache de predições: {e}")
+        return False
+
+def test_scaling():
+    """Compara a normalização vetorizada com o StandardScaler do sklearn"""
+    print("TESTE 9: Normalização das Features")
+    
+    try:
+        import pickle
+        from scoring import SCALED_COLUMNS, build_features, preprocess_input, scale_features
+        from scoring.bundle import ScalerParams
+        
+        with open('scaler.pkl', 'rb') as f:
+            sk_scaler = pickle.load(f)
+        scaler = ScalerParams.from_scaler(sk_scaler, apply=True)
+        X = build_features(load_dataset('X_test'))
+        
+        expected = sk_scaler.transform(pd.DataFrame(X[:, :13], columns=SCALED_COLUMNS))
+        scaled = preprocess_input(X, scaler)
+        ok = np.array_equal(scaled[:, :13], expected) and np.array_equal(scaled[:, 13:], X[:, 13:])
+        
+        # Normalização fundida na derivação, em um array float32 pré-alocado
+        out = np.empty(X.shape, dtype=np.float32)
+        fused = build_features(load_dataset('X_test'), out=out, scaler=scaler)
+        ok = ok and fused is out and np.allclose(fused, scaled, rtol=1e-6, atol=1e-6)
+        
+        # Modelo treinado sem normalização: entrada passa sem cópia
+        ok = ok and preprocess_input(X, load_scaler()) is X
+        print(f"   Normalização {'aplicada' if load_scaler().apply else 'desativada'} para o modelo atual")
+        print("Normalização idêntica ao StandardScaler!" if ok else "Normalização diverge do StandardScaler!")
+        return ok
+    except Exception as e:
+        print(f"Erro na normalização: {e}")
+        return False
+
+def test_micro_batching():
+    """Pedidos simultâneos agrupados em lotes devem ter o mesmo resultado individual"""
+    print("TESTE 10: Micro-batching Assíncrono")
+    
+    try:
+        import asyncio
+        from scoring import predict_batch
+        from scoring.microbatch import MicroBatcher
+        
+        model = load_model()
+        scaler = load_scaler()
+        X = load_dataset('X_test').to_numpy(dtype=np.float64)[:100]
+        _, expected = predict_batch(model, scaler, X)
+        batch_sizes = []
+        
+        def score_rows(rows):
+            batch_sizes.append(len(rows))
+            return list(predict_batch(model, scaler, np.array(rows))[1])
+        
+        async def run():
+            batcher = MicroBatcher(score_rows, max_batch_size=32, max_wait_ms=20)
+            results = await asyncio.gather(*(batcher.submit(row) for row in X))
+            await batcher.close()
+            return np.array(results)
+        
+        # Uma resposta inválida (não é lista) encerra o laço: o erro chega ao pedido e o laço é recriado
+        calls = []
+        
+        def broken_once(rows):
+            calls.append(len(rows))
+            return None if len(calls) == 1 else list(predict_batch(model, scaler, np.array(rows))[1])
+        
+        async def run_broken():
+            batcher = MicroBatcher(broken_once, max_batch_size=1, max_wait_ms=0)
+            try:
+                await asyncio.wait_for(batcher.submit(X[0]), 5)
+                failed = False
+            except TypeError:
+                failed = True
+            result = await asyncio.wait_for(batcher.submit(X[1]), 5)
+            await batcher.close()
+            return failed, result
+        
+        import logging
+        logging.getLogger('scoring.microbatch').disabled = True
+        try:
+            failed, recovered = asyncio.run(run_broken())
+        finally:
+            logging.getLogger('scoring.microbatch').disabled = False
+        
+        obtained = asyncio.run(run())
+        ok = np.array_equal(obtained, expected) and max(batch_sizes) == 32 and sum(batch_sizes) == len(X)
+        ok = ok and failed and np.array_equal(recovered, expected[1])
+        print(f"   {len(X)} pedidos em {len(batch_sizes)} lotes (maior: {max(batch_sizes)})")
+        print("Resultados dos lotes idênticos!" if ok else "Resultados dos lotes divergem!")
+        return ok
+    except Exception as e:
+        print(f"Erro no micro-batching: {e}")
+        return False
+
+def test_risk_rules():
+    """Compara o motor de regras com as regras originais da aba Análise de Risco"""
+    print("TESTE 11: Fatores de Risco")
+    
+    try:
+        from scoring import MODEL_COLUMNS, build_features
+        from scoring.risk import RULES
+        
+        X = build_features(load_dataset('X_test'))
+        flags = RULES.evaluate(X)
+        
+        def original_rules(row):
+            f = dict(zip(MODEL_COLUMNS, row))
+            codes = []
+            if f['credit_income_ratio'] > 4:
+                codes.append('credit_income_high')
+            elif f['credit_income_ratio'] > 3:
+                codes.append('credit_income_moderate')
+            if f['cibil_score'] < 650:
+                codes.append('cibil_low')
+            elif f['cibil_score'] < 700:
+                codes.append('cibil_moderate')
+            if f['loan_assets_ratio'] > 0.8:
+                codes.append('loan_assets_high')
+            if f['total_assets'] < f['loan_amount'] * 0.5:
+                codes.append('assets_low')
+            return codes
+        
+        ok = all(RULES.codes_for(v) == original_rules(row) for row, v in zip(X, flags))
+        print(f"   Linhas por fator: {dict(zip(RULES.codes, RULES.counts(flags).tolist()))}")
+        print("Regras vetorizadas idênticas às originais!" if ok else "Regras vetorizadas divergem!")
+        return ok
+    except Exception as e:
+        print(f"Erro nos fatores de risco: {e}")
+        return False
+
+def test_explanations():
+    """Contribuições TreeSHAP devem somar o score bruto e os motivos seguir a decisão"""
+    print("TESTE 12: Explicações (TreeSHAP)")
+    
+    try:
+        from scoring import build_features, score
+        from scoring.explain import contributions, reason_columns, top_reasons
+        
+        X = build_features(load_dataset('X_test'))
+        for backend in ('lightgbm', 'compiled'):
+            model = load_model(backend=backend)
+            predictions, probabilities = score(model, X)
+            contrib = contributions(model, X)
+            raw = np.log(probabilities[:, 1] / probabilities[:, 0])
+            ok = np.allclose(contrib.sum(axis=1), raw, atol=1e-9)
+            
+            index, impact = top_reasons(contrib, predictions == 1, k=5)
+            approved = predictions == 1
+            # Posições vazias (NaN) ficam no fim; nenhum motivo contraria a decisão
+            filled = np.nan_to_num(impact, nan=0.0)
+            ok = ok and (filled[approved, 0] >= filled[approved, 1]).all()
+            ok = ok and (filled[~approved, 0] <= filled[~approved, 1]).all()
+            ok = ok and (filled[approved] >= 0).all() and (filled[~approved] <= 0).all()
+            ok = ok and np.array_equal(index < 0, np.isnan(impact))
+            # Mais motivos que features: limitado às 17 colunas do modelo
+            columns = reason_columns(model, X[:3], predictions[:3], k=20)
+            ok = ok and len(columns) == 2 * X.shape[1]
+            print(f"   {backend}: soma das contribuições = score bruto: {ok} "
+                  f"({int(np.isnan(impact).any(axis=1).sum())} linha(s) com menos de 5 motivos)")
+            if not ok:
+                print("Explicações inconsistentes!")
+                return False
+        print("Explicações consistentes!")
+        return True
+    except Exception as e:
+        print(f"Erro nas explicações: {e}")
+        return False
+
+def test_what_if():
+    """Grade de cenários: features recalculadas iguais às completas e decisão invertida"""
+    print("TESTE 13: Simulação de Cenários (what-if)")
+    
+    try:
+        from scoring import build_features, score
+        from scoring.features import COLUMN_INDEX, rederive_features
+        from scoring.whatif import sensitivity_grid
+        
+        X_test = load_dataset('X_test')
+        model = load_model()
+        scaler = load_scaler()
+        
+        # Recalcular só as dependentes deve dar o mesmo que build_features completo
+        changed = X_test.copy()
+        changed['loan_amount'] *= 0.5
+        X = build_features(X_test)
+        X[:, COLUMN_INDEX['loan_amount']] = changed['loan_amount']
+        ok = np.array_equal(rederive_features(X, ['loan_amount']), build_features(changed))
+        print(f"   Features recalculadas idênticas: {ok}")
+        
+        predictions, probabilities = score(model, build_features(X_test))
+        row = int(np.flatnonzero(predictions == 0)[0])
+        grid = sensitivity_grid(model, scaler, X_test.iloc[row].to_dict())
+        ok = ok and grid.probabilities.shape == tuple(len(v) for v in grid.values)
+        ok = ok and np.isclose(grid.base_probability, probabilities[row, 1]) and not grid.base_approved
+        flip = grid.minimal_flip()
+        if flip is not None:
+            print(f"   Menor mudança para aprovar: {flip['change']} (prob. {flip['probability']:.3f})")
+            ok = ok and flip['probability'] > 0.5
+        if not ok:
+            print("Simulação inconsistente!")
+            return False
+        print("Simulação consistente!")
+        return True
+    except Exception as e:
+        print(f"Erro na simulação: {e}")
+        return False
+
+def test_schema_validation():
+    """Linhas inválidas devem ir para o relatório de erros e as válidas ser pontuadas"""
+    print("TESTE 14: Validação do Esquema")
+    
+    try:
+        import os
+        import tempfile
+        from scoring import build_features
+        from scoring.batch import score_file
+        from scoring.features import MODEL_COLUMNS
+        from scoring.formats import TablePages
+        from scoring.schema import ERROR_COLUMNS
+        
+        data = load_dataset('X_test').head(100)
+        data = data[list(reversed(data.columns))].astype({'cibil_score': object})
+        data.loc[3, 'cibil_score'] = 950
+        data.loc[5, 'cibil_score'] = 'abc'
+        data.loc[7, 'loan_term'] = 0
+        data.loc[9, 'income_annum'] = np.nan
+        # Features derivadas desatualizadas no arquivo: o resultado traz as recalculadas
+        data.loc[0, 'credit_income_ratio'] = 999.0
+        data.loc[0, 'high_debt'] = 1 - data.loc[0, 'high_debt']
+        expected = build_features(data.loc[[0]].astype({'cibil_score': np.float64}))[0]
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            source = os.path.join(tmp, 'lote.csv')
+            data.to_csv(source, index=False)
+            totals = score_file(load_model(), load_scaler(), source, os.path.join(tmp, 'resultados.csv'),
+                                chunksize=40, errors=os.path.join(tmp, 'erros.csv'))
+            errors = pd.read_csv(os.path.join(tmp, 'erros.csv'))
+            results = pd.read_csv(os.path.join(tmp, 'resultados.csv'))
+            
+            # Arquivo só com o cabeçalho: a saída existe, vazia, com as colunas do resultado
+            header_only = os.path.join(tmp, 'vazio.csv')
+            data.head(0).to_csv(header_only, index=False)
+            empty = []
+            for name in ('vazio_resultados.csv', 'vazio_resultados.parquet'):
+                empty_totals = score_file(load_model(), load_scaler(), header_only, os.path.join(tmp, name),
+                                          errors=os.path.join(tmp, 'vazio_erros.csv'))
+                empty.append(TablePages(os.path.join(tmp, name)).page(0, 10))
+            empty_errors = pd.read_csv(os.path.join(tmp, 'vazio_erros.csv'))
+        
+        print(f"   {totals.total} linhas pontuadas, {totals.invalid} inválidas: {totals.errors_by_column}")
+        ok = totals.total == 96 and totals.invalid == 4 and len(results) == 96
+        ok = ok and empty_totals.total == 0 and list(empty_errors.columns) == ERROR_COLUMNS
+        ok = ok and all(len(frame) == 0 and list(frame.columns) == list(results.columns) for frame in empty)
+        ok = ok and errors['linha'].tolist() == [4, 6, 8, 10]
+        ok = ok and results.columns[0] == 'no_of_dependents'
+        ok = ok and np.allclose(results.loc[0, MODEL_COLUMNS].to_numpy(dtype=np.float64), expected)
+        if not ok:
+            print("Validação inconsistente!")
+            return False
+        print("Linhas inválidas separadas no relatório de erros!")
+        return True
+    except Exception as e:
+        print(f"Erro na validação do esquema: {e}")
+        return False
+
+def test_drift_monitor():
+    """X_test não deve ter drift; um lote com CIBIL deslocado deve ser detectado"""
+    print("TESTE 15: Monitor de Drift")
+    
+    try:
+        from scoring.drift import DriftMonitor, Reference, load_reference
+        from scoring.features import build_features
+        
+        reference = load_reference()
+        if reference is None:
+            print("drift_reference.json não encontrado (python -m scoring.drift build)")
+            return False
+        X = build_features(load_dataset('X_test'))
+        
+        monitor = DriftMonitor(reference)
+        monitor.update_features(X)
+        sem_drift = monitor.drifted()
+        
+        shifted = X.copy()
+        shifted[:, 4] = np.minimum(shifted[:, 4] + 150, 900)
+        shifted_monitor = DriftMonitor(reference)
+        shifted_monitor.update_features(shifted)
+        com_drift = shifted_monitor.drifted()
+        
+        # Monitores de metades diferentes somados == um monitor do lote inteiro
+        half = len(X) // 2
+        merged = DriftMonitor(reference)
+        merged.update_features(X[:half])
+        other = DriftMonitor(reference)
+        other.update_features(X[half:])
+        merged.merge(other)
+        mesmo_relatorio = merged.report().equals(monitor.report())
+        
+        reloaded = Reference.from_dict(reference.to_dict())
+        mesma_referencia = all(np.array_equal(a, b) for a, b in zip(reloaded.counts, reference.counts))
+        
+        print(f"   X_test: {sem_drift or 'sem drift'}; CIBIL +150: {com_drift}")
+        if sem_drift or 'cibil_score' not in com_drift or not mesmo_relatorio or not mesma_referencia:
+            print("Monitor de drift inconsistente!")
+            return False
+        print("Drift detectado corretamente!")
+        return True
+    except Exception as e:
+        print(f"Erro no monitor de drift: {e}")
+        return False
+
+def test_model_registry():
+    """Troca do modelo sem interromper as predições, modo sombra e rollback"""
+    print("TESTE 16: Registro de Modelos")
+    
+    try:
+        import os
+        import tempfile
+        import threading
+        import lightgbm as lgb
+        from scoring.bundle import BundleError, build_bundle
+        from scoring.features import MODEL_COLUMNS, build_features
+        from scoring.model import predict_batch
+        from scoring.registry import ModelRegistry, ModelServer
+        
+        X = build_features(load_dataset('X_test'))
+        with tempfile.TemporaryDirectory() as tmp:
+            registry = ModelRegistry(os.path.join(tmp, 'registro'))
+            registry.promote(registry.register(MODEL_PATH))
+            server = ModelServer(registry)
+            server.refresh()
+            atual = server.active.version
+            
+            # Candidato: um modelo menor treinado nos mesmos dados
+            X_train = pd.DataFrame(build_features(load_dataset('X_train')), columns=MODEL_COLUMNS)
+            candidato = lgb.LGBMClassifier(n_estimators=20, verbose=-1).fit(
+                X_train, load_dataset('y_train').iloc[:, 0])
+            build_bundle(candidato, None, os.path.join(tmp, 'candidato'))
+            versao = registry.register(os.path.join(tmp, 'candidato'))
+            
+            # Modo sombra: mesmas linhas, sem alterar as respostas do ativo
+            registry.set_shadow(versao)
+            server.refresh()
+            _, probabilities = predict_batch(server.active.model, server.active.scaler, X)
+            concordancia = server.shadow_score(X, probabilities).result() / len(X)
+            
+            # Troca com predições em andamento em outra thread
+            erros, parar = [], threading.Event()
+            def pontuar():
+                while not parar.is_set():
+                    active = server.active
+                    try:
+                        predict_batch(active.model, active.scaler, X[:10])
+                    except Exception as e:
+                        erros.append(e)
+            thread = threading.Thread(target=pontuar)
+            thread.start()
+            registry.promote(versao)
+            trocou = server.refresh()
+            parar.set()
+            thread.join()
+            promovido = server.active.version == versao and server.shadow is None
+            
+            registry.rollback()
+            server.refresh()
+            voltou = server.active.version == registry.state()['active']
+            server.close()
+            
+            # Versão ativa corrompida depois da promoção (um bit trocado, mesmo
+            # tamanho): promover de novo é recusado, um servidor novo sobe com a
+            # anterior e a versão é tentada de novo só depois que os arquivos
+            # forem corrigidos
+            registry.promote(versao)
+            arquivo = os.path.join(registry.path(versao), 'engine', 'leaf_value.npy')
+            with open(arquivo, 'rb') as f:
+                original = f.read()
+            with open(arquivo, 'wb') as f:
+                f.write(original[:-1] + bytes([original[-1] ^ 1]))
+            try:
+                registry.promote(versao)
+                recusou = False
+            except BundleError:
+                recusou = True
+            novo = ModelServer(registry)
+            novo.refresh()
+            reserva = novo.active.version == atual and versao in (novo.last_error or '')
+            repetiu = novo.refresh()
+            with open(arquivo, 'wb') as f:
+                f.write(original)
+            corrigido = novo.refresh() and novo.active.version == versao
+            novo.close()
+        
+        print(f"   Concordância do sombra: {concordancia:.1%} | troca: {trocou} | erros durante a troca: {len(erros)}")
+        print(f"   Versão corrompida: promoção recusada {recusou} | reserva {reserva} | nova tentativa sem mudança: {repetiu} | "
+              f"recarregada após correção: {corrigido}")
+        ok = recusou and reserva and not repetiu and corrigido
+        if not (ok and promovido and voltou and trocou and not erros and 0.5 < concordancia <= 1.0 and atual):
+            print("Registro de modelos inconsistente!")
+            return False
+        print("Troca de modelo sem interrupção!")
+        return True
+    except Exception as e:
+        print(f"Erro no registro de modelos: {e}")
+        return False
+
+def test_evaluation():
+    """Métricas de uma única ordenação iguais às do sklearn e bootstrap independente dos processos"""
+    print("TESTE 17: Avaliação e Limiar de Decisão")
+    
+    try:
+        from sklearn.metrics import average_precision_score, confusion_matrix, roc_auc_score
+        from scoring import build_features, score
+        from scoring.evaluation import Evaluation, bootstrap
+        
+        y = load_dataset('y_test').iloc[:, 0].to_numpy()
+        _, probabilities = score(load_model(), build_features(load_dataset('X_test')))
+        p = probabilities[:, 1]
+        evaluation = Evaluation(y, p)
+        
+        ok = np.isclose(evaluation.roc_auc(), roc_auc_score(y, p), rtol=0, atol=1e-12)
+        ok = ok and np.isclose(evaluation.average_precision(), average_precision_score(y, p), rtol=0, atol=1e-12)
+        table = evaluation.threshold_table([0.3, 0.5, 0.7])
+        for _, row in table.iterrows():
+            expected = confusion_matrix(y, (p > row['limiar']).astype(int)).ravel().tolist()
+            ok = ok and [row['vn'], row['fp'], row['fn'], row['vp']] == expected
+        
+        # Limiar de menor custo: nenhum outro ponto de operação custa menos
+        best = evaluation.optimal_threshold(5.0, 1.0)
+        ok = ok and best['custo'] == evaluation.threshold_table(None, 5.0, 1.0)['custo'].min()
+        
+        intervals = bootstrap(evaluation, samples=100, workers=1)
+        ok = ok and intervals.equals(bootstrap(evaluation, samples=100, workers=2))
+        auc = intervals.iloc[0]
+        ok = ok and auc['ic_inferior'] <= auc['valor'] <= auc['ic_superior']
+        
+        print(f"   AUC {auc['valor']:.4f} (IC 95%: {auc['ic_inferior']:.4f} a {auc['ic_superior']:.4f}); "
+              f"limiar de menor custo: {best['limiar']:.3f}")
+        if not ok:
+            print("Avaliação diverge do sklearn!")
+            return False
+        print("Avaliação idêntica ao sklearn!")
+        return True
+    except Exception as e:
+        print(f"Erro na avaliação: {e}")
+        return False
+
+def test_training():
+    """Parâmetros de referência reproduzem o modelo atual e a busca retoma as tentativas concluídas"""
+    print("TESTE 18: Pipeline de Treinamento")
+    
+    try:
+        import os
+        import pickle
+        import tempfile
+        from scoring.train import fit_model, fit_scaler, load_training_data, search
+        
+        X, y = load_training_data()
+        X_test, _ = load_training_data('X_test', 'y_test')
+        with open('lgbm_model_optimized.pkl', 'rb') as f:
+            current = pickle.load(f)
+        model = fit_model(X, y)
+        ok = np.array_equal(model.predict_proba(X_test), current.predict_proba(X_test))
+        ok = ok and np.allclose(fit_scaler(X).mean_, load_scaler().mean_)
+        
+        grid = {'learning_rate': [0.1], 'max_depth': [3, 5], 'num_leaves': [15], 'min_child_samples': [20, 50]}
+        with tempfile.TemporaryDirectory() as tmp:
+            best, table = search(X, y, grid, workers=1, cache_dir=tmp, log=lambda message: None)
+            with open(os.path.join(tmp, 'trials.jsonl')) as f:
+                completed = f.readlines()
+            again, _ = search(X, y, grid, workers=1, cache_dir=tmp, log=lambda message: None)
+            with open(os.path.join(tmp, 'trials.jsonl')) as f:
+                ok = ok and f.readlines() == completed
+        ok = ok and again == best and best['auc'] == table['auc'].iloc[0]
+        # Com learning_rate 0.1 todas param bem antes de 250 árvores: as rodadas seguintes só reaproveitam
+        later = table[table['rodada'] > 1]
+        ok = ok and len(later) > 0 and (later['seconds'] == 0).all() and (later['reaproveitada_de'] == 250).all()
+        
+        print(f"   Melhor da grade de teste: {best['params']}, {best['best_iteration']} árvores, "
+              f"AUC CV {best['auc']:.4f}; {len(completed)} tentativas retomadas sem novo treino, "
+              f"{len(later)} reaproveitadas de uma rodada anterior")
+        if not ok:
+            print("Treinamento não é reprodutível!")
+            return False
+        print("Treinamento reprodutível!")
+        return True
+    except Exception as e:
+        print(f"Erro no treinamento: {e}")
+        return False
+
+def test_compression():
+    """Modelo sem as features não usadas é idêntico; o truncado respeita a tolerância de AUC"""
+    print("TESTE 19: Compressão do Modelo")
+    
+    try:
+        import os
+        import tempfile
+        from scoring import build_features
+        from scoring.compress import compress
+        from scoring.evaluation import Evaluation
+        
+        X = build_features(load_dataset('X_test'))
+        y = load_dataset('y_test').iloc[:, 0].to_numpy()
+        expected = load_model(MODEL_PATH, 'lightgbm', record=False).predict_proba(X)
+        full_auc = Evaluation(y, expected[:, 1]).roc_auc()
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            exact = os.path.join(tmp, 'exato')
+            _, _, removed = compress(MODEL_PATH, exact, truncate=False, float32=True)
+            ok = removed == ['high_debt', 'low_cibil']
+            for backend in ('lightgbm', 'compiled'):
+                model = load_model(exact, backend, record=False)
+                ok = ok and model.n_features_in_ == 15 and np.array_equal(model.predict_proba(X), expected)
+            
+            compact = os.path.join(tmp, 'truncado')
+            manifest, _, _ = compress(MODEL_PATH, compact, tolerance=0.001)
+            model = load_model(compact, 'compiled', record=False)
+            auc = Evaluation(y, model.predict_proba(X)[:, 1]).roc_auc()
+            n_trees = manifest['engine']['n_trees']
+            ok = ok and n_trees < manifest['metadata']['compression']['original_trees']
+            ok = ok and auc >= full_auc - 0.001
+        
+        print(f"   Sem {', '.join(removed)}: predições idênticas; truncado: {n_trees} árvores, "
+              f"AUC {auc:.4f} (completo: {full_auc:.4f})")
+        if not ok:
+            print("Compressão alterou o modelo além da tolerância!")
+            return False
+        print("Compressão dentro da tolerância!")
+        return True
+    except Exception as e:
+        print(f"Erro na compressão: {e}")
+        return False
+
+def test_decision_log():
+    """Decisões individuais e do lote gravadas com número da linha; resumos e filtros consistentes"""
+    print("TESTE 20: Registro de Decisões")
+    
+    try:
+        import os
+        import tempfile
+        from scoring import build_features, predict_batch
+        from scoring.batch import score_file
+        from scoring.decisions import DecisionLog, band_summary, daily_summary, recent
+        from scoring.features import MODEL_COLUMNS
+        
+        model = load_model()
+        scaler = load_scaler()
+        data = load_dataset('X_test').head(60)
+        data.loc[4, 'cibil_score'] = 950
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            db = os.path.join(tmp, 'decisoes.db')
+            log = DecisionLog(db)
+            features = build_features(data.head(1))
+            predictions, probabilities = predict_batch(model, scaler, features)
+            log.record('individual', features, probabilities[:, 1], predictions, model.model_version)
+            
+            source = os.path.join(tmp, 'lote.csv')
+            data.to_csv(source, index=False)
+            totals = score_file(model, scaler, source, os.path.join(tmp, 'resultados.csv'), chunksize=25,
+                                decisions=log.recorder('lote', 'lote.csv'))
+            log.close()
+            
+            daily = daily_summary(db)
+            bands = band_summary(db, source='lote')
+            batch = recent(db, 100, source='lote')
+            approved = recent(db, 100, decision=1)
+            individual = recent(db, 10, source='individual')
+        
+        print(f"   {log.written} decisões gravadas ({log.dropped} perdidas), "
+              f"{int(daily['decisoes'].sum())} no resumo diário")
+        ok = log.written == 60 and log.dropped == 0 and int(daily['decisoes'].sum()) == 60
+        ok = ok and int(bands['decisoes'].sum()) == totals.total == 59
+        ok = ok and int(bands['aprovados'].sum()) == totals.approved == (batch['decisao'] == 'Aprovado').sum()
+        ok = ok and sorted(batch['linha']) == [row for row in range(1, 61) if row != 5]
+        ok = ok and set(approved['decisao']) == {'Aprovado'} and len(approved) == totals.approved + predictions[0]
+        ok = ok and len(individual) == 1 and individual['versao_modelo'][0] == model.model_version
+        ok = ok and np.allclose(individual[MODEL_COLUMNS].to_numpy(), features)
+        if not ok:
+            print("Registro de decisões inconsistente!")
+            return False
+        print("Decisões registradas e consultadas corretamente!")
+        return True
+    except Exception as e:
+        print(f"Erro no registro de decisões: {e}")
+        return False
+
+def test_portfolio_summary():
+    """Agregados por segmento acumulados em blocos iguais aos do DataFrame completo; páginas dos resultados"""
+    print("TESTE 21: Agregados da Carteira")
+    
+    try:
+        import os
+        import tempfile
+        from scoring.batch import score_file
+        from scoring.formats import TablePages
+        from scoring.portfolio import PortfolioSummary
+        
+        data = load_dataset('X_test')
+        with tempfile.TemporaryDirectory() as tmp:
+            source = os.path.join(tmp, 'lote.csv')
+            data.to_csv(source, index=False)
+            portfolio = PortfolioSummary()
+            score_file(load_model(), load_scaler(), source, os.path.join(tmp, 'resultados.csv'), chunksize=128,
+                       portfolio=portfolio)
+            halves = [PortfolioSummary(), PortfolioSummary()]
+            for half, part in zip(halves, [data.iloc[:len(data) // 2], data.iloc[len(data) // 2:]]):
+                part.to_csv(source, index=False)
+                score_file(load_model(), load_scaler(), source, os.path.join(tmp, 'parte.parquet'), portfolio=half)
+            pages = TablePages(os.path.join(tmp, 'resultados.csv'))
+            results = pd.concat([pages.page(start, 250) for start in range(0, pages.rows, 250)],
+                                ignore_index=True)
+            page = pages.page(10, 5)
+
+        approved = results['Predição'] == 'Aprovado'
+        expected = results.assign(aprovado=approved).groupby('loan_term').agg(
+            clientes=('aprovado', 'size'), aprovados=('aprovado', 'sum'), prob_media=('Prob_Aprovado', 'mean')
+        )
+        by_term = portfolio.segment('loan_term')
+        cibil = portfolio.segment('cibil')
+        histogram = portfolio.histogram()
+        merged = halves[0].merge(halves[1])
+        
+        print(f"   {portfolio.total} clientes; aprovação por faixa CIBIL: "
+              f"{dict(zip(cibil['Faixa CIBIL'], cibil['taxa_aprovacao'].round(3)))}")
+        ok = portfolio.total == len(data) == pages.rows == len(results)
+        ok = ok and by_term['clientes'].tolist() == expected['clientes'].tolist()
+        ok = ok and by_term['aprovados'].tolist() == expected['aprovados'].tolist()
+        ok = ok and np.allclose(by_term['prob_media'], expected['prob_media'])
+        ok = ok and int(cibil['aprovados'].sum()) == int(approved.sum())
+        ok = ok and int(histogram['aprovados'].sum()) == int(approved.sum())
+        ok = ok and int((histogram['aprovados'] + histogram['rejeitados']).sum()) == len(data)
+        ok = ok and all(np.array_equal(merged.histograms[name], portfolio.histograms[name])
+                        and np.array_equal(merged.approved[name], portfolio.approved[name])
+                        for name in portfolio.histograms)
+        ok = ok and page['Prob_Aprovado'].tolist() == results['Prob_Aprovado'][10:15].tolist()
+        if not ok:
+            print("Agregados da carteira inconsistentes!")
+            return False
+        print("Agregados da carteira consistentes!")
+        return True
+    except Exception as e:
+        print(f"Erro nos agregados da carteira: {e}")
+        return False
+
 def main():
     print("\n")
     print("|" + " " * 10 + "TESTE DE VALIDAÇÃO DO SISTEMA" + " " * 18 + "|")
@@ -155,6 +872,21 @@ def main():
     success = test_prediction(model, X_test, y_test)
     test_feature_engineering()
     test_csv_example()
+    success = test_compiled_engine() and success
+    success = test_prediction_cache() and success
+    success = test_scaling() and success
+    success = test_micro_batching() and success
+    success = test_risk_rules() and success
+    success = test_explanations() and success
+    success = test_what_if() and success
+    success = test_schema_validation() and success
+    success = test_drift_monitor() and success
+    success = test_model_registry() and success
+    success = test_evaluation() and success
+    success = test_training() and success
+    success = test_compression() and success
+    success = test_decision_log() and success
+    success = test_portfolio_summary() and success
     
     # Resumo final
     print("RESUMO DOS TESTES")